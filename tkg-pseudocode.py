@@ -5,11 +5,38 @@ that unifies ontological, instance, and contextual knowledge.
 """
 
 from typing import Dict, List, Set, Any, Optional, Callable, Tuple, Union
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
+import argparse
+import bisect
+import concurrent.futures
+import heapq
 import json
+import logging
+import marshal
+import math
 import datetime
+import multiprocessing
+import os
+import platform
+import random
 import re
-from collections import defaultdict
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager, nullcontext
+from types import MappingProxyType
+
+try:
+    import numpy as np
+except ImportError:  # only the compiled adjacency core, analytics and vector search need NumPy
+    np = None
+
+logger = logging.getLogger(__name__)
 
 
 # =============================================================================
@@ -73,53 +100,46 @@ class Edge:
         }
 
 
-class Graph:
-    """Base graph class with core functionality"""
-    
-    def __init__(self, name: str):
-        self.name = name
-        self.nodes: Dict[str, Node] = {}
-        self.edges: Dict[str, Edge] = {}
-        self.indexes: Dict[str, Dict] = {}
-    
-    def add_node(self, node: Node) -> Node:
-        """Add a node to the graph"""
-        self.nodes[node.id] = node
-        node.graph = self
-        self._update_indexes("node_added", node)
-        return node
+# Finds over at most this many nodes (or edges) scan a copy of them taken under the lock
+SCAN_ALWAYS_BELOW = 16
+# Writes of at least this many changes go to a private copy published at the end,
+# so readers never wait on them; smaller ones are made in place
+DRAFT_BATCH_SIZE = 256
+
+
+class GraphVersion:
+    """One committed generation of a graph's node and edge maps"""
+    
+    __slots__ = ("number", "nodes", "edges", "pins", "lock", "__weakref__")
+    
+    def __init__(self, number: int, nodes: Dict[str, Node], edges: Dict[str, Edge]):
+        self.number = number
+        self.nodes = nodes
+        self.edges = edges
+        # Readers currently holding this version; writers copy it before mutating
+        self.pins = 0
+        # Guards pins; a writer changing the version in place holds it until the write is published
+        self.lock = threading.RLock()
+
+
+class GraphView:
+    """Read operations shared by live graphs and their snapshots"""
     
-    def add_edge(self, edge: Edge) -> Edge:
-        """Add an edge to the graph"""
-        self.edges[edge.id] = edge
-        edge.graph = self
-        self._update_indexes("edge_added", edge)
-        return edge
+    # MetricsRegistry when instrumentation is enabled; checked once per call
+    _metrics: Optional['MetricsRegistry'] = None
+    # WorkloadObserver when auto-indexing is enabled
+    _observer: Optional['WorkloadObserver'] = None
     
-    def remove_node(self, node_id: str) -> bool:
-        """Remove a node and all its connected edges"""
-        if node_id not in self.nodes:
-            return False
-        
-        # Remove all connected edges
-        connected_edges = self.get_edges_for_node(node_id)
-        for edge in connected_edges:
-            self.remove_edge(edge.id)
-        
-        node = self.nodes[node_id]
-        self._update_indexes("node_removed", node)
-        del self.nodes[node_id]
-        return True
+    def _read(self):
+        """Context manager yielding the GraphVersion a read should iterate"""
+        raise NotImplementedError
     
-    def remove_edge(self, edge_id: str) -> bool:
-        """Remove an edge from the graph"""
-        if edge_id not in self.edges:
-            return False
-        
-        edge = self.edges[edge_id]
-        self._update_indexes("edge_removed", edge)
-        del self.edges[edge_id]
-        return True
+    def _candidates(self, constraints: Dict, entity: str) -> Tuple[GraphVersion, Optional[str], Optional[List], bool]:
+        """
+        (version to read, index used, its candidates or None to scan, whether
+        the version was pinned for the read); views read one fixed version
+        """
+        return self._version, None, None, False
     
     def get_node(self, node_id: str) -> Optional[Node]:
         """Get a node by its ID"""
@@ -131,42 +151,73 @@ class Graph:
     
     def get_nodes_of_type(self, node_type: str) -> List[Node]:
         """Get all nodes of a specific type"""
-        return [node for node in self.nodes.values() if node.type == node_type]
+        with self._read() as version:
+            return [node for node in version.nodes.values() if node.type == node_type]
     
     def get_edges_of_type(self, edge_type: str) -> List[Edge]:
         """Get all edges of a specific type"""
-        return [edge for edge in self.edges.values() if edge.type == edge_type]
+        with self._read() as version:
+            return [edge for edge in version.edges.values() if edge.type == edge_type]
     
     def get_edges_for_node(self, node_id: str, direction: str = "both") -> List[Edge]:
         """Get all edges connected to a node"""
-        if node_id not in self.nodes:
-            return []
-        
-        result = []
-        for edge in self.edges.values():
-            if direction == "outgoing" and edge.source.id == node_id:
-                result.append(edge)
-            elif direction == "incoming" and edge.target.id == node_id:
-                result.append(edge)
-            elif direction == "both" and (edge.source.id == node_id or edge.target.id == node_id):
-                result.append(edge)
-        
-        return result
+        with self._read() as version:
+            if node_id not in version.nodes:
+                return []
+            
+            result = []
+            for edge in version.edges.values():
+                if direction == "outgoing" and edge.source.id == node_id:
+                    result.append(edge)
+                elif direction == "incoming" and edge.target.id == node_id:
+                    result.append(edge)
+                elif direction == "both" and (edge.source.id == node_id or edge.target.id == node_id):
+                    result.append(edge)
+            
+            return result
     
     def find_nodes(self, constraints: Dict) -> List[Node]:
         """Find nodes matching the given constraints"""
-        result = []
-        for node in self.nodes.values():
-            if self._matches_constraints(node, constraints):
-                result.append(node)
+        metrics = self._metrics
+        start = time.perf_counter() if metrics is not None else 0.0
+        version, index_name, candidates, pinned = self._candidates(constraints, "node")
+        try:
+            matches = self._matches_constraints
+            result = [node for node in (version.nodes.values() if candidates is None else candidates)
+                      if matches(node, constraints)]
+            total = len(version.nodes)
+        finally:
+            if pinned:
+                self._unpin(version)
+        scanned = total if candidates is None else len(candidates)
+        if metrics is not None:
+            if index_name is not None:
+                metrics.record_index_lookup(self.name, index_name)
+            metrics.record_scan(self.name, "find_nodes", start, scanned, len(result))
+        if self._observer is not None:
+            self._observer.record(self.name, "node", constraints, total, len(result), index_name)
         return result
     
     def find_edges(self, constraints: Dict) -> List[Edge]:
         """Find edges matching the given constraints"""
-        result = []
-        for edge in self.edges.values():
-            if self._matches_constraints(edge, constraints):
-                result.append(edge)
+        metrics = self._metrics
+        start = time.perf_counter() if metrics is not None else 0.0
+        version, index_name, candidates, pinned = self._candidates(constraints, "edge")
+        try:
+            matches = self._matches_constraints
+            result = [edge for edge in (version.edges.values() if candidates is None else candidates)
+                      if matches(edge, constraints)]
+            total = len(version.edges)
+        finally:
+            if pinned:
+                self._unpin(version)
+        scanned = total if candidates is None else len(candidates)
+        if metrics is not None:
+            if index_name is not None:
+                metrics.record_index_lookup(self.name, index_name)
+            metrics.record_scan(self.name, "find_edges", start, scanned, len(result))
+        if self._observer is not None:
+            self._observer.record(self.name, "edge", constraints, total, len(result), index_name)
         return result
     
     def _matches_constraints(self, entity: Union[Node, Edge], constraints: Dict) -> bool:
@@ -237,45 +288,693 @@ class Graph:
                     return False
         
         return True
+
+
+class _GraphWrite:
+    """
+    One write to a graph, holding the writer lock. Its changes are
+    published, and its events delivered, when the outermost write ends.
+    """
+    
+    __slots__ = ("graph", "batch")
+    
+    def __init__(self, graph: 'Graph', batch: int = 1):
+        self.graph = graph
+        self.batch = batch
+    
+    def __enter__(self) -> None:
+        graph = self.graph
+        if graph._replica is not None:
+            graph._check_writer()
+        graph._lock.acquire()
+        if not graph._writes:
+            graph._drafting = self.batch >= DRAFT_BATCH_SIZE
+        graph._writes += 1
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        graph = self.graph
+        try:
+            if graph._end_write() and graph._events:
+                graph._deliver()
+        finally:
+            graph._lock.release()
+
+
+class Graph(GraphView):
+    """Base graph class with core functionality"""
+    
+    def __init__(self, name: str, storage: 'StorageEngine' = None):
+        self.name = name
+        # Where nodes, edges and (if it supports it) indexes live; in memory by default
+        self.storage = storage if storage is not None else MemoryStorage()
+        nodes, edges = self.storage.attach(self)
+        self._version = GraphVersion(0, nodes, edges)
+        self._live_versions = weakref.WeakSet([self._version])
+        self.indexes: Dict[str, Dict] = {}
+        # (index set, {(constraint key, entity kind): covering index name}) access_path last saw
+        self._covering: Tuple[Dict, Dict] = (self.indexes, {})
+        # Serializes writers; readers pin versions without it and only ever try it
+        self._lock = threading.RLock()
+        # Change-event subscribers; empty in the common case so mutations stay cheap
+        self._subscribers: List['Subscription'] = []
+        # The write in progress: nesting depth, the version it changes (the
+        # latest, held locked, or an unpublished draft), whether it drafts,
+        # and the events it delivers once published
+        self._writes = 0
+        self._claim: Optional[GraphVersion] = None
+        self._drafting = False
+        self._events: List['GraphEvent'] = []
+        self._write = _GraphWrite(self)
+        # Thread of the Replica keeping this graph a copy of a primary's; only it may write meanwhile
+        self._replica: Optional[threading.Thread] = None
+        self._compiled: Optional['CompiledGraph'] = None
+        # Thread ident -> staged changes of the transaction open there; reads and
+        # writes only look one up while this is nonempty
+        self._stagings: Dict[int, '_GraphStaging'] = {}
+        # Thread ident -> pinned version a snapshot query running there reads
+        # (see TKGSnapshot); likewise only looked up while nonempty
+        self._bindings: Dict[int, GraphVersion] = {}
+    
+    def _staging(self) -> Optional['_GraphStaging']:
+        """This thread's open transaction on the graph, if any"""
+        stagings = self._stagings
+        return stagings.get(threading.get_ident()) if stagings else None
+    
+    def _thread_version(self) -> Optional[GraphVersion]:
+        """Version this thread reads instead of the latest: its transaction's, or its snapshot query's"""
+        staging = self._staging()
+        if staging is not None:
+            return staging.version
+        bindings = self._bindings
+        return bindings.get(threading.get_ident()) if bindings else None
+    
+    @property
+    def nodes(self) -> Dict[str, Node]:
+        """Node map of the current version (with staged changes, inside a transaction)"""
+        if self._stagings or self._bindings:
+            version = self._thread_version()
+            if version is not None:
+                return version.nodes
+        return self._version.nodes
+    
+    @property
+    def edges(self) -> Dict[str, Edge]:
+        """Edge map of the current version (with staged changes, inside a transaction)"""
+        if self._stagings or self._bindings:
+            version = self._thread_version()
+            if version is not None:
+                return version.edges
+        return self._version.edges
+    
+    @property
+    def version(self) -> int:
+        """Number of the latest committed version"""
+        return self._version.number
+    
+    def _read(self):
+        """Context manager pinning the version this thread reads for the duration of a read"""
+        if self._stagings or self._bindings:
+            version = self._thread_version()
+            if version is not None:
+                # The transaction keeps its base pinned, the snapshot its version
+                return nullcontext(version)
+        return self._pin()
+    
+    @contextmanager
+    def _pin(self):
+        """Pin the latest committed version, even inside a transaction"""
+        version = self._acquire()
+        try:
+            yield version
+        finally:
+            self._unpin(version)
+    
+    def _acquire(self) -> GraphVersion:
+        """
+        Pin the latest committed version without the writer lock. Only a
+        write made in place (a single change or a small batch) is waited for.
+        """
+        while True:
+            version = self._version
+            with version.lock:
+                version.pins += 1
+            if version is self._version:
+                return version
+            # A writer published a copy meanwhile
+            self._unpin(version)
+    
+    @staticmethod
+    def _unpin(version: GraphVersion) -> None:
+        with version.lock:
+            version.pins -= 1
+    
+    def _index_read(self, version: GraphVersion, read: Callable[[], Any]) -> Any:
+        """
+        `read()` of the indexes on behalf of a reader holding `version`, or
+        None if they no longer describe it. Never waits: while a writer holds
+        the lock the reader scans its pinned version instead.
+        """
+        lock = self._lock
+        if not lock.acquire(blocking=False):
+            return None
+        try:
+            # Writers fork a pinned version before touching any index
+            return read() if self._version is version else None
+        finally:
+            lock.release()
+    
+    def _lookup(self, constraints: Dict, entity: str) -> Tuple[Optional[Tuple[str, str, Any]], Optional[List]]:
+        """(access path, its candidates) for a find; candidates None to scan. Call holding the lock"""
+        if not self.indexes:
+            return None, None
+        access = self.access_path(constraints, entity)
+        return access, self._index_candidates(access, entity) if access else None
+    
+    def _candidates(self, constraints: Dict, entity: str) -> Tuple[GraphVersion, Optional[str], Optional[List], bool]:
+        """
+        Version a find reads with the index entries matching it. Only scans
+        pin the version; an index lookup is answered in the same brief hold
+        of the lock, which also keeps it exact.
+        """
+        if self._stagings or self._bindings:
+            staging = self._staging()
+            if staging is not None:
+                # Indexes do not cover staged changes
+                return staging.version, None, None, False
+            version = self._bindings.get(threading.get_ident())
+            if version is not None:
+                # A snapshot query, or the writer reading what it writes; either holds the version
+                if len(version.nodes if entity == "node" else version.edges) <= SCAN_ALWAYS_BELOW:
+                    return version, None, None, False
+                found = self._index_read(version, lambda: self._lookup(constraints, entity))
+                access, candidates = found if found is not None else (None, None)
+                if candidates is None:
+                    return version, None, None, False
+                if _range_operator(access[2]) is not None:
+                    candidates = self._scan_order(version, candidates, entity)
+                return version, access[0], candidates, False
+        lock = self._lock
+        if not lock.acquire(blocking=False):
+            # A writer is at work: scan a pinned version rather than wait for it
+            return self._acquire(), None, None, True
+        try:
+            # No other thread's write is in progress while the lock is held
+            version = self._version
+            entities = version.nodes if entity == "node" else version.edges
+            if len(entities) <= SCAN_ALWAYS_BELOW:
+                # Copying a handful of entities costs less than an index lookup or a pin
+                return version, None, list(entities.values()), False
+            access, candidates = self._lookup(constraints, entity)
+            ranged = candidates is not None and _range_operator(access[2]) is not None
+            # Scans, and ranges put back in scan order, iterate the version afterwards
+            pinned = candidates is None or ranged
+            if pinned:
+                with version.lock:
+                    version.pins += 1
+        finally:
+            lock.release()
+        if candidates is None:
+            return version, None, None, True
+        if ranged:
+            candidates = self._scan_order(version, candidates, entity)
+        return version, access[0], candidates, pinned
+    
+    def _scan_order(self, version: GraphVersion, candidates: List[Union[Node, Edge]],
+                    entity: str) -> List[Union[Node, Edge]]:
+        """Range results, which come back in key order, in the order a scan would give"""
+        wanted = {item.id for item in candidates}
+        return [item for item in (version.nodes if entity == "node" else version.edges).values() if item.id in wanted]
+    
+    def _writable_version(self) -> GraphVersion:
+        """
+        Return the version a writer may mutate, within a write (see _writing).
+        The first call of a write claims it: a draft copy, or the latest
+        version locked against new pins, copied first if any reader holds it.
+        """
+        if self._stagings:
+            staging = self._staging()
+            if staging is not None:
+                return staging.version
+        claim = self._claim
+        if claim is not None:
+            # Each change still advances the version number
+            claim.number += 1
+            return claim
+        current = self._version
+        if self._drafting:
+            # Readers keep pinning the latest version until the draft is published
+            claim = GraphVersion(current.number + 1, self.storage.fork(current.nodes),
+                                 self.storage.fork(current.edges))
+            # Only this thread reads the draft until it is published
+            self._bindings[threading.get_ident()] = claim
+        else:
+            # Held until published; the lock is reentrant, so the writer can still pin it
+            current.lock.acquire()
+            if current.pins:
+                current.lock.release()
+                claim = GraphVersion(current.number + 1, self.storage.fork(current.nodes),
+                                     self.storage.fork(current.edges))
+                claim.lock.acquire()
+                self._version = claim
+                self._live_versions.add(claim)
+            else:
+                claim = current
+                claim.number += 1
+        self._claim = claim
+        return claim
+    
+    def _writing(self, batch: int = 1) -> _GraphWrite:
+        """Context manager for one write of about `batch` changes"""
+        return _GraphWrite(self, batch) if batch >= DRAFT_BATCH_SIZE else self._write
+    
+    def _check_writer(self) -> None:
+        """Refuse a write unless it comes from the graph's replica, if it has one"""
+        if self._replica is not None and threading.current_thread() is not self._replica:
+            raise ValueError(f"{self.name} is a replica; write to its primary instead")
+    
+    def _begin_write(self, batch: int) -> None:
+        """Enter a write, as _GraphWrite does, without taking the lock"""
+        if not self._writes:
+            self._drafting = batch >= DRAFT_BATCH_SIZE
+        self._writes += 1
+    
+    def _end_write(self) -> bool:
+        """Leave a write; the outermost one publishes its version and lets readers pin it"""
+        self._writes -= 1
+        if self._writes:
+            return False
+        claim = self._claim
+        if claim is not None:
+            self._claim = None
+            if claim is self._version:
+                claim.lock.release()
+            else:
+                self._bindings.pop(threading.get_ident(), None)
+                self._version = claim
+                self._live_versions.add(claim)
+        return True
+    
+    def _deliver(self) -> None:
+        """Hand the published write's events to the subscribers"""
+        events, self._events = self._events, []
+        for event in events:
+            for subscription in self._subscribers:
+                subscription.deliver(event)
+    
+    def get_edges_for_node(self, node_id: str, direction: str = "both") -> List[Edge]:
+        """Get all edges connected to a node, from the engine's adjacency when it keeps one"""
+        if (self._stagings or self._bindings) and self._thread_version() is not None:
+            # Staged edges, and a snapshot's, are not in the engine's adjacency
+            return super().get_edges_for_node(node_id, direction)
+        with self._read() as version:
+            if node_id not in version.nodes:
+                return []
+            edges = self._index_read(version, lambda: self.storage.edges_for_node(node_id, direction))
+        return edges if edges is not None else super().get_edges_for_node(node_id, direction)
+    
+    def flush(self) -> None:
+        """Write anything the storage engine still buffers"""
+        with self._lock:
+            self.storage.flush()
+    
+    def snapshot(self) -> 'GraphSnapshot':
+        """Get a consistent, lock-free read handle on the current version"""
+        return GraphSnapshot(self, self._acquire())
+    
+    def live_versions(self) -> int:
+        """Number of versions still held by the graph or its readers"""
+        return len(self._live_versions)
+    
+    def compiled(self, merge_threshold: int = 4096) -> 'CompiledGraph':
+        """Integer-encoded CSR copy of this graph, kept current through change events"""
+        if self._compiled is None:
+            compiled = CompiledGraph(self, merge_threshold)
+            with self._lock:
+                if self._compiled is None:
+                    self._compiled = compiled
+            if self._compiled is not compiled:
+                # Another thread compiled it first
+                compiled.close()
+        return self._compiled
+    
+    def adjacency_index(self) -> 'AdjacencyIndex':
+        """Edges by label and endpoint, built on first use and maintained like any index"""
+        index = self.indexes.get(ADJACENCY_INDEX)
+        if index is None:
+            self.create_index(ADJACENCY_INDEX, "adjacency", ADJACENCY_LABELS)
+            index = self.indexes[ADJACENCY_INDEX]
+        return index
+    
+    def path_query(self, start_ids: Union[str, List[str]], expression: Union[str, 'PathAutomaton'],
+                   max_depth: int = None, limit: int = None,
+                   node_filter: Callable[[str], bool] = None) -> Dict[str, int]:
+        """
+        Nodes at the end of a path from the start nodes whose edge labels
+        match a regular path expression, e.g. "(wrote/citedBy)*" or "^IS_A+",
+        with the hops to the nearest such path end, nearest first.
+        
+        A label is an edge's relation type or its edge type. The search is
+        breadth-first over (node, automaton state) pairs and only follows the
+        labels the automaton can take next. `node_filter` must accept every
+        node a hop lands on; `limit` caps the number of nodes returned.
+        """
+        automaton = expression if isinstance(expression, PathAutomaton) else PathAutomaton(expression)
+        if isinstance(start_ids, str):
+            start_ids = [start_ids]
+        if (max_depth is not None and max_depth < 0) or (limit is not None and limit < 0):
+            raise ValueError("max_depth and limit must not be negative")
+        index = self.adjacency_index()
+        allowed: Dict[str, bool] = {}
+        
+        def accept(node_id: str) -> bool:
+            if node_id not in allowed:
+                allowed[node_id] = node_filter(node_id)
+            return allowed[node_id]
+        
+        def expand(index: AdjacencyIndex, frontier: List[Tuple[str, int]]) -> List[Tuple[str, int]]:
+            return [(neighbour, target) for node_id, state in frontier
+                    for label, direction, target in automaton.moves[state]
+                    for neighbour in index.neighbours(node_id, label, direction)]
+        
+        private = None
+        # The whole search reads one pinned version
+        with self._read() as version:
+            frontier = [(node_id, automaton.start) for node_id in dict.fromkeys(start_ids) if node_id in version.nodes]
+            seen = set(frontier)
+            results: Dict[str, int] = {}
+            depth = 0
+            while frontier and (limit is None or len(results) < limit):
+                for node_id, state in frontier:
+                    if automaton.accepting[state] and node_id not in results:
+                        results[node_id] = depth
+                        if limit is not None and len(results) >= limit:
+                            break
+                if max_depth is not None and depth >= max_depth:
+                    break
+                depth += 1
+                if private is None:
+                    moves = self._index_read(version, lambda: expand(index, frontier))
+                    if moves is None:
+                        # The shared index has moved past the version, or a writer holds
+                        # it: index the version's own edges for the rest of the search
+                        private = AdjacencyIndex(ADJACENCY_LABELS)
+                        for edge in version.edges.values():
+                            private.add_edge(edge)
+                if private is not None:
+                    moves = expand(private, frontier)
+                reached = []
+                for pair in moves:
+                    if pair not in seen:
+                        seen.add(pair)
+                        reached.append(pair)
+                frontier = reached if node_filter is None else [pair for pair in reached if accept(pair[0])]
+        return results
+    
+    def add_node(self, node: Node) -> Node:
+        """Add a node to the graph, replacing any node with the same ID"""
+        if self._stagings:
+            staging = self._staging()
+            if staging is not None:
+                # Staged; the commit maintains and publishes it
+                staging.version.nodes[node.id] = node
+                node.graph = self
+                return node
+        with self._writing():
+            nodes = self._writable_version().nodes
+            previous = nodes.get(node.id)
+            nodes[node.id] = node
+            node.graph = self
+            if previous is None:
+                self._notify("node_added", node)
+            else:
+                self._notify("node_updated", node, previous)
+        return node
+    
+    def add_edge(self, edge: Edge) -> Edge:
+        """Add an edge to the graph, replacing any edge with the same ID"""
+        if self._stagings:
+            staging = self._staging()
+            if staging is not None:
+                staging.version.edges[edge.id] = edge
+                edge.graph = self
+                return edge
+        with self._writing():
+            edges = self._writable_version().edges
+            previous = edges.get(edge.id)
+            edges[edge.id] = edge
+            edge.graph = self
+            if previous is None:
+                self._notify("edge_added", edge)
+            else:
+                self._notify("edge_updated", edge, previous)
+        return edge
+    
+    def update_properties(self, node_id: str, changes: Dict[str, Any],
+                          removed: List[str] = ()) -> Optional[Node]:
+        """
+        Set and drop properties of a node; returns the updated node, None if absent.
+        
+        The node is replaced by a copy carrying the new properties, so pinned
+        readers keep the old one, and indexes only refile it where a changed
+        value is indexed. Changes that leave every value as it was are no-ops.
+        """
+        with self._writing():
+            return self._update_properties(node_id, changes, removed)
+    
+    def update_properties_batch(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """Apply property changes to many nodes as one write; returns how many changed"""
+        changed = 0
+        with self._writing(len(updates)):
+            for node_id, changes in updates.items():
+                node = self.nodes.get(node_id)
+                if node is not None and self._update_properties(node_id, changes) is not node:
+                    changed += 1
+        return changed
+    
+    def _update_properties(self, node_id: str, changes: Dict[str, Any], removed: List[str] = ()) -> Optional[Node]:
+        node = self.nodes.get(node_id)
+        if node is None:
+            return None
+        properties = node.properties
+        delta = {key: value for key, value in changes.items() if key not in properties or properties[key] != value}
+        dropped = [key for key in removed if key in properties and key not in delta]
+        if not delta and not dropped:
+            return node
+        updated = dict(properties)
+        updated.update(delta)
+        for key in dropped:
+            del updated[key]
+        replacement = Node(node.id, node.type, updated, self)
+        self._writable_version().nodes[node_id] = replacement
+        self._notify("node_updated", replacement, node)
+        return replacement
+    
+    def remove_node(self, node_id: str) -> bool:
+        """Remove a node and all its connected edges"""
+        with self._writing():
+            if node_id not in self.nodes:
+                return False
+            
+            # Remove all connected edges
+            connected_edges = self.get_edges_for_node(node_id)
+            for edge in connected_edges:
+                self.remove_edge(edge.id)
+            
+            node = self.nodes[node_id]
+            del self._writable_version().nodes[node_id]
+            self._notify("node_removed", node)
+        return True
+    
+    def remove_edge(self, edge_id: str) -> bool:
+        """Remove an edge from the graph"""
+        with self._writing():
+            if edge_id not in self.edges:
+                return False
+            
+            edge = self.edges[edge_id]
+            del self._writable_version().edges[edge_id]
+            self._notify("edge_removed", edge)
+        return True
     
-    def _update_indexes(self, operation: str, entity: Union[Node, Edge]) -> None:
+    def _notify(self, operation: str, entity: Union[Node, Edge],
+                previous: Union[Node, Edge] = None) -> None:
+        """Maintain indexes for a committed mutation and publish it to subscribers"""
+        if self._stagings and self._staging() is not None:
+            # Staged; the commit maintains and publishes it
+            return
+        self._update_indexes(operation, entity, previous)
+        if self._metrics is not None and self.indexes:
+            self._metrics.record_index_updates(self.name, self.indexes, operation)
+        if self._subscribers:
+            # Delivered once the write is published (see _writing)
+            self._events.append(GraphEvent(operation, self.name, entity, self._claim.number, previous))
+    
+    def _update_indexes(self, operation: str, entity: Union[Node, Edge],
+                        previous: Union[Node, Edge] = None) -> None:
         """Update all indexes based on operation"""
-        for index_name, index in self.indexes.items():
-            if operation == "node_added" and isinstance(entity, Node):
-                if hasattr(index, "add_node"):
-                    index.add_node(entity)
-            elif operation == "edge_added" and isinstance(entity, Edge):
-                if hasattr(index, "add_edge"):
-                    index.add_edge(entity)
-            elif operation == "node_removed" and isinstance(entity, Node):
-                if hasattr(index, "remove_node"):
-                    index.remove_node(entity)
-            elif operation == "edge_removed" and isinstance(entity, Edge):
-                if hasattr(index, "remove_edge"):
-                    index.remove_edge(entity)
+        kind, _, change = operation.partition("_")
+        if not self.indexes or isinstance(entity, Node) != (kind == "node"):
+            return
+        # Indexes may leave out any method; an update is a remove and an add to those without one
+        if change == "updated":
+            update, remove, add = f"update_{kind}", f"remove_{kind}", f"add_{kind}"
+            for index in self.indexes.values():
+                method = getattr(index, update, None)
+                if method is not None:
+                    method(previous, entity)
+                    continue
+                method = getattr(index, remove, None)
+                if method is not None:
+                    method(previous)
+                method = getattr(index, add, None)
+                if method is not None:
+                    method(entity)
+            return
+        name = f"add_{kind}" if change == "added" else f"remove_{kind}"
+        for index in self.indexes.values():
+            method = getattr(index, name, None)
+            if method is not None:
+                method(entity)
+    
+    def _update_indexes_batch(self, changes: List[Tuple[str, Union[Node, Edge], Optional[Union[Node, Edge]]]]) -> None:
+        """Update all indexes for a batch of (operation, entity, previous) changes, one index at a time"""
+        for index in self.indexes.values():
+            index.apply(changes)
+    
+    def subscribe(self, callback: Callable[[List['GraphEvent']], None],
+                  operations: List[str] = None, batch_size: int = 1,
+                  queued: bool = False) -> 'Subscription':
+        """Register a callback for change events, delivered in batches"""
+        if queued:
+            subscription = QueuedSubscription(callback, operations, batch_size)
+        else:
+            subscription = Subscription(callback, operations, batch_size)
+        subscription.attach(self)
+        return subscription
+    
+    def unsubscribe(self, subscription: 'Subscription') -> None:
+        """Stop delivering events to a subscription"""
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers = [s for s in self._subscribers if s is not subscription]
     
     def create_index(self, name: str, index_type: str, properties: List[str]) -> None:
         """Create an index of the specified type on the specified properties"""
         # This is a simplified index implementation
-        if index_type == "hash":
-            self.indexes[name] = HashIndex(properties)
-        elif index_type == "btree":
-            self.indexes[name] = BTreeIndex(properties)
-        
-        # Populate the index with existing data
-        if properties[0].startswith("node."):
-            for node in self.nodes.values():
-                self.indexes[name].add_node(node)
-        elif properties[0].startswith("edge."):
-            for edge in self.edges.values():
-                self.indexes[name].add_edge(edge)
+        # Engines that index natively take the index over; nothing to populate here
+        pushed = self.storage.create_index(name, index_type, properties)
+        if pushed is not None:
+            with self._lock:
+                self.indexes = {**self.indexes, name: pushed}
+            return
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        index = INDEX_TYPES[index_type](properties)
+        
+        # Populate from a pinned version without blocking writers, then catch up
+        # on anything committed meanwhile before publishing the index
+        is_node = properties[0].startswith("node.")
+        add = index.add_node if is_node else index.add_edge
+        remove = index.remove_node if is_node else index.remove_edge
+        with self._pin() as version:
+            built = version.nodes if is_node else version.edges
+            for item in built.values():
+                add(item)
+            with self._lock:
+                if self._version is not version:
+                    current = self._version.nodes if is_node else self._version.edges
+                    for item_id, item in built.items():
+                        if current.get(item_id) is not item:
+                            remove(item)
+                    for item_id, item in current.items():
+                        if built.get(item_id) is not item:
+                            add(item)
+                # Copy-on-write so unlocked readers of self.indexes never see it change
+                self.indexes = {**self.indexes, name: index}
+    
+    def drop_index(self, name: str) -> bool:
+        """Drop an index; returns False if there is none by that name"""
+        with self._lock:
+            if name not in self.indexes:
+                return False
+            self.indexes = {key: index for key, index in self.indexes.items() if key != name}
+            self.storage.drop_index(name)
+        return True
+    
+    def index_for(self, key: str, entity: str = "node", ordered: bool = False) -> Optional[str]:
+        """Name of an index covering a find_nodes/find_edges constraint key, if any"""
+        path = f"{entity}.{key}"
+        for name, index in self.indexes.items():
+            if index.answers_constraints and path in index.properties and (not ordered or index.ordered):
+                return name
+        return None
+    
+    def access_path(self, constraints: Dict, entity: str = "node") -> Optional[Tuple[str, str, Any]]:
+        """(index, key, constraint) a find_nodes/find_edges call is answered from; None means a scan"""
+        indexes = self.indexes
+        covered, covering = self._covering
+        if covered is not indexes:
+            # Which index covers which key is worked out again for a new index set
+            covering = {}
+            self._covering = (indexes, covering)
+        equalities = []
+        # Key -> {operator: bound}, at most one lower and one upper bound per key
+        ranges: Dict[str, Dict[str, Any]] = {}
+        for key, value in _conjuncts(constraints) if "$and" in constraints else constraints.items():
+            if isinstance(value, dict):
+                operator = _range_operator(value)
+                if operator is not None and _indexable_key(key):
+                    # Only a constraint's first operator is checked by the scan, so
+                    # that is all an index range may use; conjuncts on one key combine
+                    bounds = ranges.setdefault(key, {})
+                    side = ("$gt", "$gte") if operator in ("$gt", "$gte") else ("$lt", "$lte")
+                    if not any(other in bounds for other in side):
+                        bounds[operator] = value[operator]
+                continue
+            slot = (key, entity)
+            if slot not in covering:
+                covering[slot] = self.index_for(key, entity) if _indexable_key(key) else None
+            index_name = covering[slot]
+            if index_name is not None and _is_hashable(value):
+                equalities.append((index_name, key, value))
+        if equalities:
+            # The smallest bucket; ranges are only used when no equality constraint is indexed
+            if len(equalities) == 1:
+                return equalities[0]
+            return min(equalities, key=lambda access: self.index_bucket_size(access[0], access[2], entity))
+        best = None
+        for key, bounds in ranges.items():
+            index_name = self.index_for(key, entity, ordered=True)
+            # Closed ranges first
+            if index_name is not None and (best is None or (len(bounds) == 2 and len(best[2]) == 1)):
+                best = (index_name, key, bounds)
+        return best
+    
+    def _index_candidates(self, access: Tuple[str, str, Any], entity: str) -> Optional[List[Union[Node, Edge]]]:
+        """Entities an access path yields; None if the index cannot answer it"""
+        index_name, _, value = access
+        index = self.indexes[index_name]
+        if _range_operator(value) is None:
+            return index.lookup(value, entity)
+        low = next((value[operator] for operator in ("$gt", "$gte") if operator in value), None)
+        high = next((value[operator] for operator in ("$lt", "$lte") if operator in value), None)
+        try:
+            return index.range(low=low, high=high, entity=entity)
+        except TypeError:
+            # Keys that do not compare with the bound; fall back to a scan
+            return None
+    
+    def index_bucket_size(self, index_name: str, value: Any, entity: str = "node") -> int:
+        """Number of entities an index holds under one key value"""
+        return self.indexes[index_name].bucket_size(value, entity)
     
     def identity(self, obj: Node) -> Edge:
         """Create or get identity edge for a node"""
-        for edge in self.edges.values():
-            if (edge.source == obj and edge.target == obj and 
-                edge.type == f"identity_{obj.type}"):
-                return edge
+        with self._read() as version:
+            for edge in version.edges.values():
+                if (edge.source == obj and edge.target == obj and 
+                    edge.type == f"identity_{obj.type}"):
+                    return edge
         
         # Create new identity edge
         identity_edge = Edge(
@@ -286,102 +985,636 @@ class Graph:
         )
         return self.add_edge(identity_edge)
 
+class GraphSnapshot(GraphView):
+    """Read-only view of one graph version; queries on it never take the graph lock"""
+    
+    def __init__(self, graph: Graph, version: GraphVersion):
+        self.graph = graph
+        self.name = graph.name
+        self._metrics = graph._metrics
+        self._version = version
+        self.version = version.number
+        self.nodes = MappingProxyType(version.nodes)
+        self.edges = MappingProxyType(version.edges)
+    
+    def _read(self):
+        """Snapshots are never mutated, so reads need no pin"""
+        return nullcontext(self._version)
+    
+    def _matches_constraints(self, entity: Union[Node, Edge], constraints: Dict) -> bool:
+        """Delegate constraint matching to the owning graph"""
+        return self.graph._matches_constraints(entity, constraints)
+    
+    def release(self) -> None:
+        """Unpin the version so it can be reclaimed once no other reader holds it"""
+        version = self._version
+        if version is None:
+            return
+        self.graph._unpin(version)
+        self._version = None
+        self.nodes = MappingProxyType({})
+        self.edges = MappingProxyType({})
+    
+    def __enter__(self) -> 'GraphSnapshot':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
+    
+    def __del__(self):
+        if getattr(self, "_version", None) is not None:
+            self.release()
+
+
+# Change events
+EVENT_OPERATIONS = (
+    "node_added", "node_removed", "node_updated",
+    "edge_added", "edge_removed", "edge_updated"
+)
+
+
+@dataclass
+class GraphEvent:
+    """A committed mutation of one graph"""
+    operation: str
+    graph: str
+    entity: Union[Node, Edge]
+    version: int
+    previous: Optional[Union[Node, Edge]] = None
+
+
+class Subscription:
+    """Synchronous subscriber: batches are delivered on the writer's thread"""
+    
+    def __init__(self, callback: Callable[[List[GraphEvent]], None],
+                 operations: List[str] = None, batch_size: int = 1):
+        self.callback = callback
+        self.operations = frozenset(operations) if operations else None
+        self.batch_size = max(1, batch_size)
+        self.graphs: List[Graph] = []
+        self.delivered = 0
+        self.errors: List[Exception] = []
+        self._buffer: List[GraphEvent] = []
+    
+    def attach(self, graph: Graph) -> None:
+        """Start receiving events from a graph"""
+        with graph._lock:
+            # Copy-on-write so publishing never iterates a list being modified
+            graph._subscribers = graph._subscribers + [self]
+        self.graphs.append(graph)
+    
+    def deliver(self, event: GraphEvent) -> None:
+        """Buffer an event and hand over a batch once it is full"""
+        if self.operations is not None and event.operation not in self.operations:
+            return
+        self._buffer.append(event)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+    
+    def deliver_batch(self, events: List[GraphEvent]) -> None:
+        """Hand over several events (a transaction's) as one batch, whatever its size"""
+        if self.operations is not None:
+            events = [event for event in events if event.operation in self.operations]
+        if events:
+            self._buffer.extend(events)
+            self.flush()
+    
+    def flush(self) -> None:
+        """Deliver any buffered events now"""
+        batch, self._buffer = self._buffer, []
+        if batch:
+            self._dispatch(batch)
+    
+    def _dispatch(self, batch: List[GraphEvent]) -> None:
+        """Invoke the callback; a failing subscriber must not undo the committed write"""
+        try:
+            self.callback(batch)
+            self.delivered += len(batch)
+        except Exception as error:
+            logger.exception("subscriber callback failed on a batch of %d events", len(batch))
+            self.errors.append(error)
+    
+    def close(self) -> None:
+        """Flush pending events and detach from all graphs"""
+        for graph in self.graphs:
+            graph.unsubscribe(self)
+        self.graphs = []
+        self.flush()
+    
+    def __enter__(self) -> 'Subscription':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class QueuedSubscription(Subscription):
+    """Asynchronous subscriber: a background thread drains pending events in batches"""
+    
+    def __init__(self, callback: Callable[[List[GraphEvent]], None],
+                 operations: List[str] = None, batch_size: int = 1):
+        super().__init__(callback, operations, batch_size)
+        # deque.append is atomic, so the writer's thread pays for an append and a flag check
+        self._pending: deque = deque()
+        self._inflight = 0
+        self._stopping = False
+        self._wakeup = threading.Event()
+        self._idle = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="tkg-subscriber", daemon=True)
+        self._worker.start()
+    
+    def deliver(self, event: GraphEvent) -> None:
+        """Hand an event to the worker thread"""
+        if self.operations is not None and event.operation not in self.operations:
+            return
+        self._pending.append(event)
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+    
+    def deliver_batch(self, events: List[GraphEvent]) -> None:
+        """Hand several events to the worker thread, which batches them as usual"""
+        if self.operations is not None:
+            events = [event for event in events if event.operation in self.operations]
+        self._pending.extend(events)
+        if events and not self._wakeup.is_set():
+            self._wakeup.set()
+    
+    def flush(self) -> None:
+        """Block until every pending event has been delivered"""
+        with self._idle:
+            while self._pending or self._inflight:
+                self._idle.wait(0.05)
+    
+    def _drain(self) -> None:
+        """Dispatch pending events in batches of at most batch_size"""
+        pending = self._pending
+        while pending:
+            # Popped and marked in flight together, so flush() never sees neither
+            with self._idle:
+                batch = []
+                while pending and len(batch) < self.batch_size:
+                    batch.append(pending.popleft())
+                self._inflight = len(batch)
+            try:
+                self._dispatch(batch)
+            finally:
+                with self._idle:
+                    self._inflight = 0
+                    self._idle.notify_all()
+    
+    def _run(self) -> None:
+        """Worker loop: sleep until signalled, then drain"""
+        while True:
+            self._wakeup.wait()
+            # Clear before draining so an event appended mid-drain re-signals
+            self._wakeup.clear()
+            self._drain()
+            with self._idle:
+                self._idle.notify_all()
+            if self._stopping:
+                return
+    
+    def close(self) -> None:
+        """Detach, deliver everything still pending and stop the worker"""
+        for graph in self.graphs:
+            graph.unsubscribe(self)
+        self.graphs = []
+        self._stopping = True
+        self._wakeup.set()
+        self._worker.join()
+        self._drain()
+
 
 # Simple index implementations
+
+# Operators an ordered index can answer; like _matches_constraints, only the
+# first operator of a constraint dict is considered
+RANGE_OPERATORS = ("$gt", "$gte", "$lt", "$lte")
+
+
+def _indexable_key(key: str) -> bool:
+    """Whether a find_nodes/find_edges constraint key can be served by an index"""
+    return key == "type" or key in ("source.id", "target.id") or (
+        key.startswith("properties.") and key.count(".") == 1
+    )
+
+
+def _range_operator(value: Any) -> Optional[str]:
+    """The range operator of a constraint value, if it is one"""
+    if isinstance(value, dict) and value:
+        operator = next(iter(value))
+        if operator in RANGE_OPERATORS:
+            return operator
+    return None
+
+
+def _conjuncts(constraints: Dict) -> List[Tuple[str, Any]]:
+    """(key, value) constraints every match must meet: the top-level ones and those inside $and"""
+    result = []
+    for key, value in constraints.items():
+        if key != "$and":
+            result.append((key, value))
+        elif isinstance(value, list):
+            for sub_constraints in value:
+                if isinstance(sub_constraints, dict):
+                    result.extend(_conjuncts(sub_constraints))
+    return result
+
+
+def _index_value(entity: Union[Node, Edge], path: str) -> Tuple[bool, Any]:
+    """Key an index on `path` (e.g. "node.properties.location") files an entity under"""
+    attribute = path.split(".", 1)[1]
+    if attribute == "type":
+        return True, entity.type
+    if attribute in ("source.id", "target.id") and isinstance(entity, Edge):
+        return True, getattr(entity, attribute.split(".")[0]).id
+    if attribute.startswith("properties."):
+        prop_name = path.split(".")[-1]
+        if prop_name in entity.properties:
+            return True, entity.properties[prop_name]
+    return False, None
+
+
+def _is_hashable(value: Any) -> bool:
+    """Whether a value can be an index key"""
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
 class HashIndex:
     """Simple hash index implementation"""
     
+    # Whether range() and bounds() are supported
+    ordered = False
+    # Whether find_nodes/find_edges constraints can be answered from it
+    answers_constraints = True
+    
     def __init__(self, properties: List[str]):
         self.properties = properties
-        self.node_index: Dict[Any, Set[Node]] = defaultdict(set)
-        self.edge_index: Dict[Any, Set[Edge]] = defaultdict(set)
+        # Key -> entities by id, in insertion order so lookups return scan order
+        self.node_index: Dict[Any, Dict[str, Node]] = defaultdict(dict)
+        self.edge_index: Dict[Any, Dict[str, Edge]] = defaultdict(dict)
+        # Paths per entity kind, with the property name of "<kind>.properties.<name>" ones
+        # resolved up front since _keys runs on every write
+        self._paths: Dict[str, List[Tuple[str, Optional[str]]]] = {
+            kind: [(prop, prop.split(".")[-1] if prop.startswith(kind + ".properties.") else None)
+                   for prop in properties if prop.startswith(kind + ".")]
+            for kind in ("node", "edge")
+        }
+    
+    def _keys(self, entity: Union[Node, Edge], kind: str) -> List[Any]:
+        """Keys an entity is filed under; unhashable values (dicts, lists) are left unindexed"""
+        keys = []
+        for prop, name in self._paths[kind]:
+            if name is not None:
+                properties = entity.properties
+                if name not in properties:
+                    continue
+                value = properties[name]
+            else:
+                found, value = _index_value(entity, prop)
+                if not found:
+                    continue
+            try:
+                hash(value)
+            except TypeError:
+                continue
+            keys.append(value)
+        return keys
+    
+    def _file(self, buckets: Dict[Any, Dict], entity: Union[Node, Edge], key: Any) -> None:
+        buckets[key][entity.id] = entity
+    
+    def _discard(self, buckets: Dict[Any, Dict], entity: Union[Node, Edge], keys: List[Any]) -> None:
+        """Remove an entity from the buckets it was filed under"""
+        found = False
+        for key in keys:
+            bucket = buckets.get(key)
+            if bucket is not None and entity.id in bucket:
+                del bucket[entity.id]
+                found = True
+                if not bucket:
+                    self._drop_key(buckets, key)
+        if not found:
+            # Its properties changed in place since it was filed; look everywhere
+            for key, bucket in list(buckets.items()):
+                if entity.id in bucket:
+                    del bucket[entity.id]
+                    if not bucket:
+                        self._drop_key(buckets, key)
+    
+    def _drop_key(self, buckets: Dict[Any, Dict], key: Any) -> None:
+        del buckets[key]
     
     def add_node(self, node: Node) -> None:
         """Add a node to the index"""
-        for prop in self.properties:
-            if prop.startswith("node.properties."):
-                prop_name = prop.split(".")[-1]
-                if prop_name in node.properties:
-                    self.node_index[node.properties[prop_name]].add(node)
-            elif prop == "node.type":
-                self.node_index[node.type].add(node)
+        for key in self._keys(node, "node"):
+            self._file(self.node_index, node, key)
     
     def add_edge(self, edge: Edge) -> None:
         """Add an edge to the index"""
-        for prop in self.properties:
-            if prop.startswith("edge.properties."):
-                prop_name = prop.split(".")[-1]
-                if prop_name in edge.properties:
-                    self.edge_index[edge.properties[prop_name]].add(edge)
-            elif prop == "edge.type":
-                self.edge_index[edge.type].add(edge)
+        for key in self._keys(edge, "edge"):
+            self._file(self.edge_index, edge, key)
     
     def remove_node(self, node: Node) -> None:
         """Remove a node from the index"""
-        for nodes in self.node_index.values():
-            if node in nodes:
-                nodes.remove(node)
+        self._discard(self.node_index, node, self._keys(node, "node"))
     
     def remove_edge(self, edge: Edge) -> None:
         """Remove an edge from the index"""
-        for edges in self.edge_index.values():
-            if edge in edges:
-                edges.remove(edge)
+        self._discard(self.edge_index, edge, self._keys(edge, "edge"))
+    
+    def _refile(self, buckets: Dict[Any, Dict], previous: Union[Node, Edge], entity: Union[Node, Edge], kind: str) -> None:
+        """Move a replaced entity only if its keys changed; otherwise swap it in place"""
+        old_keys = self._keys(previous, kind)
+        new_keys = self._keys(entity, kind)
+        if old_keys == new_keys and all(entity.id in buckets.get(key, ()) for key in new_keys):
+            for key in new_keys:
+                buckets[key][entity.id] = entity
+            return
+        self._discard(buckets, previous, old_keys)
+        for key in new_keys:
+            self._file(buckets, entity, key)
+    
+    def update_node(self, previous: Node, node: Node) -> None:
+        """Refile a node replaced by an update"""
+        self._refile(self.node_index, previous, node, "node")
+    
+    def update_edge(self, previous: Edge, edge: Edge) -> None:
+        """Refile an edge replaced by an update"""
+        self._refile(self.edge_index, previous, edge, "edge")
+    
+    def apply(self, changes: List[Tuple[str, Union[Node, Edge], Optional[Union[Node, Edge]]]]) -> None:
+        """Apply a batch of (operation, entity, previous) changes, skipping entity kinds not indexed"""
+        covered = {kind for kind, paths in self._paths.items() if paths}
+        for operation, entity, previous in changes:
+            kind, _, action = operation.partition("_")
+            if kind not in covered:
+                continue
+            buckets = self.node_index if kind == "node" else self.edge_index
+            if action == "added":
+                for key in self._keys(entity, kind):
+                    self._file(buckets, entity, key)
+            elif action == "removed":
+                self._discard(buckets, entity, self._keys(entity, kind))
+            else:
+                self._refile(buckets, previous, entity, kind)
+    
+    def lookup(self, value: Any, entity: str = "node") -> List[Union[Node, Edge]]:
+        """Entities filed under one key"""
+        buckets = self.node_index if entity == "node" else self.edge_index
+        if not _is_hashable(value):
+            return []
+        return list(buckets.get(value, {}).values())
+    
+    def bucket_size(self, value: Any, entity: str = "node") -> int:
+        """Number of entities filed under one key"""
+        buckets = self.node_index if entity == "node" else self.edge_index
+        if not _is_hashable(value):
+            return 0
+        return len(buckets.get(value, ()))
+    
+    def counts(self, entity: str = "node") -> Dict[Any, int]:
+        """Number of entities under every key"""
+        buckets = self.node_index if entity == "node" else self.edge_index
+        return {key: len(bucket) for key, bucket in buckets.items()}
+    
+    def entries(self) -> int:
+        """Number of (key, entity) entries held"""
+        return (sum(len(bucket) for bucket in self.node_index.values()) +
+                sum(len(bucket) for bucket in self.edge_index.values()))
+
 
+# Pending key changes a B-tree applies one by one; more are folded in with a sort
+BTREE_INCREMENTAL_CHANGES = 64
 
-class BTreeIndex:
+
+class BTreeIndex(HashIndex):
     """Simple B-tree index simulation (actual implementation would be more complex)"""
     
+    ordered = True
+    
     def __init__(self, properties: List[str]):
-        self.properties = properties
-        self.node_index: Dict[Any, Set[Node]] = defaultdict(set)
-        self.edge_index: Dict[Any, Set[Edge]] = defaultdict(set)
+        super().__init__(properties)
         self.sorted_keys = []
+        # Key changes not yet folded into sorted_keys, so bulk updates do not
+        # shift the list once per key; the next range read applies them
+        self._added: Set[Any] = set()
+        self._dropped: Set[Any] = set()
+        # Set while keys of types that do not compare (numbers and strings, say) are
+        # held; sorted_keys is then grouped by type and ranges are refused
+        self._mixed = False
+    
+    def _file(self, buckets: Dict[Any, Dict], entity: Union[Node, Edge], key: Any) -> None:
+        if key not in self.node_index and key not in self.edge_index:
+            if key in self._dropped:
+                self._dropped.discard(key)
+            else:
+                self._added.add(key)
+        buckets[key][entity.id] = entity
+    
+    def _drop_key(self, buckets: Dict[Any, Dict], key: Any) -> None:
+        del buckets[key]
+        other = self.edge_index if buckets is self.node_index else self.node_index
+        if key not in other:
+            if key in self._added:
+                self._added.discard(key)
+            else:
+                self._dropped.add(key)
+    
+    def _ordered_keys(self) -> List[Any]:
+        """sorted_keys with pending changes folded in"""
+        try:
+            if self._mixed:
+                raise TypeError("mixed key types")
+            if len(self._added) + len(self._dropped) <= BTREE_INCREMENTAL_CHANGES:
+                for key in self._dropped:
+                    del self.sorted_keys[bisect.bisect_left(self.sorted_keys, key)]
+                for key in self._added:
+                    bisect.insort(self.sorted_keys, key)
+            else:
+                keys = self.sorted_keys
+                if self._dropped:
+                    keys = [key for key in keys if key not in self._dropped]
+                self.sorted_keys = sorted(keys + list(self._added))
+        except TypeError:
+            # Rebuild from the buckets, which always hold the true key set
+            keys = set(self.node_index) | set(self.edge_index)
+            try:
+                self.sorted_keys = sorted(keys)
+                self._mixed = False
+            except TypeError:
+                self.sorted_keys = sorted(keys, key=lambda key: (
+                    not _is_number(key), "" if _is_number(key) else type(key).__name__, key))
+                self._mixed = True
+        self._added.clear()
+        self._dropped.clear()
+        return self.sorted_keys
+    
+    def range(self, low: Any = None, high: Any = None, entity: str = "node") -> List[Union[Node, Edge]]:
+        """Entities whose key lies in [low, high]; None leaves a side open. TypeError if keys do not compare"""
+        buckets = self.node_index if entity == "node" else self.edge_index
+        keys = self._ordered_keys()
+        if self._mixed:
+            raise TypeError("Index keys of mixed types have no common order")
+        start = 0 if low is None else bisect.bisect_left(keys, low)
+        end = len(keys) if high is None else bisect.bisect_right(keys, high)
+        return [item for key in keys[start:end] for item in buckets.get(key, {}).values()]
+    
+    def range_nodes(self, low: Any, high: Any) -> List[Node]:
+        """Nodes whose key lies in [low, high]"""
+        return self.range(low, high, "node")
+    
+    def bounds(self, entity: str = "node") -> Tuple[Any, Any]:
+        """Lowest and highest key holding entities of one kind; (None, None) if there are none"""
+        buckets = self.node_index if entity == "node" else self.edge_index
+        keys = self._ordered_keys()
+        low = next((key for key in keys if key in buckets), None)
+        high = next((key for key in reversed(keys) if key in buckets), None)
+        return low, high
+
+
+# Name of the adjacency index path queries create on first use, and the labels it files edges under
+ADJACENCY_INDEX = "label_adjacency"
+ADJACENCY_LABELS = ["edge.properties.relationTypeId", "edge.type"]
+
+
+class AdjacencyIndex(HashIndex):
+    """
+    Edges filed by (direction, label, endpoint), so a traversal can follow
+    one label out of a node without touching edges of any other label.
     
-    # Methods same as HashIndex for this demo
-    def add_node(self, node: Node) -> None:
-        """Add a node to the index"""
-        for prop in self.properties:
-            if prop.startswith("node.properties."):
-                prop_name = prop.split(".")[-1]
-                if prop_name in node.properties:
-                    self.node_index[node.properties[prop_name]].add(node)
-                    if node.properties[prop_name] not in self.sorted_keys:
-                        self.sorted_keys.append(node.properties[prop_name])
-                        self.sorted_keys.sort()
-            elif prop == "node.type":
-                self.node_index[node.type].add(node)
-                if node.type not in self.sorted_keys:
-                    self.sorted_keys.append(node.type)
-                    self.sorted_keys.sort()
+    Every label property an edge has (its relation type, its edge type)
+    files it under that label in both directions.
+    """
     
-    def add_edge(self, edge: Edge) -> None:
-        """Add an edge to the index"""
-        for prop in self.properties:
-            if prop.startswith("edge.properties."):
-                prop_name = prop.split(".")[-1]
-                if prop_name in edge.properties:
-                    self.edge_index[edge.properties[prop_name]].add(edge)
-                    if edge.properties[prop_name] not in self.sorted_keys:
-                        self.sorted_keys.append(edge.properties[prop_name])
-                        self.sorted_keys.sort()
-            elif prop == "edge.type":
-                self.edge_index[edge.type].add(edge)
-                if edge.type not in self.sorted_keys:
-                    self.sorted_keys.append(edge.type)
-                    self.sorted_keys.sort()
+    answers_constraints = False
     
-    def remove_node(self, node: Node) -> None:
-        """Remove a node from the index"""
-        for nodes in self.node_index.values():
-            if node in nodes:
-                nodes.remove(node)
+    def __init__(self, properties: List[str]):
+        if not all(prop.startswith("edge.") for prop in properties):
+            raise ValueError("Adjacency indexes cover edge properties only")
+        super().__init__(properties)
+        # Label -> number of keys filed under it
+        self.label_keys: Dict[Any, int] = defaultdict(int)
+    
+    def _keys(self, entity: Union[Node, Edge], kind: str) -> List[Any]:
+        if kind != "edge":
+            return []
+        keys = []
+        for label in super()._keys(entity, kind):
+            keys.append(("out", label, entity.source.id))
+            keys.append(("in", label, entity.target.id))
+        return keys
+    
+    def _file(self, buckets: Dict[Any, Dict], entity: Union[Node, Edge], key: Any) -> None:
+        if key not in buckets:
+            self.label_keys[key[1]] += 1
+        super()._file(buckets, entity, key)
+    
+    def _drop_key(self, buckets: Dict[Any, Dict], key: Any) -> None:
+        super()._drop_key(buckets, key)
+        remaining = self.label_keys[key[1]] - 1
+        if remaining:
+            self.label_keys[key[1]] = remaining
+        else:
+            del self.label_keys[key[1]]
     
-    def remove_edge(self, edge: Edge) -> None:
-        """Remove an edge from the index"""
-        for edges in self.edge_index.values():
-            if edge in edges:
-                edges.remove(edge)
+    def neighbours(self, node_id: str, label: Any, direction: str = "out") -> List[str]:
+        """Nodes one `label` edge away from a node, following it forwards ("out") or backwards ("in")"""
+        bucket = self.edge_index.get((direction, label, node_id))
+        if not bucket:
+            return []
+        if direction == "out":
+            return [edge.target.id for edge in bucket.values()]
+        return [edge.source.id for edge in bucket.values()]
+    
+    def labels(self) -> List[Any]:
+        """Labels at least one edge is filed under"""
+        return list(self.label_keys)
+
+
+# create_index index types
+INDEX_TYPES = {"hash": HashIndex, "btree": BTreeIndex, "adjacency": AdjacencyIndex}
+
+
+class PeriodIndex:
+    """
+    Temporal contexts ordered by start time, with precomputed midpoints and widths.
+    
+    Only periods whose bounds are both numbers are ordered; others (ISO
+    date strings, say) are kept aside and matched by plain comparison,
+    with no midpoint or width.
+    """
+    
+    def __init__(self):
+        # Context id -> (node, start, end, midpoint, width)
+        self.periods: Dict[str, Tuple[Node, Any, Any, Optional[float], Any]] = {}
+        self.starts: List[Tuple[Any, str]] = []
+        # Context id -> non-numeric period, not in starts
+        self.unordered: Dict[str, Tuple[Node, Any, Any, Optional[float], Any]] = {}
+        # Upper bound on any period's width; bounds how far back a stabbing query looks
+        self.max_width = 0
+    
+    def add_node(self, node: Node) -> None:
+        """Add a temporal context to the index"""
+        if node.type != "TemporalContext" or "startTime" not in node.properties or "endTime" not in node.properties:
+            return
+        start_time = node.properties["startTime"]
+        end_time = node.properties["endTime"]
+        if not _is_number(start_time) or not _is_number(end_time):
+            self.unordered[node.id] = (node, start_time, end_time, None, None)
+            return
+        width = end_time - start_time
+        self.periods[node.id] = (node, start_time, end_time, (start_time + end_time) / 2, width)
+        bisect.insort(self.starts, (start_time, node.id))
+        self.max_width = max(self.max_width, width)
+    
+    def remove_node(self, node: Node) -> None:
+        """Remove a temporal context from the index"""
+        if self.unordered.pop(node.id, None) is not None:
+            return
+        period = self.periods.pop(node.id, None)
+        if period is not None:
+            position = bisect.bisect_left(self.starts, (period[1], node.id))
+            del self.starts[position]
+    
+    def update_node(self, previous: Node, node: Node) -> None:
+        """Re-index a context replaced by an update, keeping its place if its period is unchanged"""
+        period = self.periods.get(node.id) or self.unordered.get(node.id)
+        if (period is not None and node.type == previous.type and
+                node.properties.get("startTime") == period[1] and node.properties.get("endTime") == period[2]):
+            (self.periods if node.id in self.periods else self.unordered)[node.id] = (node,) + period[1:]
+            return
+        self.remove_node(previous)
+        self.add_node(node)
+    
+    def containing(self, timestamp: Any) -> List[Tuple[Node, Any, Any, Optional[float], Any]]:
+        """Periods with start <= timestamp <= end; non-numeric ones come with midpoint and width None"""
+        result = []
+        if _is_number(timestamp):
+            low = bisect.bisect_left(self.starts, (timestamp - self.max_width,))
+            high = bisect.bisect_right(self.starts, (timestamp, chr(0x10FFFF)))
+            for _, context_id in self.starts[low:high]:
+                period = self.periods[context_id]
+                if period[2] >= timestamp:
+                    result.append(period)
+        else:
+            for period in self.periods.values():
+                try:
+                    if period[1] <= timestamp <= period[2]:
+                        result.append(period)
+                except TypeError:
+                    continue
+        for period in self.unordered.values():
+            try:
+                if period[1] <= timestamp <= period[2]:
+                    result.append(period)
+            except TypeError:
+                continue
+        return result
 
 
 # =============================================================================
@@ -391,8 +1624,8 @@ class BTreeIndex:
 class OntologicalGraph(Graph):
     """Graph for ontological knowledge - concepts, properties, and relations"""
     
-    def __init__(self, name: str):
-        super().__init__(name)
+    def __init__(self, name: str, storage: 'StorageEngine' = None):
+        super().__init__(name, storage)
         # Create indexes specific to ontological graphs
         self.create_index("concept_hierarchy", "btree", ["edge.type"])
         self.create_index("concept_properties", "hash", ["edge.type"])
@@ -508,7 +1741,8 @@ class OntologicalGraph(Graph):
             })
             
             for edge in subconcept_edges:
-                queue.append(edge.source)
+                # Edges keep the endpoint they were created with; updates replace nodes
+                queue.append(self.get_node(edge.source.id) or edge.source)
         
         return results
     
@@ -538,7 +1772,7 @@ class OntologicalGraph(Graph):
             })
             
             for edge in superconcept_edges:
-                queue.append(edge.target)
+                queue.append(self.get_node(edge.target.id) or edge.target)
         
         return results
 
@@ -546,11 +1780,46 @@ class OntologicalGraph(Graph):
 class InstanceGraph(Graph):
     """Graph for instance knowledge - concrete entities and their relationships"""
     
-    def __init__(self, name: str):
-        super().__init__(name)
+    def __init__(self, name: str, storage: 'StorageEngine' = None):
+        super().__init__(name, storage)
         # Create indexes specific to instance graphs
         self.create_index("entity_type", "hash", ["node.properties.conceptId"])
         self.create_index("relation_index", "hash", ["edge.type"])
+        # Candidate sources for ranked exemplification
+        self.create_index("entity_timestamp", "btree", ["node.properties.timestamp"])
+        self.create_index("entity_location", "hash", ["node.properties.location"])
+        # Reachability indexes by covered edge types (None: all), built on first use
+        self._reachability: Dict[Optional[frozenset], 'ReachabilityIndex'] = {}
+        # Context partitions, when enabled; maintained alongside the indexes
+        self.partitions: Optional['ContextPartitions'] = None
+    
+    def _update_indexes(self, operation: str, entity: Union[Node, Edge],
+                        previous: Union[Node, Edge] = None) -> None:
+        """Update all indexes and the context partitions"""
+        super()._update_indexes(operation, entity, previous)
+        partitions = self.partitions
+        if partitions is None:
+            return
+        if operation == "node_updated":
+            partitions.update_node(previous, entity)
+        elif operation == "node_removed":
+            partitions.remove_node(entity)
+        elif operation == "node_added":
+            partitions.add_node(entity)
+    
+    def _update_indexes_batch(self, changes: List[Tuple[str, Union[Node, Edge], Optional[Union[Node, Edge]]]]) -> None:
+        """Update all indexes and the context partitions for a batch of changes"""
+        super()._update_indexes_batch(changes)
+        partitions = self.partitions
+        if partitions is None:
+            return
+        for operation, entity, previous in changes:
+            if operation == "node_updated":
+                partitions.update_node(previous, entity)
+            elif operation == "node_removed":
+                partitions.remove_node(entity)
+            elif operation == "node_added":
+                partitions.add_node(entity)
     
     def add_entity(self, id: str, concept_id: str, properties: Dict[str, Any]) -> Node:
         """Add an entity node to the graph"""
@@ -593,16 +1862,58 @@ class InstanceGraph(Graph):
     def get_relations_for_entity(self, entity_id: str, direction: str = "both") -> List[Edge]:
         """Get all relations for an entity"""
         return self.get_edges_for_node(entity_id, direction)
+    
+    def reachability_index(self, edge_types: List[str] = None) -> 'ReachabilityIndex':
+        """Reachability over all relations, or only those of some relation or edge types"""
+        key = frozenset(edge_types) if edge_types is not None else None
+        index = self._reachability.get(key)
+        if index is None:
+            built = ReachabilityIndex(self, edge_types)
+            with self._lock:
+                index = self._reachability.setdefault(key, built)
+            if index is not built:
+                # Another thread built it first
+                built.close()
+        return index
+    
+    def reachable(self, source_id: str, target_id: str, edge_types: List[str] = None) -> bool:
+        """Whether any chain of relations (optionally of the given types) leads from source to target"""
+        return self.reachability_index(edge_types).reachable(source_id, target_id)
 
 
 class ContextGraph(Graph):
     """Graph for context knowledge - situations, perspectives, conditions"""
     
-    def __init__(self, name: str):
-        super().__init__(name)
+    def __init__(self, name: str, storage: 'StorageEngine' = None):
+        super().__init__(name, storage)
         # Create indexes specific to context graphs
         self.create_index("context_type", "hash", ["node.type"])
         self.create_index("context_hierarchy", "btree", ["edge.type"])
+        self.create_index("context_location", "hash", ["node.properties.location"])
+        # Maintained alongside the indexes; not a find_nodes access path
+        self.periods = PeriodIndex()
+    
+    def _update_indexes(self, operation: str, entity: Union[Node, Edge],
+                        previous: Union[Node, Edge] = None) -> None:
+        """Update all indexes and the temporal period index"""
+        super()._update_indexes(operation, entity, previous)
+        if operation == "node_updated":
+            self.periods.update_node(previous, entity)
+        elif operation == "node_removed":
+            self.periods.remove_node(entity)
+        elif operation == "node_added":
+            self.periods.add_node(entity)
+    
+    def _update_indexes_batch(self, changes: List[Tuple[str, Union[Node, Edge], Optional[Union[Node, Edge]]]]) -> None:
+        """Update all indexes and the temporal period index for a batch of changes"""
+        super()._update_indexes_batch(changes)
+        for operation, entity, previous in changes:
+            if operation == "node_updated":
+                self.periods.update_node(previous, entity)
+            elif operation == "node_removed":
+                self.periods.remove_node(entity)
+            elif operation == "node_added":
+                self.periods.add_node(entity)
     
     def add_context(self, id: str, context_type: str, properties: Dict[str, Any]) -> Node:
         """Add a context node to the graph"""
@@ -678,9 +1989,10 @@ class ContextGraph(Graph):
         
         incompatible_ids = {edge.target.id for edge in incompatible_edges}
         
-        for node in self.nodes.values():
-            if node.id != context_id and node.id not in incompatible_ids:
-                results.append(node)
+        with self._read() as version:
+            for node in version.nodes.values():
+                if node.id != context_id and node.id not in incompatible_ids:
+                    results.append(node)
         
         return results
 
@@ -693,21 +2005,44 @@ class Adjunction:
     """Implements an adjunction between two graphs"""
     
     def __init__(self, name: str, source_tkg: Any, source_graph: Graph, target_graph: Graph,
-                 left_mapping_function: Callable, right_mapping_function: Callable):
+                 left_mapping_function: Callable, right_mapping_function: Callable,
+                 left_candidates_function: Callable = None, right_candidates_function: Callable = None):
         self.name = name
         self.source_tkg = source_tkg
         self.source_graph = source_graph
         self.target_graph = target_graph
         self.left_mapping_function = left_mapping_function
         self.right_mapping_function = right_mapping_function
+        # Set-valued, batched variants: (nodes, tkg) -> {node id: [(mapped node, score)]}
+        self.left_candidates_function = left_candidates_function
+        self.right_candidates_function = right_candidates_function
         
         # Cache for adjunction results
         self.left_cache: Dict[str, str] = {}
         self.right_cache: Dict[str, str] = {}
+        self.left_candidates_cache: Dict[str, List[Tuple[str, float]]] = {}
+        self.right_candidates_cache: Dict[str, List[Tuple[str, float]]] = {}
+        
+        # Set by TrinitarianKnowledgeGraph.enable_metrics
+        self.metrics: Optional['MetricsRegistry'] = None
     
     def apply_left_adjoint(self, source_id: str) -> Optional[str]:
         """Apply the left adjoint functor to map from source to target"""
-        if source_id in self.left_cache:
+        if self.metrics is not None:
+            return self.metrics.time_adjoint(self, "left", source_id)
+        return self._apply_left_adjoint(source_id)
+    
+    def apply_right_adjoint(self, target_id: str) -> Optional[str]:
+        """Apply the right adjoint functor to map from target to source"""
+        if self.metrics is not None:
+            return self.metrics.time_adjoint(self, "right", target_id)
+        return self._apply_right_adjoint(target_id)
+    
+    def _apply_left_adjoint(self, source_id: str) -> Optional[str]:
+        """Uninstrumented left adjoint"""
+        # The caches hold mappings of the latest versions only
+        cached = not self.source_tkg._reading_past()
+        if cached and source_id in self.left_cache:
             return self.left_cache[source_id]
         
         source_node = self.source_graph.get_node(source_id)
@@ -716,13 +2051,15 @@ class Adjunction:
         
         target_node = self.left_mapping_function(source_node, self.source_tkg)
         if target_node:
-            self.left_cache[source_id] = target_node.id
+            if cached:
+                self.left_cache[source_id] = target_node.id
             return target_node.id
         return None
     
-    def apply_right_adjoint(self, target_id: str) -> Optional[str]:
-        """Apply the right adjoint functor to map from target to source"""
-        if target_id in self.right_cache:
+    def _apply_right_adjoint(self, target_id: str) -> Optional[str]:
+        """Uninstrumented right adjoint"""
+        cached = not self.source_tkg._reading_past()
+        if cached and target_id in self.right_cache:
             return self.right_cache[target_id]
         
         target_node = self.target_graph.get_node(target_id)
@@ -731,33 +2068,157 @@ class Adjunction:
         
         source_node = self.right_mapping_function(target_node, self.source_tkg)
         if source_node:
-            self.right_cache[target_id] = source_node.id
+            if cached:
+                self.right_cache[target_id] = source_node.id
             return source_node.id
         return None
     
+    def candidates(self, direction: str, node_ids: List[str]) -> Dict[str, List[Tuple[str, float]]]:
+        """Every scored mapping of a batch of nodes, memoized per node"""
+        if direction == "left":
+            cache = self.left_candidates_cache
+            graph = self.source_graph
+            batch_function = self.left_candidates_function
+            single_function = self.left_mapping_function
+        else:
+            cache = self.right_candidates_cache
+            graph = self.target_graph
+            batch_function = self.right_candidates_function
+            single_function = self.right_mapping_function
+        if self.source_tkg._reading_past():
+            # Mappings of a snapshot's versions are neither served from nor added to the cache
+            cache = {}
+        
+        result = {}
+        missing = []
+        for node_id in node_ids:
+            if node_id in cache:
+                result[node_id] = cache[node_id]
+                continue
+            node = graph.get_node(node_id)
+            if node:
+                missing.append(node)
+            else:
+                result[node_id] = []
+        
+        if self.metrics is not None:
+            labels = {"adjunction": self.name, "direction": f"{direction}_set"}
+            self.metrics.increment("tkg_adjunction_cache_hits_total", labels, len(node_ids) - len(missing))
+            self.metrics.increment("tkg_adjunction_cache_misses_total", labels, len(missing))
+        
+        if missing:
+            if batch_function:
+                computed = batch_function(missing, self.source_tkg)
+            else:
+                # No set-valued variant: fall back to the single best mapping
+                computed = {}
+                for node in missing:
+                    mapped = single_function(node, self.source_tkg)
+                    computed[node.id] = [(mapped, 1.0)] if mapped else []
+            for node in missing:
+                entries = [(mapped.id, score) for mapped, score in computed.get(node.id, [])]
+                cache[node.id] = entries
+                result[node.id] = entries
+        return result
+    
+    def invalidate(self, graph: Graph, node_id: str) -> None:
+        """Forget the cached mappings a change to one node of `graph` may affect"""
+        # A node's own mapping depends on its properties; mappings from the
+        # other side may now land on it, or no longer
+        if graph is self.source_graph:
+            self.left_cache.pop(node_id, None)
+            self.left_candidates_cache.pop(node_id, None)
+        else:
+            self.left_cache = {}
+            self.left_candidates_cache = {}
+        if graph is self.target_graph:
+            self.right_cache.pop(node_id, None)
+            self.right_candidates_cache.pop(node_id, None)
+        else:
+            self.right_cache = {}
+            self.right_candidates_cache = {}
+    
+    def has_cached(self) -> bool:
+        """Whether any mapping is cached"""
+        return bool(self.left_cache or self.right_cache or self.left_candidates_cache or self.right_candidates_cache)
+    
     def clear_cache(self) -> None:
         """Clear the adjunction caches"""
         self.left_cache = {}
         self.right_cache = {}
+        self.left_candidates_cache = {}
+        self.right_candidates_cache = {}
 
 
 # =============================================================================
 # 4. MAIN TKG SYSTEM
 # =============================================================================
 
+def _top_scored(scored: List[Tuple[Node, float]], k: int, entities: Mapping) -> List[Tuple[Node, float]]:
+    """
+    The k best (node, score) pairs, best first, with equal scores in the
+    order of `entities`, the node map they came from, as a stable sort of
+    a scan would give; that order is only looked up when ties decide it
+    """
+    top = heapq.nsmallest(k, scored, key=lambda item: -item[1])
+    if len(top) < 2 and len(scored) <= len(top):
+        return top
+    cutoff = top[-1][1]
+    counts = defaultdict(int)
+    for _, score in scored:
+        if score >= cutoff:
+            counts[score] += 1
+    tied = {score for score, count in counts.items() if count > 1}
+    if not tied:
+        return top
+    wanted = {node.id for node, score in scored if score in tied}
+    position = {key: order for order, key in enumerate(key for key in entities if key in wanted)}
+    return heapq.nsmallest(k, scored, key=lambda item: (-item[1], position.get(item[0].id, -1)))
+
+
 class TrinitarianKnowledgeGraph:
     """Main Trinitarian Knowledge Graph implementation"""
     
-    def __init__(self, name: str):
+    def __init__(self, name: str, storage: Callable[[], 'StorageEngine'] = None):
         self.name = name
         
-        # The three core graphs
-        self.ontological_graph = OntologicalGraph("Ontological")
-        self.instance_graph = InstanceGraph("Instance")
-        self.context_graph = ContextGraph("Context")
+        # The three core graphs; `storage` makes the engine for each, in memory by default
+        make_storage = storage or MemoryStorage
+        self.ontological_graph = OntologicalGraph("Ontological", make_storage())
+        self.instance_graph = InstanceGraph("Instance", make_storage())
+        self.context_graph = ContextGraph("Context", make_storage())
+        
+        # One writer lock across all three graphs; writes spanning them publish
+        # together, with _epoch odd meanwhile, so snapshots are mutually consistent
+        self._lock = threading.RLock()
+        self._epoch = 0
+        for graph in (self.ontological_graph, self.instance_graph, self.context_graph):
+            graph._lock = self._lock
         
         # Maps to store various structures
         self.adjunctions: Dict[str, Adjunction] = {}
+        self.views: Dict[str, 'MaterializedView'] = {}
+        self._metrics: Optional['MetricsRegistry'] = None
+        # Compiled traversal plans keyed by start graph and (adjunction, direction) steps
+        self._plan_cache: Dict[Tuple, List[Tuple[Adjunction, str, str]]] = {}
+        # Drops the adjunction cache entries a change can affect
+        self._cache_subscription: Optional[Subscription] = None
+        # EXPLAIN ANALYZE swaps in a tracing registry; one at a time
+        self._explain_lock = threading.Lock()
+        self.auto_indexer: Optional['AutoIndexer'] = None
+        # Embedding bridge: graph name -> VectorIndex
+        self.vector_indexes: Dict[str, 'VectorIndex'] = {}
+        # Keyword search: graph name -> TextIndex
+        self.text_indexes: Dict[str, 'TextIndex'] = {}
+        # Opt-in time travel: graph name -> GraphHistory, plus past TKGs by version
+        self.history: Dict[str, 'GraphHistory'] = {}
+        self._as_of_cache: Dict[Tuple[int, int, int], 'TrinitarianKnowledgeGraph'] = {}
+        # Entity importance used by the exemplification/contextualization rankings
+        self.analytics: Optional['InstanceAnalytics'] = None
+        self.importance_weight = 0.5
+        # Replication: serving this TKG's changes, or following another's
+        self.replication: Optional['ReplicationPrimary'] = None
+        self.replica: Optional['Replica'] = None
     
     def initialize_adjunctions(self) -> None:
         """Initialize the predefined adjunctions between the three graphs"""
@@ -768,7 +2229,9 @@ class TrinitarianKnowledgeGraph:
             self.ontological_graph,
             self.instance_graph,
             self.instantiation_left_adjoint,
-            self.instantiation_right_adjoint
+            self.instantiation_right_adjoint,
+            self.instantiation_left_candidates,
+            self.instantiation_right_candidates
         )
         
         # 2. Classification: Instance → Ontological
@@ -778,7 +2241,9 @@ class TrinitarianKnowledgeGraph:
             self.instance_graph,
             self.ontological_graph,
             self.classification_left_adjoint,
-            self.classification_right_adjoint
+            self.classification_right_adjoint,
+            self.classification_left_candidates,
+            self.classification_right_candidates
         )
         
         # 3. Contextualization: Instance → Context
@@ -788,7 +2253,9 @@ class TrinitarianKnowledgeGraph:
             self.instance_graph,
             self.context_graph,
             self.contextualization_left_adjoint,
-            self.contextualization_right_adjoint
+            self.contextualization_right_adjoint,
+            self.contextualization_left_candidates,
+            self.contextualization_right_candidates
         )
         
         # 4. Exemplification: Context → Instance
@@ -798,7 +2265,9 @@ class TrinitarianKnowledgeGraph:
             self.context_graph,
             self.instance_graph,
             self.exemplification_left_adjoint,
-            self.exemplification_right_adjoint
+            self.exemplification_right_adjoint,
+            self.exemplification_left_candidates,
+            self.exemplification_right_candidates
         )
         
         # 5. Interpretation: Context → Ontological
@@ -808,7 +2277,9 @@ class TrinitarianKnowledgeGraph:
             self.context_graph,
             self.ontological_graph,
             self.interpretation_left_adjoint,
-            self.interpretation_right_adjoint
+            self.interpretation_right_adjoint,
+            self.interpretation_left_candidates,
+            self.interpretation_right_candidates
         )
         
         # 6. Applicability: Ontological → Context
@@ -818,8 +2289,15 @@ class TrinitarianKnowledgeGraph:
             self.ontological_graph,
             self.context_graph,
             self.applicability_left_adjoint,
-            self.applicability_right_adjoint
+            self.applicability_right_adjoint,
+            self.applicability_left_candidates,
+            self.applicability_right_candidates
         )
+        
+        self._attach_metrics(self._metrics)
+        self._plan_cache.clear()
+        if self._cache_subscription is None:
+            self._cache_subscription = self.subscribe(self._invalidate_adjunctions)
     
     # Adjoint functor implementations
     
@@ -874,6 +2352,9 @@ class TrinitarianKnowledgeGraph:
             })
             relevant_contexts.extend(spatial_contexts)
         
+        if relevant_contexts and tkg.analytics is not None:
+            # The context in which the instance matters most
+            return max(relevant_contexts, key=lambda context: tkg.analytics.importance(instance_node.id, context.id))
         # Return the first relevant context (simplified for demo)
         if relevant_contexts:
             return relevant_contexts[0]
@@ -881,27 +2362,33 @@ class TrinitarianKnowledgeGraph:
     
     def contextualization_right_adjoint(self, context_node: Node, tkg: 'TrinitarianKnowledgeGraph') -> Optional[Node]:
         """Map a context to representative instances"""
-        relevant_instances = []
-        
-        # Find instances relevant to this context based on its type
-        if context_node.type == "SpatialContext" and "location" in context_node.properties:
-            location = context_node.properties["location"]
-            location_instances = tkg.instance_graph.find_nodes({
-                "properties.location": location
-            })
-            relevant_instances.extend(location_instances)
-        
-        elif context_node.type == "TemporalContext" and "startTime" in context_node.properties and "endTime" in context_node.properties:
-            start_time = context_node.properties["startTime"]
-            end_time = context_node.properties["endTime"]
-            time_instances = tkg.instance_graph.find_nodes({
-                "$and": [
-                    {"properties.timestamp": {"$gte": start_time}},
-                    {"properties.timestamp": {"$lte": end_time}}
-                ]
-            })
-            relevant_instances.extend(time_instances)
+        # Partitioned instances: read only the partitions the context overlaps
+        relevant_instances = tkg.scoped_instances(context_node, bounded=True)
+        if relevant_instances is None:
+            relevant_instances = []
+            
+            # Find instances relevant to this context based on its type
+            if context_node.type == "SpatialContext" and "location" in context_node.properties:
+                location = context_node.properties["location"]
+                location_instances = tkg.instance_graph.find_nodes({
+                    "properties.location": location
+                })
+                relevant_instances.extend(location_instances)
+            
+            elif context_node.type == "TemporalContext" and "startTime" in context_node.properties and "endTime" in context_node.properties:
+                start_time = context_node.properties["startTime"]
+                end_time = context_node.properties["endTime"]
+                time_instances = tkg.instance_graph.find_nodes({
+                    "$and": [
+                        {"properties.timestamp": {"$gte": start_time}},
+                        {"properties.timestamp": {"$lte": end_time}}
+                    ]
+                })
+                relevant_instances.extend(time_instances)
         
+        if relevant_instances and tkg.analytics is not None:
+            # The most important instance within the context
+            return max(relevant_instances, key=lambda instance: tkg.analytics.importance(instance.id, context_node.id))
         # Return the first relevant instance (simplified for demo)
         if relevant_instances:
             return relevant_instances[0]
@@ -909,94 +2396,139 @@ class TrinitarianKnowledgeGraph:
     
     def exemplification_left_adjoint(self, context_node: Node, tkg: 'TrinitarianKnowledgeGraph') -> Optional[Node]:
         """Map a context to representative instances (Context → Instance)"""
-        # Find the most representative instance for this context
-        relevant_instances = []
-        
-        # Different logic depending on context type
-        if context_node.type == "TemporalContext" and "startTime" in context_node.properties and "endTime" in context_node.properties:
-            # For temporal contexts, find instances with timestamps in the middle of the period
-            # (most representative of the time period)
-            start_time = context_node.properties["startTime"]
-            end_time = context_node.properties["endTime"]
-            mid_time = (start_time + end_time) / 2
-            
-            # Find entities with timestamps close to the middle of the period
-            all_instances = list(tkg.instance_graph.nodes.values())
-            for instance in all_instances:
-                if "timestamp" in instance.properties:
-                    timestamp = instance.properties["timestamp"]
-                    # Calculate how central this instance is to the time period
-                    if start_time <= timestamp <= end_time:
-                        # Add to relevant instances with a score based on centrality
-                        distance_from_mid = abs(timestamp - mid_time)
-                        range_halfwidth = (end_time - start_time) / 2
-                        centrality = 1.0 - (distance_from_mid / range_halfwidth)
-                        relevant_instances.append((instance, centrality))
-        
-        elif context_node.type == "SpatialContext" and "location" in context_node.properties:
-            # For spatial contexts, find instances in that location
-            location = context_node.properties["location"]
-            all_instances = list(tkg.instance_graph.nodes.values())
-            for instance in all_instances:
-                if instance.properties.get("location") == location:
-                    # All matching instances are equally relevant for spatial contexts
-                    relevant_instances.append((instance, 1.0))
-        
-        # Sort by relevance score and take the most relevant
-        relevant_instances.sort(key=lambda x: x[1], reverse=True)
-        if relevant_instances:
-            return relevant_instances[0][0]
-        
-        return None
+        # The most representative instance for this context
+        ranked = tkg.rank_exemplars(context_node, 1)
+        return ranked[0][0] if ranked else None
 
     def exemplification_right_adjoint(self, instance_node: Node, tkg: 'TrinitarianKnowledgeGraph') -> Optional[Node]:
         """Map an instance to contexts it exemplifies (Instance → Context)"""
-        # Find contexts that this instance exemplifies - typically the most specific
-        # applicable context where this instance is particularly representative
-        relevant_contexts = []
+        # The most specific applicable context where this instance is particularly representative
+        ranked = tkg.rank_exemplified_contexts(instance_node, 1)
+        return ranked[0][0] if ranked else None
+    
+    def rank_exemplars(self, context: Union[str, Node], k: int = 10) -> List[Tuple[Node, float]]:
+        """
+        Top-k instances most representative of a context, best first.
         
-        # Check for temporal relevance
-        if "timestamp" in instance_node.properties:
-            timestamp = instance_node.properties["timestamp"]
-            temporal_contexts = tkg.context_graph.get_nodes_of_type("TemporalContext")
+        Temporal contexts score instances by how central their timestamp is to
+        the period; spatial contexts score every instance at the location 1.0.
+        With importance ranking enabled the score is blended with the
+        instance's PageRank within the context. Candidates come from the
+        instance graph's timestamp and location indexes; equal scores come in
+        the instance graph's order.
+        """
+        context_node = self.context_graph.get_node(context) if isinstance(context, str) else context
+        if context_node is None or k <= 0:
+            return []
+        
+        scored = self._exemplar_candidates(context_node)
+        if self.analytics is not None:
+            # Blend in how important each instance is within the context
+            scored = [(instance, score * self._importance_factor(instance.id, context_node.id))
+                      for instance, score in scored]
+        return _top_scored(scored, k, self.instance_graph.nodes)
+    
+    def _exemplar_candidates(self, context_node: Node) -> List[Tuple[Node, float]]:
+        """Instances that fall in a context with their representativeness, from the partitions or instance indexes"""
+        graph = self.instance_graph
+        with graph._read() as version:
+            scored = []
+            scoped = self._scoped_instances(context_node, None, True, version)
+            if context_node.type == "TemporalContext" and "startTime" in context_node.properties and "endTime" in context_node.properties:
+                # For temporal contexts, prefer instances with timestamps in the middle of the period
+                start_time = context_node.properties["startTime"]
+                end_time = context_node.properties["endTime"]
+                if not _is_number(start_time) or not _is_number(end_time):
+                    # Centrality needs arithmetic on the bounds; non-numeric periods rank nothing
+                    return scored
+                mid_time = (start_time + end_time) / 2
+                range_halfwidth = (end_time - start_time) / 2
+                if scoped is not None:
+                    candidates = scoped
+                else:
+                    index = graph.indexes["entity_timestamp"]
+                    try:
+                        candidates = graph._index_read(version, lambda: index.range_nodes(start_time, end_time))
+                    except TypeError:
+                        # Timestamps of mixed types
+                        candidates = None
+                    if candidates is None:
+                        # Compare the numeric timestamps of the pinned version directly
+                        candidates = [instance for instance in version.nodes.values()
+                                      if _is_number(instance.properties.get("timestamp"))
+                                      and start_time <= instance.properties["timestamp"] <= end_time]
+                for instance in candidates:
+                    if range_halfwidth > 0:
+                        centrality = 1.0 - abs(instance.properties["timestamp"] - mid_time) / range_halfwidth
+                    else:
+                        centrality = 1.0
+                    scored.append((instance, centrality))
             
-            for context in temporal_contexts:
-                if "startTime" in context.properties and "endTime" in context.properties:
-                    start_time = context.properties["startTime"]
-                    end_time = context.properties["endTime"]
-                    
-                    if start_time <= timestamp <= end_time:
-                        # Calculate how representative this instance is for the context
-                        # (smaller time periods where instance is more central get higher scores)
-                        period_width = end_time - start_time
-                        mid_time = (start_time + end_time) / 2
-                        distance_from_mid = abs(timestamp - mid_time)
-                        
-                        # Instances closer to the middle of narrower periods are more representative
-                        if period_width > 0:
-                            specificity = 1.0 / period_width
-                            centrality = 1.0 - (distance_from_mid / (period_width / 2))
-                            score = specificity * centrality
-                            relevant_contexts.append((context, score))
-        
-        # Check for spatial relevance
-        if "location" in instance_node.properties:
-            location = instance_node.properties["location"]
-            spatial_contexts = tkg.context_graph.get_nodes_of_type("SpatialContext")
+            elif context_node.type == "SpatialContext" and "location" in context_node.properties:
+                # All instances at the location are equally relevant for spatial contexts
+                if scoped is not None:
+                    bucket = scoped
+                else:
+                    location = context_node.properties["location"]
+                    index = graph.indexes["entity_location"]
+                    # Unhashable locations are not indexed; compare them directly
+                    bucket = graph._index_read(version, lambda: index.lookup(location)) if _is_hashable(location) else None
+                    if bucket is None:
+                        bucket = [instance for instance in version.nodes.values()
+                                  if instance.properties.get("location") == location]
+                scored = [(instance, 1.0) for instance in bucket]
             
-            for context in spatial_contexts:
-                if context.properties.get("location") == location:
-                    # For spatial contexts, use any additional properties to determine
-                    # how representative this instance is for the context
-                    # (for now, just use a default score)
-                    relevant_contexts.append((context, 0.8))
-        
-        # Sort by relevance score and take the most relevant
-        relevant_contexts.sort(key=lambda x: x[1], reverse=True)
-        if relevant_contexts:
-            return relevant_contexts[0][0]
+            return scored
+    
+    def rank_exemplified_contexts(self, instance: Union[str, Node], k: int = 10) -> List[Tuple[Node, float]]:
+        """
+        Top-k contexts an instance exemplifies, best first.
         
-        return None
+        Temporal contexts score specificity (1 / period width) times how central
+        the instance is to the period; spatial contexts at the instance's
+        location score 0.8. Equal scores come in the context graph's order.
+        """
+        instance_node = self.instance_graph.get_node(instance) if isinstance(instance, str) else instance
+        if instance_node is None or k <= 0:
+            return []
+        
+        scored = []
+        graph = self.context_graph
+        with graph._read() as version:
+            if "timestamp" in instance_node.properties:
+                timestamp = instance_node.properties["timestamp"]
+                periods = graph._index_read(version, lambda: graph.periods.containing(timestamp))
+                if periods is None:
+                    # The shared period index has moved past the pinned version; index its own contexts
+                    index = PeriodIndex()
+                    for context in version.nodes.values():
+                        index.add_node(context)
+                    periods = index.containing(timestamp)
+                for context, _, _, mid_time, period_width in periods:
+                    # Instances closer to the middle of narrower periods are more representative
+                    if period_width is not None and period_width > 0:
+                        centrality = 1.0 - abs(timestamp - mid_time) / (period_width / 2)
+                        scored.append((context, centrality / period_width))
+            
+            if "location" in instance_node.properties:
+                location = instance_node.properties["location"]
+                index = graph.indexes["context_location"]
+                # Unhashable locations are not indexed; compare them directly
+                bucket = graph._index_read(version, lambda: index.lookup(location)) if _is_hashable(location) else None
+                if bucket is None:
+                    bucket = [context for context in version.nodes.values()
+                              if context.properties.get("location") == location]
+                scored.extend((context, 0.8) for context in bucket if context.type == "SpatialContext")
+        
+        if self.analytics is not None:
+            scored = [(context, score * self._importance_factor(instance_node.id, context.id))
+                      for context, score in scored]
+        return _top_scored(scored, k, self.context_graph.nodes)
+    
+    def _importance_factor(self, instance_id: str, context_id: str = None) -> float:
+        """Multiplier blending an instance's normalized importance into a ranking score"""
+        weight = self.importance_weight
+        return (1.0 - weight) + weight * self.analytics.importance(instance_id, context_id)
     
     def interpretation_left_adjoint(self, context_node: Node, tkg: 'TrinitarianKnowledgeGraph') -> Optional[Node]:
         """Map a context to ontological concepts that are relevant in this context"""
@@ -1057,15 +2589,602 @@ class TrinitarianKnowledgeGraph:
         """Map a context to concepts it applies to"""
         return tkg.interpretation_left_adjoint(context_node, tkg)
     
+    # Set-valued adjoint implementations, batched for frontier traversal
+    
+    def instantiation_left_candidates(self, concept_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map concepts to all of their instances in one pass over the instance graph"""
+        result = {node.id: [] for node in concept_nodes}
+        for entity in tkg.instance_graph.get_nodes_of_type("Entity"):
+            matches = result.get(entity.properties.get("conceptId"))
+            if matches is not None:
+                matches.append((entity, 1.0))
+        return result
+    
+    def instantiation_right_candidates(self, instance_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map instances to their concepts"""
+        result = {}
+        for node in instance_nodes:
+            concept = tkg.instantiation_right_adjoint(node, tkg)
+            result[node.id] = [(concept, 1.0)] if concept else []
+        return result
+    
+    def classification_left_candidates(self, instance_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map instances to their concepts"""
+        return tkg.instantiation_right_candidates(instance_nodes, tkg)
+    
+    def classification_right_candidates(self, concept_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map concepts to all of their instances"""
+        return tkg.instantiation_left_candidates(concept_nodes, tkg)
+    
+    def _contexts_by_kind(self, tkg: 'TrinitarianKnowledgeGraph') -> Tuple[List[Node], Dict[Any, List[Node]]]:
+        """Temporal contexts with both bounds, and spatial contexts grouped by location"""
+        temporal = [
+            context for context in tkg.context_graph.get_nodes_of_type("TemporalContext")
+            if "startTime" in context.properties and "endTime" in context.properties
+        ]
+        spatial = defaultdict(list)
+        for context in tkg.context_graph.get_nodes_of_type("SpatialContext"):
+            if "location" in context.properties:
+                spatial[context.properties["location"]].append(context)
+        return temporal, spatial
+    
+    def contextualization_left_candidates(self, instance_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map instances to every temporal and spatial context they fall in"""
+        temporal, spatial = tkg._contexts_by_kind(tkg)
+        result = {}
+        for instance in instance_nodes:
+            matches = []
+            if "timestamp" in instance.properties:
+                timestamp = instance.properties["timestamp"]
+                matches.extend(
+                    (context, 1.0) for context in temporal
+                    if context.properties["startTime"] <= timestamp <= context.properties["endTime"]
+                )
+            if "location" in instance.properties:
+                matches.extend((context, 1.0) for context in spatial.get(instance.properties["location"], ()))
+            result[instance.id] = matches
+        return result
+    
+    def _instances_for_contexts(self, context_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph',
+                                temporal_score: Callable[[Node, Any], float],
+                                spatial_score: float) -> Dict[str, List[Tuple[Node, float]]]:
+        """One pass over the instance graph matching every context in the batch"""
+        result = {node.id: [] for node in context_nodes}
+        temporal = [
+            context for context in context_nodes
+            if context.type == "TemporalContext" and
+            "startTime" in context.properties and "endTime" in context.properties
+        ]
+        spatial = defaultdict(list)
+        for context in context_nodes:
+            if context.type == "SpatialContext" and "location" in context.properties:
+                spatial[context.properties["location"]].append(context)
+        
+        with tkg.instance_graph._read() as version:
+            for instance in version.nodes.values():
+                properties = instance.properties
+                if temporal and "timestamp" in properties:
+                    timestamp = properties["timestamp"]
+                    for context in temporal:
+                        if context.properties["startTime"] <= timestamp <= context.properties["endTime"]:
+                            result[context.id].append((instance, temporal_score(context, timestamp)))
+                if spatial and "location" in properties:
+                    for context in spatial.get(properties["location"], ()):
+                        result[context.id].append((instance, spatial_score))
+        return result
+    
+    def contextualization_right_candidates(self, context_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map contexts to every instance that falls in them"""
+        return tkg._instances_for_contexts(context_nodes, tkg, lambda context, timestamp: 1.0, 1.0)
+    
+    def exemplification_left_candidates(self, context_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map contexts to their instances, scored by how central they are to the period"""
+        def centrality(context: Node, timestamp: Any) -> float:
+            start_time = context.properties["startTime"]
+            end_time = context.properties["endTime"]
+            range_halfwidth = (end_time - start_time) / 2
+            if range_halfwidth <= 0:
+                return 1.0
+            return 1.0 - abs(timestamp - (start_time + end_time) / 2) / range_halfwidth
+        
+        return tkg._instances_for_contexts(context_nodes, tkg, centrality, 1.0)
+    
+    def exemplification_right_candidates(self, instance_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map instances to the contexts they exemplify, scored as exemplification_right_adjoint does"""
+        temporal, spatial = tkg._contexts_by_kind(tkg)
+        result = {}
+        for instance in instance_nodes:
+            matches = []
+            if "timestamp" in instance.properties:
+                timestamp = instance.properties["timestamp"]
+                for context in temporal:
+                    start_time = context.properties["startTime"]
+                    end_time = context.properties["endTime"]
+                    period_width = end_time - start_time
+                    if start_time <= timestamp <= end_time and period_width > 0:
+                        centrality = 1.0 - abs(timestamp - (start_time + end_time) / 2) / (period_width / 2)
+                        matches.append((context, centrality / period_width))
+            if "location" in instance.properties:
+                matches.extend((context, 0.8) for context in spatial.get(instance.properties["location"], ()))
+            result[instance.id] = matches
+        return result
+    
+    def interpretation_left_candidates(self, context_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map contexts to every concept relevant in them"""
+        temporal_concepts = tkg.ontological_graph.find_nodes({"type": "Concept", "properties.temporal": True})
+        spatial_concepts = tkg.ontological_graph.find_nodes({"type": "Concept", "properties.spatial": True})
+        all_concepts = tkg.ontological_graph.get_nodes_of_type("Concept")
+        # Same fallback as interpretation_left_adjoint: any concept
+        fallback = [(all_concepts[0], 1.0)] if all_concepts else []
+        
+        result = {}
+        for context in context_nodes:
+            if context.type == "TemporalContext" and temporal_concepts:
+                result[context.id] = [(concept, 1.0) for concept in temporal_concepts]
+            elif context.type == "SpatialContext" and spatial_concepts:
+                result[context.id] = [(concept, 1.0) for concept in spatial_concepts]
+            else:
+                result[context.id] = list(fallback)
+        return result
+    
+    def interpretation_right_candidates(self, concept_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map concepts to every context where they are relevant"""
+        temporal_contexts = tkg.context_graph.get_nodes_of_type("TemporalContext")
+        spatial_contexts = tkg.context_graph.get_nodes_of_type("SpatialContext")
+        first_context = next(iter(tkg.context_graph.nodes.values()), None)
+        
+        result = {}
+        for concept in concept_nodes:
+            matches = []
+            if concept.properties.get("temporal"):
+                matches.extend((context, 1.0) for context in temporal_contexts)
+            if concept.properties.get("spatial"):
+                matches.extend((context, 1.0) for context in spatial_contexts)
+            if not matches and first_context is not None:
+                matches.append((first_context, 1.0))
+            result[concept.id] = matches
+        return result
+    
+    def applicability_left_candidates(self, concept_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map concepts to every context where they apply"""
+        return tkg.interpretation_right_candidates(concept_nodes, tkg)
+    
+    def applicability_right_candidates(self, context_nodes: List[Node], tkg: 'TrinitarianKnowledgeGraph') -> Dict[str, List[Tuple[Node, float]]]:
+        """Map contexts to every concept they apply to"""
+        return tkg.interpretation_left_candidates(context_nodes, tkg)
+    
+    def _invalidate_adjunctions(self, events: List[GraphEvent]) -> None:
+        """Invalidate the adjunction caches added, removed or updated entities may affect"""
+        cached = [adjunction for adjunction in self.adjunctions.values() if adjunction.has_cached()]
+        if not cached:
+            return
+        for event in events:
+            if isinstance(event.entity, Edge):
+                # Mappings follow hierarchies and relations, so any of them may change
+                for adjunction in cached:
+                    adjunction.clear_cache()
+                return
+            for adjunction in cached:
+                adjunction.invalidate(event.entity.graph, event.entity.id)
+    
     def clear_adjunction_caches(self) -> None:
         """Clear all adjunction caches"""
         for adjunction in self.adjunctions.values():
             adjunction.clear_cache()
     
-    # Context-aware operations
-    
-    def is_concept_applicable_in_context(self, concept_id: str, context_id: str) -> bool:
-        """Check if a concept is applicable in a given context"""
+    def subscribe(self, callback: Callable[[List[GraphEvent]], None],
+                  operations: List[str] = None, batch_size: int = 1,
+                  queued: bool = False) -> Subscription:
+        """Subscribe one callback to change events from all three graphs"""
+        subscription = self.ontological_graph.subscribe(callback, operations, batch_size, queued)
+        subscription.attach(self.instance_graph)
+        subscription.attach(self.context_graph)
+        return subscription
+    
+    def enable_metrics(self) -> 'MetricsRegistry':
+        """Start collecting latency histograms and counters"""
+        if self._metrics is None:
+            self._attach_metrics(MetricsRegistry())
+        return self._metrics
+    
+    def disable_metrics(self) -> None:
+        """Stop collecting metrics; instrumented paths go back to a single None check"""
+        self._attach_metrics(None)
+    
+    def _attach_metrics(self, registry: Optional['MetricsRegistry']) -> None:
+        """Point the graphs and adjunctions at a registry (or None)"""
+        self._metrics = registry
+        for graph in (self.ontological_graph, self.instance_graph, self.context_graph):
+            graph._metrics = registry
+        for adjunction in self.adjunctions.values():
+            adjunction.metrics = registry
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Snapshot of all collected metrics"""
+        if self._metrics is None:
+            return {"enabled": False, "histograms": {}, "counters": {}}
+        return self._metrics.snapshot()
+    
+    def metrics_prometheus(self) -> str:
+        """Collected metrics in the Prometheus text exposition format"""
+        if self._metrics is None:
+            return ""
+        return self._metrics.to_prometheus()
+    
+    def enable_auto_indexing(self, memory_budget: int = 16 * 1024 * 1024, min_queries: int = 10,
+                             max_selectivity: float = 0.25, idle_windows: int = 3,
+                             interval: float = 1.0, background: bool = True) -> 'AutoIndexer':
+        """Observe find_nodes/find_edges and build or drop indexes to fit the workload"""
+        self.disable_auto_indexing()
+        indexer = AutoIndexer(self, memory_budget, min_queries, max_selectivity, idle_windows, interval)
+        for graph in (self.ontological_graph, self.instance_graph, self.context_graph):
+            graph._observer = indexer.observer
+        self.auto_indexer = indexer
+        if background:
+            indexer.start()
+        return indexer
+    
+    def disable_auto_indexing(self, drop_indexes: bool = False) -> None:
+        """Stop observing the workload, optionally dropping every index it built"""
+        indexer = self.auto_indexer
+        if indexer is None:
+            return
+        indexer.stop()
+        for graph in (self.ontological_graph, self.instance_graph, self.context_graph):
+            graph._observer = None
+        if drop_indexes:
+            indexer.drop_all()
+        self.auto_indexer = None
+    
+    def enable_importance_ranking(self, weight: float = 0.5, contexts: List[str] = None,
+                                  **options) -> 'InstanceAnalytics':
+        """
+        Compute entity importance and let the adjoints rank by it.
+        
+        `weight` is how much of a ranking score comes from importance; 0 keeps
+        the original scores. Personalized PageRank is computed for `contexts`
+        (every context if None). Call refresh() on the returned analytics
+        after changes; rankings use the last computed scores meanwhile.
+        """
+        if not 0 <= weight <= 1:
+            raise ValueError("weight must be in [0, 1]")
+        analytics = InstanceAnalytics(self, **options)
+        if contexts is None:
+            contexts = list(self.context_graph.nodes)
+        analytics.compute(contexts)
+        self.importance_weight = weight
+        self.analytics = analytics
+        self.clear_adjunction_caches()
+        return analytics
+    
+    def disable_importance_ranking(self) -> None:
+        """Go back to the original ranking scores"""
+        self.analytics = None
+        self.clear_adjunction_caches()
+    
+    def enable_partitioning(self, granularity: float = 100,
+                            regions: Dict[str, str] = None) -> 'ContextPartitions':
+        """
+        Partition instances by time (`granularity` timestamp units each) and
+        by region (`regions` maps locations to regions) so context-scoped
+        reads open only the partitions a context overlaps. Query answers do
+        not change: instances outside those partitions are still checked for
+        relevance, which the adjunction fallbacks can grant.
+        """
+        partitions = ContextPartitions(granularity, regions)
+        graph = self.instance_graph
+        with graph._lock:
+            for node in graph.nodes.values():
+                partitions.add_node(node)
+            graph.partitions = partitions
+        self.clear_adjunction_caches()
+        return partitions
+    
+    def disable_partitioning(self) -> None:
+        """Go back to one unpartitioned set of instances"""
+        self.instance_graph.partitions = None
+        self.clear_adjunction_caches()
+    
+    def scoped_instances(self, context: Union[str, Node], concept_id: str = None,
+                         bounded: bool = False) -> Optional[List[Node]]:
+        """
+        Instances (optionally of one concept) in a context's partitions, or
+        None when partitioning is off or cannot scope the context.
+        `bounded` drops those without a timestamp or location, leaving the
+        instances the context's own relevance check admits directly.
+        """
+        partitions = self.instance_graph.partitions
+        if partitions is None:
+            return None
+        context_node = self.context_graph.get_node(context) if isinstance(context, str) else context
+        if context_node is None:
+            return None
+        with self.instance_graph._read() as version:
+            return self._scoped_instances(context_node, concept_id, bounded, version)
+    
+    def _scoped_instances(self, context_node: Node, concept_id: Optional[str], bounded: bool,
+                          version: GraphVersion) -> Optional[List[Node]]:
+        """scoped_instances for a reader holding `version` of the instance graph"""
+        graph = self.instance_graph
+        partitions = graph.partitions
+        if partitions is None:
+            return None
+        # Maintained alongside the indexes, so unusable (None) once they have moved past the version
+        return graph._index_read(version, lambda: partitions.scan(context_node, concept_id, bounded))
+    
+    def create_vector_index(self, graph_name: str, dimension: int, metric: str = "cosine") -> 'VectorIndex':
+        """Create (or replace) the embedding index of one graph"""
+        index = VectorIndex(self.get_graph(graph_name), dimension, metric)
+        previous = self.vector_indexes.get(graph_name)
+        if previous is not None:
+            previous.close()
+        self.vector_indexes[graph_name] = index
+        return index
+    
+    def similar_nodes(self, graph_name: str, query: Any, k: int = 10, node_type: str = None,
+                      context_id: str = None, approximate: bool = False, nprobe: int = 8) -> List[Dict[str, Any]]:
+        """
+        k-NN over a graph's embeddings, optionally scoped to a context.
+        
+        In a context, instances must be relevant to it, concepts applicable in
+        it and contexts compatible with it.
+        """
+        index = self.vector_indexes.get(graph_name)
+        if index is None:
+            raise ValueError(f"No vector index on the {graph_name} graph")
+        predicate = self._context_predicate(graph_name, context_id) if context_id is not None else None
+        graph = self.get_graph(graph_name)
+        return [
+            {"nodeId": node_id, "node": graph.get_node(node_id), "score": score}
+            for node_id, score in index.search(query, k, node_type, predicate, approximate, nprobe)
+        ]
+    
+    def _context_predicate(self, graph_name: str, context_id: str) -> Callable[[str], bool]:
+        """Whether a node of the graph belongs in a context: relevant, applicable or compatible"""
+        context = self.context_graph.get_node(context_id)
+        if context is None:
+            raise ValueError(f"Context {context_id} not found")
+        if graph_name == "instance":
+            return lambda node_id: self.is_instance_relevant_in_context(node_id, context_id)
+        elif graph_name == "ontological":
+            return lambda node_id: self.is_concept_applicable_in_context(node_id, context_id)
+        return lambda node_id: self.contexts_are_compatible(self.context_graph.get_node(node_id), context)
+    
+    def path_query(self, graph_name: str, start_ids: Union[str, List[str]], expression: str,
+                   context_id: str = None, max_depth: int = None, limit: int = None) -> List[Dict[str, Any]]:
+        """
+        Regular path query over one graph, nearest first; see Graph.path_query.
+        
+        In a context, every hop must land on a node that belongs in it.
+        """
+        predicate = self._context_predicate(graph_name, context_id) if context_id is not None else None
+        graph = self.get_graph(graph_name)
+        return [
+            {"nodeId": node_id, "node": graph.get_node(node_id), "hops": hops}
+            for node_id, hops in graph.path_query(start_ids, expression, max_depth, limit, predicate).items()
+        ]
+    
+    def create_text_index(self, graph_name: str, properties: List[str] = None) -> 'TextIndex':
+        """Create (or replace) the full-text index of one graph"""
+        index = TextIndex(self.get_graph(graph_name), properties or list(TEXT_PROPERTIES))
+        previous = self.text_indexes.get(graph_name)
+        if previous is not None:
+            previous.close()
+        self.text_indexes[graph_name] = index
+        return index
+    
+    def text_search(self, query: str, graph_name: str = None, k: int = 10, node_type: str = None,
+                    context_id: str = None) -> List[Dict[str, Any]]:
+        """
+        BM25 keyword search over the text-indexed graphs, best first.
+        
+        The last query word also matches as a prefix. A trailing
+        "IN CONTEXT <id>" (or `context_id`) keeps only nodes that belong in
+        that context. Without `graph_name` every text-indexed graph is
+        searched and the results merged by score.
+        """
+        match = re.match(r"^(.*?)\s+IN\s+CONTEXT\s+(\S+)\s*$", query, re.IGNORECASE)
+        if match:
+            query, context_id = match.group(1), match.group(2)
+        names = [graph_name] if graph_name is not None else list(self.text_indexes)
+        results = []
+        for name in names:
+            index = self.text_indexes.get(name)
+            if index is None:
+                raise ValueError(f"No text index on the {name} graph")
+            predicate = self._context_predicate(name, context_id) if context_id is not None else None
+            graph = self.get_graph(name)
+            results.extend(
+                {"graph": name, "nodeId": node_id, "node": graph.get_node(node_id), "score": score}
+                for node_id, score in index.search(query, k, node_type=node_type, predicate=predicate)
+            )
+        results.sort(key=lambda result: result["score"], reverse=True)
+        return results[:k]
+    
+    def enable_history(self, checkpoint_interval: int = 1000, retention_seconds: float = None,
+                       retention_versions: int = None) -> Dict[str, 'GraphHistory']:
+        """Start recording versioned deltas of all three graphs"""
+        self.disable_history()
+        for graph_name in ("ontological", "instance", "context"):
+            self.history[graph_name] = GraphHistory(
+                self.get_graph(graph_name), checkpoint_interval, retention_seconds, retention_versions)
+        return self.history
+    
+    def disable_history(self) -> None:
+        """Stop recording and discard the history"""
+        for history in self.history.values():
+            history.close()
+        self.history = {}
+        self._as_of_cache.clear()
+    
+    def compact_history(self) -> int:
+        """Apply the retention policy now; returns the number of deltas dropped"""
+        return sum(history.compact() for history in self.history.values())
+    
+    def _versions_as_of(self, when: Any) -> Tuple[int, int, int]:
+        """Resolve a (ontological, instance, context) version tuple, datetime or epoch time to versions"""
+        if not self.history:
+            raise ValueError("History is not enabled")
+        names = ("ontological", "instance", "context")
+        if isinstance(when, tuple):
+            if len(when) != 3:
+                raise ValueError("as_of version must be an (ontological, instance, context) tuple")
+            return tuple(int(version) for version in when)
+        if isinstance(when, datetime.datetime):
+            when = when.timestamp()
+        if not isinstance(when, (int, float)):
+            raise ValueError(f"Unsupported as_of value: {when!r}")
+        return tuple(self.history[name].version_at(when) for name in names)
+    
+    def as_of(self, when: Any) -> 'TrinitarianKnowledgeGraph':
+        """
+        A queryable TKG over the history as of a version tuple or a time.
+        
+        Nothing is copied: its graphs read each entity's state at the version
+        straight from the history and build their indexes from it on first
+        use. The result is cached per version, so repeated queries at the
+        same point reuse those indexes. It is detached: the first change to
+        one of its graphs copies that graph, and changes are not recorded.
+        """
+        names = ("ontological", "instance", "context")
+        versions = self._versions_as_of(when)
+        for graph_name, version in zip(names, versions):
+            self.history[graph_name]._require(version)
+        cached = self._as_of_cache.get(versions)
+        if cached is not None:
+            return cached
+        
+        engines = iter([HistoryStorage(self.history[name], version) for name, version in zip(names, versions)])
+        past = TrinitarianKnowledgeGraph(f"{self.name}@{versions}", lambda: next(engines))
+        past.initialize_adjunctions()
+        for graph, version in zip((past.ontological_graph, past.instance_graph, past.context_graph), versions):
+            # The history owns these maps; pinned, so a write forks them first
+            graph._version.number = version
+            graph._acquire()
+        context_graph = past.context_graph
+        
+        def periods() -> PeriodIndex:
+            index = PeriodIndex()
+            for node in context_graph.nodes.values():
+                index.add_node(node)
+            return index
+        
+        context_graph.periods = _LazyIndex(periods)
+        if len(self._as_of_cache) >= AS_OF_CACHE_SIZE:
+            self._as_of_cache.pop(next(iter(self._as_of_cache)))
+        self._as_of_cache[versions] = past
+        return past
+    
+    def index_decisions(self) -> List[Dict[str, Any]]:
+        """Create/drop/skip decisions the auto-indexer has made so far"""
+        if self.auto_indexer is None:
+            return []
+        return [decision.to_dict() for decision in self.auto_indexer.decisions]
+    
+    def snapshot(self) -> 'TKGSnapshot':
+        """Get a consistent read handle on all three graphs at the current version"""
+        graphs = (self.ontological_graph, self.instance_graph, self.context_graph)
+        while True:
+            epoch = self._epoch
+            if epoch & 1:
+                # A write is publishing its graphs, which takes moments
+                time.sleep(0)
+                continue
+            snapshots = [graph.snapshot() for graph in graphs]
+            if self._epoch == epoch:
+                return TKGSnapshot(self, *snapshots)
+            for snapshot in snapshots:
+                snapshot.release()
+    
+    @contextmanager
+    def _writing(self, batch: int = 1):
+        """One write across the three graphs (see Graph._writing), published together"""
+        graphs = (self.ontological_graph, self.instance_graph, self.context_graph)
+        for graph in graphs:
+            graph._check_writer()
+        with self._lock:
+            for graph in graphs:
+                graph._begin_write(batch)
+            try:
+                yield
+            finally:
+                self._epoch += 1
+                published = [graph for graph in graphs if graph._end_write()]
+                self._epoch += 1
+                for graph in published:
+                    graph._deliver()
+    
+    def _reading_past(self) -> bool:
+        """Whether this thread runs a snapshot query on versions some graph has since moved past"""
+        for graph in (self.ontological_graph, self.instance_graph, self.context_graph):
+            if graph._bindings:
+                version = graph._bindings.get(threading.get_ident())
+                if version is not None and version is not graph._version:
+                    return True
+        return False
+    
+    def _in_transaction(self) -> bool:
+        """Whether this thread has a transaction open on this TKG"""
+        return any(graph._staging() is not None
+                   for graph in (self.ontological_graph, self.instance_graph, self.context_graph))
+    
+    def transaction(self) -> 'Transaction':
+        """Stage writes to all three graphs and apply them atomically: `with tkg.transaction(): ...`"""
+        return Transaction(self)
+    
+    def enable_replication(self, address: Union[Tuple[str, int], str] = ("127.0.0.1", 0),
+                           log_size: int = 100000) -> 'ReplicationPrimary':
+        """
+        Serve this TKG's committed changes to replicas on a local TCP
+        address (port 0 picks one) or Unix socket path; replicas connect to
+        the returned primary's `address`
+        """
+        self.disable_replication()
+        self.replication = ReplicationPrimary(self, address, log_size)
+        return self.replication
+    
+    def disable_replication(self) -> None:
+        """Stop serving replicas"""
+        if self.replication is not None:
+            self.replication.close()
+            self.replication = None
+    
+    def write_token(self) -> str:
+        """Read-your-writes token for everything committed so far; see Replica.wait_for"""
+        if self.replication is None:
+            raise ValueError("Replication is not enabled")
+        return self.replication.token()
+    
+    def replicate_from(self, address: Union[Tuple[str, int], str], log_id: str = None,
+                       position: int = 0) -> 'Replica':
+        """
+        Follow a primary's changes, keeping this TKG a read-only copy of it:
+        other writes raise ValueError until stop_replicating(). Pass a
+        previous replica's state() to resume rather than bootstrap.
+        """
+        self.stop_replicating()
+        self.replica = Replica(self, address, log_id=log_id, position=position)
+        return self.replica
+    
+    def stop_replicating(self) -> None:
+        """Stop following the primary, keeping the state reached"""
+        if self.replica is not None:
+            self.replica.close()
+            self.replica = None
+    
+    def ingest(self, source: Any, workers: int = None, chunk_size: int = 10000,
+               max_pending: int = None) -> 'IngestReport':
+        """
+        Load JSON Lines records (a path or an iterable of lines), parsed by
+        `workers` processes (one per CPU by default, 0 for none) and
+        applied here in input order; see IngestPipeline for the format
+        """
+        return IngestPipeline(self, workers, chunk_size, max_pending).run(source)
+    
+    # Context-aware operations
+    
+    def is_concept_applicable_in_context(self, concept_id: str, context_id: str) -> bool:
+        """Check if a concept is applicable in a given context"""
         context_node = self.context_graph.get_node(context_id)
         concept_node = self.ontological_graph.get_node(concept_id)
         
@@ -1093,8 +3212,8 @@ class TrinitarianKnowledgeGraph:
         
         return False
     
-    def is_instance_relevant_in_context(self, instance_id: str, context_id: str) -> bool:
-        """Check if an instance is relevant in a given context"""
+    def is_instance_relevant_in_context(self, instance_id: str, context_id: str, memo: Dict = None) -> bool:
+        """Check if an instance is relevant in a given context; `memo` shares work across calls"""
         instance_node = self.instance_graph.get_node(instance_id)
         context_node = self.context_graph.get_node(context_id)
         
@@ -1124,14 +3243,32 @@ class TrinitarianKnowledgeGraph:
         mapped_context_id = self.adjunctions["contextualization"].apply_left_adjoint(instance_id)
         if mapped_context_id:
             mapped_context = self.context_graph.get_node(mapped_context_id)
-            if mapped_context and self.contexts_are_compatible(mapped_context, context_node):
-                return True
+            if mapped_context:
+                if memo is None:
+                    compatible = self.contexts_are_compatible(mapped_context, context_node)
+                else:
+                    key = ("compatible", mapped_context_id, context_id)
+                    if key not in memo:
+                        memo[key] = self.contexts_are_compatible(mapped_context, context_node)
+                    compatible = memo[key]
+                if compatible:
+                    return True
         
         mapped_instance_id = self.adjunctions["exemplification"].apply_left_adjoint(context_id)
         if mapped_instance_id:
             mapped_instance = self.instance_graph.get_node(mapped_instance_id)
-            if mapped_instance and self.instances_are_related(mapped_instance, instance_node):
-                return True
+            if mapped_instance:
+                neighbours = None
+                if memo is not None:
+                    key = ("neighbours", mapped_instance_id)
+                    if key not in memo:
+                        memo[key] = {
+                            edge.target.id if edge.source.id == mapped_instance_id else edge.source.id
+                            for edge in self.instance_graph.get_edges_for_node(mapped_instance_id)
+                        }
+                    neighbours = memo[key]
+                if self.instances_are_related(mapped_instance, instance_node, neighbours):
+                    return True
         
         return False
     
@@ -1212,28 +3349,32 @@ class TrinitarianKnowledgeGraph:
         # For demo purposes, consider all concepts compatible unless explicitly stated otherwise
         return True
     
-    def instances_are_related(self, instance1: Node, instance2: Node) -> bool:
-        """Check if two instances are related"""
+    def instances_are_related(self, instance1: Node, instance2: Node, neighbours: Set[str] = None) -> bool:
+        """Check if two instances are related; `neighbours` of instance1, if known, saves the edge lookups"""
         # Check if they're of the same concept
         if instance1.properties.get("conceptId") == instance2.properties.get("conceptId"):
             return True
         
         # Check if they're connected by a relation
-        relations = self.instance_graph.find_edges({
-            "source.id": instance1.id,
-            "target.id": instance2.id
-        })
-        
-        if relations:
-            return True
-        
-        relations = self.instance_graph.find_edges({
-            "source.id": instance2.id,
-            "target.id": instance1.id
-        })
-        
-        if relations:
-            return True
+        if neighbours is not None:
+            if instance2.id in neighbours:
+                return True
+        else:
+            relations = self.instance_graph.find_edges({
+                "source.id": instance1.id,
+                "target.id": instance2.id
+            })
+            
+            if relations:
+                return True
+            
+            relations = self.instance_graph.find_edges({
+                "source.id": instance2.id,
+                "target.id": instance1.id
+            })
+            
+            if relations:
+                return True
         
         # For demo purposes, consider instances related if they share properties
         for key, value in instance1.properties.items():
@@ -1242,63 +3383,102 @@ class TrinitarianKnowledgeGraph:
         
         return False
     
+    def get_graph(self, graph_name: str) -> Graph:
+        """Resolve "ontological", "instance" or "context" to the graph object"""
+        if graph_name == "ontological":
+            return self.ontological_graph
+        elif graph_name == "instance":
+            return self.instance_graph
+        elif graph_name == "context":
+            return self.context_graph
+        raise ValueError(f"Unknown graph: {graph_name}")
+    
+    def graph_name(self, graph: Graph) -> str:
+        """Inverse of get_graph"""
+        return "ontological" if graph == self.ontological_graph else \
+               "instance" if graph == self.instance_graph else "context"
+    
+    def compile_traversal_plan(self, start_graph: str, traversal_plan: List[Dict]) -> List[Tuple[Adjunction, str, str]]:
+        """Validate a traversal plan and resolve each step to (adjunction, direction, target graph)"""
+        key = (start_graph, tuple((step.get("adjunction"), step.get("direction")) for step in traversal_plan))
+        compiled = self._plan_cache.get(key)
+        if compiled is None:
+            compiled = self._plan_cache[key] = self._compile_traversal_plan(start_graph, traversal_plan)
+        return compiled
+    
+    def _compile_traversal_plan(self, start_graph: str, traversal_plan: List[Dict]) -> List[Tuple[Adjunction, str, str]]:
+        """Uncached compile_traversal_plan"""
+        current_graph = self.get_graph(start_graph)
+        compiled = []
+        for step in traversal_plan:
+            adjunction_name = step.get("adjunction")
+            direction = step.get("direction")
+            
+            if adjunction_name not in self.adjunctions:
+                raise ValueError(f"Adjunction {adjunction_name} not found")
+            
+            adjunction = self.adjunctions[adjunction_name]
+            if current_graph == adjunction.source_graph and direction == "left":
+                current_graph = adjunction.target_graph
+            elif current_graph == adjunction.target_graph and direction == "right":
+                current_graph = adjunction.source_graph
+            else:
+                raise ValueError(f"Invalid direction {direction} for current graph")
+            
+            compiled.append((adjunction, direction, self.graph_name(current_graph)))
+        return compiled
+    
+    def create_view(self, name: str, start_graph: str, traversal_plan: List[Dict],
+                    start_filter: Dict = None, end_filter: Dict = None) -> 'MaterializedView':
+        """Declare a materialized view over a find_across_graphs-style traversal"""
+        if name in self.views:
+            raise ValueError(f"View {name} already exists")
+        view = MaterializedView(name, self, start_graph, traversal_plan, start_filter, end_filter)
+        self.views[name] = view
+        return view
+    
+    def get_view(self, name: str) -> Optional['MaterializedView']:
+        """Get a declared view by name"""
+        return self.views.get(name)
+    
+    def drop_view(self, name: str) -> bool:
+        """Stop maintaining a view and discard its results"""
+        view = self.views.pop(name, None)
+        if not view:
+            return False
+        view.close()
+        return True
+    
     def find_across_graphs(self, start_graph: str, start_node_id: str, traversal_plan: List[Dict]) -> List[Dict]:
         """Traverse across graphs following a sequence of adjunctions"""
         result = []
-        
-        # Set the starting point
-        if start_graph == "ontological":
-            current_graph = self.ontological_graph
-        elif start_graph == "instance":
-            current_graph = self.instance_graph
-        elif start_graph == "context":
-            current_graph = self.context_graph
-        else:
-            raise ValueError(f"Unknown graph: {start_graph}")
-        
-        current_node_id = start_node_id
+        steps = self.compile_traversal_plan(start_graph, traversal_plan)
         
         # Add the starting node to results
-        start_node = current_graph.get_node(current_node_id)
+        start_node = self.get_graph(start_graph).get_node(start_node_id)
         if not start_node:
             return []
         
         result.append({
             "graph": start_graph,
-            "nodeId": current_node_id,
+            "nodeId": start_node_id,
             "node": start_node
         })
         
         # Perform the traversal
-        for step in traversal_plan:
-            adjunction_name = step.get("adjunction")
-            direction = step.get("direction")
-            
-            if adjunction_name not in self.adjunctions:
-                raise ValueError(f"Adjunction {adjunction_name} not found")
-            
-            adjunction = self.adjunctions[adjunction_name]
-            
-            # Apply the appropriate direction of the adjunction
-            if current_graph == adjunction.source_graph and direction == "left":
+        current_node_id = start_node_id
+        for adjunction, direction, graph_name in steps:
+            if direction == "left":
                 current_node_id = adjunction.apply_left_adjoint(current_node_id)
-                current_graph = adjunction.target_graph
-                graph_name = "ontological" if current_graph == self.ontological_graph else \
-                            "instance" if current_graph == self.instance_graph else "context"
-            elif current_graph == adjunction.target_graph and direction == "right":
-                current_node_id = adjunction.apply_right_adjoint(current_node_id)
-                current_graph = adjunction.source_graph
-                graph_name = "ontological" if current_graph == self.ontological_graph else \
-                            "instance" if current_graph == self.instance_graph else "context"
             else:
-                raise ValueError(f"Invalid direction {direction} for current graph")
+                current_node_id = adjunction.apply_right_adjoint(current_node_id)
             
             if not current_node_id:
                 # No mapping found
                 break
             
             # Add the current node to results
-            current_node = current_graph.get_node(current_node_id)
+            current_node = self.get_graph(graph_name).get_node(current_node_id)
             result.append({
                 "graph": graph_name,
                 "nodeId": current_node_id,
@@ -1307,17 +3487,108 @@ class TrinitarianKnowledgeGraph:
         
         return result
     
-    def contextual_query(self, query_string: str, context_id: str = None) -> Dict[str, Any]:
-        """Execute a query with context awareness"""
-        # Parse the query
-        parsed_query = self.parse_query(query_string)
+    def find_across_graphs_frontier(self, start_graph: str, start_nodes: Union[List[str], Dict[str, float]],
+                                    traversal_plan: List[Dict], budget: int = None) -> List[Dict]:
+        """
+        Set-at-a-time traversal carrying every reachable node through each step.
+        
+        Each step deduplicates the frontier, maps it in one batch through the
+        adjunction's set-valued adjoint and keeps the top nodes by score: the
+        step's "limit" if given, else `budget`. Scores multiply along a path;
+        when several paths reach a node the best one wins and all predecessors
+        are kept in "via". Returns one layer per step that was reached.
+        """
+        steps = self.compile_traversal_plan(start_graph, traversal_plan)
+        graph = self.get_graph(start_graph)
+        if isinstance(start_nodes, dict):
+            frontier = {node_id: float(score) for node_id, score in start_nodes.items()}
+        else:
+            frontier = {node_id: 1.0 for node_id in start_nodes}
+        frontier = {node_id: score for node_id, score in frontier.items() if graph.get_node(node_id)}
+        
+        layers = [self._frontier_layer(start_graph, frontier, {})]
+        for (adjunction, direction, graph_name), step in zip(steps, traversal_plan):
+            if not frontier:
+                break
+            mapped = adjunction.candidates(direction, list(frontier))
+            
+            next_frontier: Dict[str, float] = {}
+            via: Dict[str, List[str]] = defaultdict(list)
+            for node_id, score in frontier.items():
+                for target_id, weight in mapped[node_id]:
+                    path_score = score * weight
+                    if target_id not in next_frontier or path_score > next_frontier[target_id]:
+                        next_frontier[target_id] = path_score
+                    via[target_id].append(node_id)
+            
+            limit = step.get("limit", budget)
+            if limit is not None and len(next_frontier) > limit:
+                next_frontier = dict(heapq.nlargest(limit, next_frontier.items(), key=lambda item: item[1]))
+            
+            frontier = next_frontier
+            layers.append(self._frontier_layer(graph_name, frontier, via))
         
+        return layers
+    
+    def _frontier_layer(self, graph_name: str, frontier: Dict[str, float], via: Dict[str, List[str]]) -> Dict:
+        """One frontier step as returned by find_across_graphs_frontier, best score first"""
+        graph = self.get_graph(graph_name)
+        return {
+            "graph": graph_name,
+            "frontier": [
+                {"nodeId": node_id, "node": graph.get_node(node_id), "score": score, "via": via.get(node_id, [])}
+                for node_id, score in sorted(frontier.items(), key=lambda item: item[1], reverse=True)
+            ]
+        }
+    
+    def contextual_query(self, query_string: str, context_id: str = None, as_of: Any = None) -> Dict[str, Any]:
+        """Execute a query with context awareness, optionally against the graph as it was at `as_of`"""
+        if as_of is not None:
+            return self.as_of(as_of).contextual_query(query_string, context_id)
+        if self._metrics is not None:
+            return self._metrics.time_call("contextual_query", self._contextual_query,
+                                           query_string, context_id)
+        return self._contextual_query(query_string, context_id)
+    
+    def _contextual_query(self, query_string: str, context_id: str = None) -> Dict[str, Any]:
+        """Uninstrumented contextual_query"""
+        return self._answer(self.parse_query(query_string), context_id, QueryLookups(self))
+    
+    def contextual_query_batch(self, queries: List[Union[str, Tuple[str, Optional[str]]]]) -> List[Dict[str, Any]]:
+        """Answer many queries at once, computing what they share only once"""
+        if self._metrics is not None:
+            return self._metrics.time_call("contextual_query_batch", self._contextual_query_batch, queries)
+        return self._contextual_query_batch(queries)
+    
+    def _contextual_query_batch(self, queries: List[Union[str, Tuple[str, Optional[str]]]]) -> List[Dict[str, Any]]:
+        """Uninstrumented contextual_query_batch"""
+        lookups = SharedQueryLookups(self)
+        answers: Dict[Tuple[str, Optional[str]], Dict[str, Any]] = {}
+        results = []
+        for query in queries:
+            query_string, context_id = (query, None) if isinstance(query, str) else query
+            key = (query_string, context_id)
+            if key not in answers:
+                answers[key] = self._answer(lookups.parse(query_string), context_id, lookups)
+            else:
+                lookups.hits += 1
+            # Each caller gets its own result list
+            answer = dict(answers[key])
+            answer["results"] = list(answer["results"])
+            results.append(answer)
+        return results
+    
+    def _answer(self, parsed_query: Optional[Dict], context_id: Optional[str], lookups: 'QueryLookups') -> Dict[str, Any]:
+        """Evaluate a parsed query, fetching through `lookups`"""
         if not parsed_query:
             return {"status": "error", "message": "Failed to parse query", "results": []}
+        if parsed_query["type"] == "aggregate" and not context_id:
+            # Aggregates honour their own IN CONTEXT clause
+            context_id = parsed_query["contextId"]
         
         context = None
         if context_id:
-            context = self.context_graph.get_node(context_id)
+            context = lookups.context(context_id)
             if not context:
                 return {"status": "error", "message": f"Context {context_id} not found", "results": []}
         
@@ -1325,12 +3596,12 @@ class TrinitarianKnowledgeGraph:
             concept_id = parsed_query["conceptId"]
             
             # Check if concept exists
-            concept = self.ontological_graph.get_node(concept_id)
+            concept = lookups.concept(concept_id)
             if not concept:
                 return {"status": "error", "message": f"Concept {concept_id} not found", "results": []}
             
             # If context specified, check if concept is applicable
-            if context and not self.is_concept_applicable_in_context(concept_id, context_id):
+            if context and not lookups.applicable(concept_id, context_id):
                 return {
                     "status": "inapplicable",
                     "message": f"Concept {concept_id} is not applicable in context {context_id}",
@@ -1338,13 +3609,17 @@ class TrinitarianKnowledgeGraph:
                 }
             
             # Get instances of the concept
-            instances = self.instance_graph.get_entities_of_concept(concept_id)
+            instances = lookups.instances(concept_id)
             
             # Filter by context relevance if context specified
             if context:
+                # When partitioned, those the context's partitions place inside it
+                # are relevant outright; the rest are still checked
+                inside = lookups.scoped_instances(concept_id, context_id)
+                inside_ids = {instance.id for instance in inside} if inside else ()
                 relevant_instances = [
                     instance for instance in instances
-                    if self.is_instance_relevant_in_context(instance.id, context_id)
+                    if instance.id in inside_ids or lookups.relevant(instance.id, context_id)
                 ]
             else:
                 relevant_instances = instances
@@ -1361,12 +3636,12 @@ class TrinitarianKnowledgeGraph:
             relation_type_id = parsed_query["relationTypeId"]
             
             # Check if relation type exists
-            relation = self.ontological_graph.get_node(relation_type_id)
+            relation = lookups.concept(relation_type_id)
             if not relation:
                 return {"status": "error", "message": f"Relation type {relation_type_id} not found", "results": []}
             
             # If context specified, check if relation is applicable
-            if context and not self.is_concept_applicable_in_context(relation_type_id, context_id):
+            if context and not lookups.applicable(relation_type_id, context_id):
                 return {
                     "status": "inapplicable",
                     "message": f"Relation {relation_type_id} is not applicable in context {context_id}",
@@ -1374,15 +3649,15 @@ class TrinitarianKnowledgeGraph:
                 }
             
             # Get relations of this type
-            relations = self.instance_graph.get_relations_of_type(relation_type_id)
+            relations = lookups.relations(relation_type_id)
             
             # Filter by context if specified
             if context:
                 relevant_relations = []
                 for relation in relations:
                     # A relation is relevant if both its source and target are relevant
-                    if (self.is_instance_relevant_in_context(relation.source.id, context_id) and
-                        self.is_instance_relevant_in_context(relation.target.id, context_id)):
+                    if (lookups.relevant(relation.source.id, context_id) and
+                        lookups.relevant(relation.target.id, context_id)):
                         relevant_relations.append(relation)
             else:
                 relevant_relations = relations
@@ -1395,8 +3670,22 @@ class TrinitarianKnowledgeGraph:
                 "count": len(relevant_relations)
             }
         
+        elif parsed_query["type"] == "aggregate":
+            return QueryAggregator(self, lookups).run(parsed_query, context)
+        
+        elif parsed_query["type"] == "pattern":
+            return PatternMatcher(self, lookups).run(parsed_query, context)
+        
         return {"status": "error", "message": "Unsupported query type", "results": []}
     
+    def explain(self, query_string: str, context_id: str = None) -> 'PlanNode':
+        """Operator tree contextual_query would run, with estimated row counts"""
+        return QueryExplainer(self).explain(query_string, context_id)
+    
+    def explain_analyze(self, query_string: str, context_id: str = None) -> 'PlanNode':
+        """Run the query and annotate its operator tree with actual rows, timings and cache hits"""
+        return QueryExplainer(self).analyze(query_string, context_id)
+    
     def parse_query(self, query_string: str) -> Optional[Dict]:
         """Parse a query string into a structured query object"""
         # Simple pattern matching for demo purposes
@@ -1428,7 +3717,116 @@ class TrinitarianKnowledgeGraph:
                 "contextId": context_id
             }
         
-        return None
+        # QUERY { ONTOLOGICAL { ... } INSTANCE { ... } CONTEXT { ... } ... }
+        if re.match(r"\s*QUERY\s*\{", query_string, re.IGNORECASE):
+            return parse_pattern_query(query_string)
+        
+        # COUNT / MIN / MAX / AVG / SUM ... [GROUP BY ...]
+        return parse_aggregate_query(query_string)
+
+
+class TKGSnapshot:
+    """
+    Point-in-time view of a TKG; release it (or use it as a context manager) when done.
+    
+    Its queries run the TKG's own with this thread's reads of the three
+    graphs pointed at the snapshot's versions. They use an index only while
+    it still describes those versions and is free, and scan them otherwise,
+    so they never wait on a writer.
+    """
+    
+    def __init__(self, tkg: TrinitarianKnowledgeGraph, ontological_graph: GraphSnapshot,
+                 instance_graph: GraphSnapshot, context_graph: GraphSnapshot):
+        self.tkg = tkg
+        self.ontological_graph = ontological_graph
+        self.instance_graph = instance_graph
+        self.context_graph = context_graph
+    
+    @property
+    def version(self) -> Tuple[int, int, int]:
+        """Versions of the ontological, instance and context graphs"""
+        return (self.ontological_graph.version,
+                self.instance_graph.version,
+                self.context_graph.version)
+    
+    @contextmanager
+    def _bound(self):
+        """Point this thread's reads of the TKG's graphs at the snapshot's versions"""
+        bindings = [(snapshot.graph, snapshot._version)
+                    for snapshot in (self.ontological_graph, self.instance_graph, self.context_graph)]
+        if any(version is None for _, version in bindings):
+            raise ValueError("Snapshot has been released")
+        ident = threading.get_ident()
+        # Snapshot queries may nest; restore whatever this thread read before
+        previous = [graph._bindings.get(ident) for graph, _ in bindings]
+        for graph, version in bindings:
+            graph._bindings[ident] = version
+        try:
+            yield
+        finally:
+            for (graph, _), version in zip(bindings, previous):
+                if version is None:
+                    del graph._bindings[ident]
+                else:
+                    graph._bindings[ident] = version
+    
+    def contextual_query(self, query_string: str, context_id: str = None) -> Dict[str, Any]:
+        """TrinitarianKnowledgeGraph.contextual_query against the snapshot"""
+        with self._bound():
+            return self.tkg.contextual_query(query_string, context_id)
+    
+    def contextual_query_batch(self, queries: List[Union[str, Tuple[str, Optional[str]]]]) -> List[Dict[str, Any]]:
+        """TrinitarianKnowledgeGraph.contextual_query_batch against the snapshot"""
+        with self._bound():
+            return self.tkg.contextual_query_batch(queries)
+    
+    def find_across_graphs(self, start_graph: str, start_node_id: str, traversal_plan: List[Dict]) -> List[Dict]:
+        """TrinitarianKnowledgeGraph.find_across_graphs against the snapshot"""
+        with self._bound():
+            return self.tkg.find_across_graphs(start_graph, start_node_id, traversal_plan)
+    
+    def path_query(self, graph_name: str, start_ids: Union[str, List[str]], expression: str,
+                   context_id: str = None, max_depth: int = None, limit: int = None) -> List[Dict[str, Any]]:
+        """TrinitarianKnowledgeGraph.path_query against the snapshot"""
+        with self._bound():
+            return self.tkg.path_query(graph_name, start_ids, expression, context_id, max_depth, limit)
+    
+    def rank_exemplars(self, context: Union[str, Node], k: int = 10) -> List[Tuple[Node, float]]:
+        """TrinitarianKnowledgeGraph.rank_exemplars against the snapshot"""
+        with self._bound():
+            return self.tkg.rank_exemplars(context, k)
+    
+    def rank_exemplified_contexts(self, instance: Union[str, Node], k: int = 10) -> List[Tuple[Node, float]]:
+        """TrinitarianKnowledgeGraph.rank_exemplified_contexts against the snapshot"""
+        with self._bound():
+            return self.tkg.rank_exemplified_contexts(instance, k)
+    
+    def get_all_subconcepts(self, concept_id: str) -> List[Node]:
+        """OntologicalGraph.get_all_subconcepts against the snapshot"""
+        with self._bound():
+            return self.tkg.ontological_graph.get_all_subconcepts(concept_id)
+    
+    def get_all_superconcepts(self, concept_id: str) -> List[Node]:
+        """OntologicalGraph.get_all_superconcepts against the snapshot"""
+        with self._bound():
+            return self.tkg.ontological_graph.get_all_superconcepts(concept_id)
+    
+    def get_entities_of_concept(self, concept_id: str) -> List[Node]:
+        """InstanceGraph.get_entities_of_concept against the snapshot"""
+        with self._bound():
+            return self.tkg.instance_graph.get_entities_of_concept(concept_id)
+    
+    def release(self) -> None:
+        """Release all three graph snapshots"""
+        self.ontological_graph.release()
+        self.instance_graph.release()
+        self.context_graph.release()
+    
+    def __enter__(self) -> 'TKGSnapshot':
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.release()
 
 
 # =============================================================================
@@ -1441,6 +3839,14 @@ class TKGApi:
     def __init__(self, tkg: TrinitarianKnowledgeGraph):
         self.tkg = tkg
     
+    def transaction(self) -> 'Transaction':
+        """Group API calls so they apply together or not at all: `with api.transaction(): ...`"""
+        return self.tkg.transaction()
+    
+    def ingest(self, source: Any, workers: int = None) -> 'IngestReport':
+        """Bulk-load concepts, contexts, entities and relations from JSON Lines"""
+        return self.tkg.ingest(source, workers)
+    
     def create_ontological_concept(self, id: str, properties: Dict, parent_concepts: List[str] = None) -> Node:
         """Create a concept in the ontological graph"""
         concept = self.tkg.ontological_graph.add_concept(id, properties)
@@ -1488,9 +3894,38 @@ class TKGApi:
             id, source_id, relation_type_id, target_id, properties
         )
     
-    def query(self, query_string: str, context_id: str = None) -> Dict:
-        """Execute a query with optional context"""
-        return self.tkg.contextual_query(query_string, context_id)
+    def update_entity(self, id: str, changes: Dict, removed: List[str] = ()) -> Optional[Node]:
+        """Set and drop properties of an entity"""
+        return self.tkg.instance_graph.update_properties(id, changes, removed)
+    
+    def update_entities(self, updates: Dict[str, Dict]) -> int:
+        """Apply property changes to many entities at once; returns how many changed"""
+        return self.tkg.instance_graph.update_properties_batch(updates)
+    
+    def update_concept(self, id: str, changes: Dict, removed: List[str] = ()) -> Optional[Node]:
+        """Set and drop properties of a concept"""
+        return self.tkg.ontological_graph.update_properties(id, changes, removed)
+    
+    def update_context(self, id: str, changes: Dict, removed: List[str] = ()) -> Optional[Node]:
+        """Set and drop properties of a context"""
+        return self.tkg.context_graph.update_properties(id, changes, removed)
+    
+    def query(self, query_string: str, context_id: str = None, as_of: Any = None) -> Dict:
+        """Execute a query with optional context, optionally as of an earlier version or time"""
+        return self.tkg.contextual_query(query_string, context_id, as_of)
+    
+    def find_paths(self, start_id: str, expression: str, context_id: str = None,
+                   max_depth: int = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Entities reachable along relations whose types match a regular path expression"""
+        return self.tkg.path_query("instance", start_id, expression, context_id, max_depth, limit)
+    
+    def is_reachable(self, source_id: str, target_id: str, relation_types: List[str] = None) -> bool:
+        """Whether the source entity is connected to the target through relations"""
+        return self.tkg.instance_graph.reachable(source_id, target_id, relation_types)
+    
+    def query_batch(self, queries: List[Union[str, Tuple[str, Optional[str]]]]) -> List[Dict]:
+        """Execute many (query, context) pairs, sharing fetches and relevance checks between them"""
+        return self.tkg.contextual_query_batch(queries)
     
     def get_entity(self, id: str) -> Optional[Node]:
         """Get an entity by ID"""
@@ -1518,22 +3953,24 @@ class TKGApi:
     
     def export_knowledge(self, format: str = "json") -> Any:
         """Export all knowledge in the specified format"""
-        export_data = {
-            "ontological": {
-                "concepts": [node.to_dict() for node in self.tkg.ontological_graph.get_nodes_of_type("Concept")],
-                "relations": [node.to_dict() for node in self.tkg.ontological_graph.get_nodes_of_type("Relation")],
-                "properties": [node.to_dict() for node in self.tkg.ontological_graph.get_nodes_of_type("Property")],
-                "edges": [edge.to_dict() for edge in self.tkg.ontological_graph.edges.values()]
-            },
-            "instance": {
-                "entities": [node.to_dict() for node in self.tkg.instance_graph.nodes.values()],
-                "relations": [edge.to_dict() for edge in self.tkg.instance_graph.edges.values()]
-            },
-            "context": {
-                "contexts": [node.to_dict() for node in self.tkg.context_graph.nodes.values()],
-                "relations": [edge.to_dict() for edge in self.tkg.context_graph.edges.values()]
+        # Export from a snapshot so concurrent writers cannot tear the result
+        with self.tkg.snapshot() as snapshot:
+            export_data = {
+                "ontological": {
+                    "concepts": [node.to_dict() for node in snapshot.ontological_graph.get_nodes_of_type("Concept")],
+                    "relations": [node.to_dict() for node in snapshot.ontological_graph.get_nodes_of_type("Relation")],
+                    "properties": [node.to_dict() for node in snapshot.ontological_graph.get_nodes_of_type("Property")],
+                    "edges": [edge.to_dict() for edge in snapshot.ontological_graph.edges.values()]
+                },
+                "instance": {
+                    "entities": [node.to_dict() for node in snapshot.instance_graph.nodes.values()],
+                    "relations": [edge.to_dict() for edge in snapshot.instance_graph.edges.values()]
+                },
+                "context": {
+                    "contexts": [node.to_dict() for node in snapshot.context_graph.nodes.values()],
+                    "relations": [edge.to_dict() for edge in snapshot.context_graph.edges.values()]
+                }
             }
-        }
         
         if format == "json":
             return json.dumps(export_data, indent=2, default=str)
@@ -1542,7 +3979,5765 @@ class TKGApi:
 
 
 # =============================================================================
-# 6. EXAMPLE USAGE
+# 6. MATERIALIZED VIEWS
+# =============================================================================
+
+# What a traversal step reads from the graph it steps into, as probes a
+# change there must match to affect it:
+#   ("key", (property, value)) - nodes whose property ("id" for the id) has the value
+#   ("stamp", timestamp)       - temporal contexts whose period contains the timestamp
+#   ("period", start, end)     - nodes whose timestamp lies in [start, end]
+#   ("any",)                   - any node
+
+def _concept_instance_probes(concept: Node) -> List[Tuple]:
+    return [("key", ("conceptId", concept.id))]
+
+
+def _instance_concept_probes(instance: Node) -> List[Tuple]:
+    concept_id = instance.properties.get("conceptId")
+    if not concept_id:
+        return []
+    return [("key", ("id", concept_id))] if _is_hashable(concept_id) else [("any",)]
+
+
+def _instance_context_probes(instance: Node) -> List[Tuple]:
+    probes = []
+    if "timestamp" in instance.properties:
+        timestamp = instance.properties["timestamp"]
+        probes.append(("stamp", timestamp) if _is_number(timestamp) else ("any",))
+    if "location" in instance.properties:
+        location = instance.properties["location"]
+        probes.append(("key", ("location", location)) if _is_hashable(location) else ("any",))
+    return probes
+
+
+def _context_instance_probes(context: Node) -> List[Tuple]:
+    properties = context.properties
+    if context.type == "TemporalContext" and "startTime" in properties and "endTime" in properties:
+        start_time, end_time = properties["startTime"], properties["endTime"]
+        if _is_number(start_time) and _is_number(end_time):
+            return [("period", start_time, end_time)]
+        return [("any",)]
+    if context.type == "SpatialContext" and "location" in properties:
+        location = properties["location"]
+        return [("key", ("location", location))] if _is_hashable(location) else [("any",)]
+    return []
+
+
+# Built-in adjoint name -> probes of a step from a node; other mapping functions probe ("any",)
+VIEW_STEP_PROBES: Dict[str, Callable[[Node], List[Tuple]]] = {
+    "instantiation_left_adjoint": _concept_instance_probes,
+    "classification_right_adjoint": _concept_instance_probes,
+    "instantiation_right_adjoint": _instance_concept_probes,
+    "classification_left_adjoint": _instance_concept_probes,
+    "contextualization_left_adjoint": _instance_context_probes,
+    "exemplification_right_adjoint": _instance_context_probes,
+    "contextualization_right_adjoint": _context_instance_probes,
+    "exemplification_left_adjoint": _context_instance_probes
+}
+
+# Node properties a ("key", ...) probe can name
+VIEW_PROBE_KEYS = ("conceptId", "location")
+
+
+class MaterializedView:
+    """
+    Result set of a cross-graph traversal, maintained from change events.
+    
+    Each start node that passes start_filter is walked through the traversal plan;
+    complete paths whose final node passes end_filter are the view's rows. Adjoint
+    mappings are opaque functions, so on a change the view re-walks only the rows
+    the change can affect: the changed start node itself, rows whose path passes
+    through a changed or removed node, and - for additions and updates - rows
+    whose steps read what the node carries. The built-in adjoints' reads are
+    known (VIEW_STEP_PROBES): by concept id, by location, by timestamp within
+    a period. A step through any other mapping depends on its whole graph.
+    """
+    
+    def __init__(self, name: str, tkg: TrinitarianKnowledgeGraph, start_graph: str,
+                 traversal_plan: List[Dict], start_filter: Dict = None, end_filter: Dict = None):
+        self.name = name
+        self.tkg = tkg
+        self.start_graph = start_graph
+        self.traversal_plan = traversal_plan
+        self.start_filter = start_filter or {}
+        self.end_filter = end_filter or {}
+        self._steps = tkg.compile_traversal_plan(start_graph, traversal_plan)
+        self._graph_keys = {
+            graph.name: tkg.graph_name(graph)
+            for graph in (tkg.ontological_graph, tkg.instance_graph, tkg.context_graph)
+        }
+        
+        # start id -> node ids along a complete, matching path
+        self._paths: Dict[str, List[str]] = {}
+        # final node id -> start ids, so grouped reads are O(result)
+        self._by_end: Dict[str, Set[str]] = defaultdict(set)
+        # (graph, node id) -> start ids whose walk visited that node
+        self._dependents: Dict[Tuple[str, str], Set[str]] = defaultdict(set)
+        # Start ids by what their walk read, per graph stepped into: any node,
+        # (property, value) keys, timestamps (sorted) and periods
+        self._probes: Dict[str, Set[str]] = defaultdict(set)
+        self._keyed: Dict[Tuple[str, Tuple[str, Any]], Set[str]] = defaultdict(set)
+        self._stamps: Dict[str, List[Tuple[Any, str]]] = defaultdict(list)
+        self._periods: Dict[str, Dict[str, List[Tuple[Any, Any]]]] = defaultdict(dict)
+        # start id -> what the last walk touched, for cleanup
+        self._traces: Dict[str, Tuple[List[Tuple[str, str]], List[Tuple[str, Tuple]]]] = {}
+        self._step_probes = [self._probe_function(adjunction, direction) for adjunction, direction, _ in self._steps]
+        
+        self.refresh()
+        self._subscription = tkg.subscribe(self._apply_events, operations=[
+            "node_added", "node_removed", "node_updated"
+        ])
+    
+    def refresh(self) -> None:
+        """Recompute the whole view from scratch"""
+        self._paths.clear()
+        self._by_end.clear()
+        self._dependents.clear()
+        self._probes.clear()
+        self._keyed.clear()
+        self._stamps.clear()
+        self._periods.clear()
+        self._traces.clear()
+        for node in self.tkg.get_graph(self.start_graph).find_nodes(self.start_filter):
+            self._evaluate(node.id)
+    
+    def _probe_function(self, adjunction: Adjunction, direction: str) -> Optional[Callable[[Node], List[Tuple]]]:
+        """Probes of one step's mapping, if it is a built-in adjoint of this TKG"""
+        function = adjunction.left_mapping_function if direction == "left" else adjunction.right_mapping_function
+        if getattr(function, "__self__", None) is not self.tkg:
+            return None
+        return VIEW_STEP_PROBES.get(function.__name__)
+    
+    def _evaluate(self, start_id: str) -> None:
+        """Re-walk the traversal for one start node and update its row"""
+        self._forget(start_id)
+        
+        start_graph = self.tkg.get_graph(self.start_graph)
+        current = start_graph.get_node(start_id)
+        if not current or not start_graph._matches_constraints(current, self.start_filter):
+            return
+        
+        path = [start_id]
+        visited = [(self.start_graph, start_id)]
+        probed = []
+        # Call the mapping functions directly: adjunction caches may predate this change
+        for (adjunction, direction, graph_name), probes in zip(self._steps, self._step_probes):
+            probed.extend((graph_name, probe) for probe in (probes(current) if probes else [("any",)]))
+            if direction == "left":
+                current = adjunction.left_mapping_function(current, self.tkg)
+            else:
+                current = adjunction.right_mapping_function(current, self.tkg)
+            if not current:
+                break
+            path.append(current.id)
+            visited.append((graph_name, current.id))
+        
+        self._traces[start_id] = (visited, probed)
+        for key in visited:
+            self._dependents[key].add(start_id)
+        for graph_name, probe in probed:
+            kind = probe[0]
+            if kind == "any":
+                self._probes[graph_name].add(start_id)
+            elif kind == "key":
+                self._keyed[(graph_name, probe[1])].add(start_id)
+            elif kind == "stamp":
+                bisect.insort(self._stamps[graph_name], (probe[1], start_id))
+            else:
+                self._periods[graph_name].setdefault(start_id, []).append(probe[1:])
+        
+        end_graph = self.tkg.get_graph(self._steps[-1][2] if self._steps else self.start_graph)
+        if current and len(path) == len(self._steps) + 1 and \
+                end_graph._matches_constraints(current, self.end_filter):
+            self._paths[start_id] = path
+            self._by_end[path[-1]].add(start_id)
+    
+    def _forget(self, start_id: str) -> None:
+        """Drop a start node's row and its dependency entries"""
+        path = self._paths.pop(start_id, None)
+        if path:
+            starts = self._by_end[path[-1]]
+            starts.discard(start_id)
+            if not starts:
+                del self._by_end[path[-1]]
+        
+        trace = self._traces.pop(start_id, None)
+        if trace:
+            visited, probed = trace
+            for key in visited:
+                dependents = self._dependents.get(key)
+                if dependents is not None:
+                    dependents.discard(start_id)
+                    if not dependents:
+                        del self._dependents[key]
+            for graph_name, probe in probed:
+                kind = probe[0]
+                if kind == "any":
+                    self._probes[graph_name].discard(start_id)
+                elif kind == "key":
+                    starts = self._keyed.get((graph_name, probe[1]))
+                    if starts is not None:
+                        starts.discard(start_id)
+                        if not starts:
+                            del self._keyed[(graph_name, probe[1])]
+                elif kind == "stamp":
+                    stamps = self._stamps[graph_name]
+                    position = bisect.bisect_left(stamps, (probe[1], start_id))
+                    if position < len(stamps) and stamps[position] == (probe[1], start_id):
+                        del stamps[position]
+                else:
+                    self._periods[graph_name].pop(start_id, None)
+    
+    def _probing(self, graph_name: str, node: Node) -> Set[str]:
+        """Start ids whose walk read something a node of `graph_name` carries"""
+        starts = set(self._probes.get(graph_name, ()))
+        properties = node.properties
+        keys = [("id", node.id)]
+        keys.extend((name, properties[name]) for name in VIEW_PROBE_KEYS
+                    if name in properties and _is_hashable(properties[name]))
+        for key in keys:
+            starts.update(self._keyed.get((graph_name, key), ()))
+        
+        periods = self._periods.get(graph_name)
+        if periods and "timestamp" in properties:
+            timestamp = properties["timestamp"]
+            numeric = _is_number(timestamp)
+            for start_id, bounds in periods.items():
+                # Timestamps that do not compare could still sway a mapping; re-walk
+                if not numeric or any(low <= timestamp <= high for low, high in bounds):
+                    starts.add(start_id)
+        
+        stamps = self._stamps.get(graph_name)
+        if stamps and node.type == "TemporalContext" and "startTime" in properties and "endTime" in properties:
+            start_time, end_time = properties["startTime"], properties["endTime"]
+            if _is_number(start_time) and _is_number(end_time):
+                low = bisect.bisect_left(stamps, (start_time,))
+                high = bisect.bisect_right(stamps, (end_time, chr(0x10FFFF)))
+                starts.update(start_id for _, start_id in stamps[low:high])
+            else:
+                starts.update(start_id for _, start_id in stamps)
+        return starts
+    
+    def _apply_events(self, batch: List[GraphEvent]) -> None:
+        """Apply a batch of node changes as deltas to the view"""
+        affected = set()
+        for event in batch:
+            graph_name = self._graph_keys.get(event.graph)
+            node_id = event.entity.id
+            if graph_name == self.start_graph:
+                affected.add(node_id)
+            affected.update(self._dependents.get((graph_name, node_id), ()))
+            if event.operation != "node_removed":
+                # What the node carries now, and for an update what it carried before
+                affected.update(self._probing(graph_name, event.entity))
+                if event.previous is not None:
+                    affected.update(self._probing(graph_name, event.previous))
+        
+        for start_id in affected:
+            self._evaluate(start_id)
+    
+    def __len__(self) -> int:
+        return len(self._paths)
+    
+    def results(self) -> List[Dict[str, Any]]:
+        """All rows as start/end/path dictionaries"""
+        return [
+            {"start": path[0], "end": path[-1], "path": list(path)}
+            for path in self._paths.values()
+        ]
+    
+    def grouped(self) -> Dict[str, List[str]]:
+        """Start node IDs grouped by the node their traversal ends at"""
+        return {end_id: list(start_ids) for end_id, start_ids in self._by_end.items()}
+    
+    def starts_for(self, end_id: str) -> List[str]:
+        """Start node IDs whose traversal ends at end_id"""
+        return list(self._by_end.get(end_id, ()))
+    
+    def end_for(self, start_id: str) -> Optional[str]:
+        """Final node ID for a start node, if it has a row"""
+        path = self._paths.get(start_id)
+        return path[-1] if path else None
+    
+    def close(self) -> None:
+        """Stop maintaining the view"""
+        self._subscription.close()
+
+
+# =============================================================================
+# 7. INSTRUMENTATION
+# =============================================================================
+
+# Latency bucket upper bounds in seconds (10us .. 10s)
+LATENCY_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram"""
+    
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+    
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, cumulative count) pairs, ending with +Inf"""
+        result = []
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            result.append((repr(bound), running))
+        result.append(("+Inf", running + self.counts[-1]))
+        return result
+
+
+class MetricsRegistry:
+    """Counters and latency histograms for TKG hot paths, keyed by name and labels"""
+    
+    HELP = {
+        "tkg_operation_seconds": "Latency of top-level TKG operations",
+        "tkg_adjunction_seconds": "Latency of adjoint applications",
+        "tkg_scan_seconds": "Latency of find_nodes/find_edges",
+        "tkg_entities_scanned_total": "Nodes or edges examined by scans",
+        "tkg_entities_returned_total": "Nodes or edges returned by scans",
+        "tkg_adjunction_cache_hits_total": "Adjoint applications answered from the cache",
+        "tkg_adjunction_cache_misses_total": "Adjoint applications that ran the mapping function",
+        "tkg_index_updates_total": "Index maintenance operations",
+        "tkg_index_lookups_total": "Lookups answered by an index",
+        "tkg_replication_frames_total": "Replication frames a replica applied",
+        "tkg_replication_delay_seconds": "Time from a primary commit to its replica applying it"
+    }
+    
+    def __init__(self):
+        self.histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], Histogram]] = defaultdict(dict)
+        self.counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], int]] = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+    
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        """Record one histogram observation"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = Histogram()
+            histogram.observe(value)
+    
+    def increment(self, name: str, labels: Dict[str, str], amount: int = 1) -> None:
+        """Add to a counter"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.counters[name][key] += amount
+    
+    def time_call(self, operation: str, function: Callable, *args, **kwargs) -> Any:
+        """Run a function and record its latency under tkg_operation_seconds"""
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.observe("tkg_operation_seconds", {"operation": operation}, time.perf_counter() - start)
+    
+    def time_adjoint(self, adjunction: 'Adjunction', direction: str, node_id: str) -> Optional[str]:
+        """Apply one direction of an adjunction, recording latency and cache behaviour"""
+        labels = {"adjunction": adjunction.name, "direction": direction}
+        if direction == "left":
+            hit = node_id in adjunction.left_cache
+            apply = adjunction._apply_left_adjoint
+        else:
+            hit = node_id in adjunction.right_cache
+            apply = adjunction._apply_right_adjoint
+        
+        start = time.perf_counter()
+        try:
+            return apply(node_id)
+        finally:
+            self.observe("tkg_adjunction_seconds", labels, time.perf_counter() - start)
+            self.increment("tkg_adjunction_cache_hits_total" if hit else "tkg_adjunction_cache_misses_total",
+                           labels)
+    
+    def record_scan(self, graph: str, operation: str, start: float, scanned: int, returned: int) -> None:
+        """Record a finished find_nodes/find_edges call"""
+        labels = {"graph": graph, "operation": operation}
+        self.observe("tkg_scan_seconds", labels, time.perf_counter() - start)
+        self.increment("tkg_entities_scanned_total", labels, scanned)
+        self.increment("tkg_entities_returned_total", labels, returned)
+    
+    def record_index_updates(self, graph: str, indexes: Dict[str, Any], operation: str) -> None:
+        """Count maintenance of every index on a graph for one mutation"""
+        for index_name in indexes:
+            self.increment("tkg_index_updates_total",
+                           {"graph": graph, "index": index_name, "operation": operation})
+    
+    def record_index_lookup(self, graph: str, index_name: str) -> None:
+        """Count a lookup that an index answered instead of a scan"""
+        self.increment("tkg_index_lookups_total", {"graph": graph, "index": index_name})
+    
+    def reset(self) -> None:
+        """Discard everything collected so far"""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable copy of all metrics"""
+        with self._lock:
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "mean": histogram.sum / histogram.count if histogram.count else 0.0,
+                        "buckets": dict(histogram.cumulative())
+                    }
+                    for key, histogram in series.items()
+                ]
+                for name, series in self.histograms.items()
+            }
+            counters = {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            }
+        return {"enabled": True, "histograms": histograms, "counters": counters}
+    
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        def render_labels(key: Tuple[Tuple[str, str], ...], extra: Tuple[str, str] = None) -> str:
+            pairs = list(key) + ([extra] if extra else [])
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in pairs) + "}"
+        
+        def escape(value: Any) -> str:
+            return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    for bound, count in histogram.cumulative():
+                        lines.append(f"{name}_bucket{render_labels(key, ('le', bound))} {count}")
+                    lines.append(f"{name}_sum{render_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{render_labels(key)} {histogram.count}")
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in series.items():
+                    lines.append(f"{name}{render_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+# =============================================================================
+# 8. QUERY EXPLAIN
+# =============================================================================
+
+# Planner guesses for the fraction of candidates a context keeps
+RELEVANCE_SELECTIVITY = {
+    "TemporalContext": 0.3,
+    "SpatialContext": 0.1,
+    "PerspectiveContext": 0.1
+}
+DEFAULT_SELECTIVITY = 0.5
+# Fraction of a graph an unindexed equality constraint is assumed to match
+DEFAULT_EQUALITY_SELECTIVITY = 0.1
+
+
+@dataclass
+class PlanNode:
+    """One operator of an EXPLAIN tree"""
+    operator: str
+    detail: Dict[str, Any] = field(default_factory=dict)
+    index: Optional[str] = None
+    estimated_rows: Optional[float] = None
+    actual_rows: Optional[int] = None
+    time_ms: Optional[float] = None
+    scanned: Optional[int] = None
+    cache_hits: Optional[int] = None
+    cache_misses: Optional[int] = None
+    children: List['PlanNode'] = field(default_factory=list)
+    
+    def add(self, child: 'PlanNode') -> 'PlanNode':
+        self.children.append(child)
+        return child
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the tree to nested dictionaries, omitting unset fields"""
+        result = {"operator": self.operator}
+        for key in ("detail", "index", "estimated_rows", "actual_rows", "time_ms",
+                    "scanned", "cache_hits", "cache_misses"):
+            value = getattr(self, key)
+            if value is not None and value != {}:
+                result[key] = value
+        if self.children:
+            result["children"] = [child.to_dict() for child in self.children]
+        return result
+    
+    def render(self, depth: int = 0) -> str:
+        """Indented text form, one operator per line"""
+        parts = [self.operator]
+        if self.detail:
+            parts.append(" ".join(f"{key}={value}" for key, value in self.detail.items()))
+        if self.index is not None:
+            parts.append(f"index={self.index}")
+        if self.estimated_rows is not None:
+            parts.append(f"est_rows={self.estimated_rows:g}")
+        if self.actual_rows is not None:
+            parts.append(f"rows={self.actual_rows}")
+        if self.time_ms is not None:
+            parts.append(f"time={self.time_ms:.3f}ms")
+        if self.scanned:
+            parts.append(f"scanned={self.scanned}")
+        if self.cache_hits is not None or self.cache_misses is not None:
+            parts.append(f"cache={self.cache_hits or 0}/{(self.cache_hits or 0) + (self.cache_misses or 0)}")
+        line = ("  " * depth + ("-> " if depth else "")) + "  ".join(parts)
+        return "\n".join([line] + [child.render(depth + 1) for child in self.children])
+    
+    def __str__(self) -> str:
+        return self.render()
+
+
+class _QueryTracer(MetricsRegistry):
+    """
+    Registry swapped in during EXPLAIN ANALYZE.
+    
+    Everything is forwarded to the registry it replaced; observations made on
+    the analyzing thread are also charged to the operator currently running.
+    """
+    
+    def __init__(self, parent: Optional[MetricsRegistry]):
+        super().__init__()
+        self.parent = parent
+        self.thread = threading.get_ident()
+        self.current: Optional[PlanNode] = None
+        self._adjunction_nodes: Dict[Tuple[int, str, str], PlanNode] = {}
+    
+    @contextmanager
+    def operator(self, node: PlanNode):
+        """Charge work to `node` and time it"""
+        previous = self.current
+        self.current = node
+        start = time.perf_counter()
+        try:
+            yield node
+        finally:
+            node.time_ms = (time.perf_counter() - start) * 1e3
+            self.current = previous
+    
+    def _adjunction_node(self, labels: Dict[str, str]) -> PlanNode:
+        """Child of the current operator aggregating one adjoint direction"""
+        key = (id(self.current), labels["adjunction"], labels["direction"])
+        node = self._adjunction_nodes.get(key)
+        if node is None:
+            node = self.current.add(PlanNode(
+                "AdjunctionApply",
+                {"adjunction": labels["adjunction"], "direction": labels["direction"]},
+                actual_rows=0, time_ms=0.0, cache_hits=0, cache_misses=0
+            ))
+            self._adjunction_nodes[key] = node
+        return node
+    
+    def observe(self, name: str, labels: Dict[str, str], value: float) -> None:
+        if self.parent is not None:
+            self.parent.observe(name, labels, value)
+        if self.current is None or threading.get_ident() != self.thread:
+            return
+        if name == "tkg_adjunction_seconds":
+            node = self._adjunction_node(labels)
+            node.actual_rows += 1
+            node.time_ms += value * 1e3
+    
+    def increment(self, name: str, labels: Dict[str, str], amount: int = 1) -> None:
+        if self.parent is not None:
+            self.parent.increment(name, labels, amount)
+        if self.current is None or threading.get_ident() != self.thread:
+            return
+        current = self.current
+        if name == "tkg_entities_scanned_total":
+            current.scanned = (current.scanned or 0) + amount
+        elif name in ("tkg_adjunction_cache_hits_total", "tkg_adjunction_cache_misses_total"):
+            field_name = "cache_hits" if name == "tkg_adjunction_cache_hits_total" else "cache_misses"
+            for node in (current, self._adjunction_node(labels)):
+                setattr(node, field_name, (getattr(node, field_name) or 0) + amount)
+        elif name == "tkg_index_lookups_total":
+            current.detail.setdefault("indexes_used", [])
+            if labels["index"] not in current.detail["indexes_used"]:
+                current.detail["indexes_used"].append(labels["index"])
+
+
+class QueryExplainer:
+    """Builds EXPLAIN trees for contextual_query and executes them for EXPLAIN ANALYZE"""
+    
+    def __init__(self, tkg: TrinitarianKnowledgeGraph):
+        self.tkg = tkg
+    
+    def _candidate_fetch(self, parsed: Dict) -> PlanNode:
+        """Plan the fetch of instances or relations, choosing an index if one covers the key"""
+        if parsed["type"] == "concept_instances":
+            graph = self.tkg.instance_graph
+            key, value, entity = "properties.conceptId", parsed["conceptId"], "node"
+            total = len(graph.nodes)
+        else:
+            graph = self.tkg.instance_graph
+            key, value, entity = "properties.relationTypeId", parsed["relationTypeId"], "edge"
+            total = len(graph.edges)
+        
+        # Same access path find_nodes/find_edges will take; an index lookup
+        # also gives an exact estimate
+        access = graph.access_path({key: value}, entity)
+        detail = {"graph": graph.name, "constraint": f"{key} = {value}"}
+        if access is not None:
+            detail["access"] = "index lookup"
+            detail["index"] = access[0]
+            estimate = graph.index_bucket_size(access[0], value, entity)
+        else:
+            detail["access"] = "find_nodes scan" if entity == "node" else "find_edges scan"
+            estimate = total * DEFAULT_EQUALITY_SELECTIVITY
+        return PlanNode("CandidateFetch", detail, estimated_rows=estimate)
+    
+    def _partition_scan(self, parsed: Dict, context: Node, fetch: PlanNode) -> Optional[PlanNode]:
+        """
+        Plan reading the context's partitions, whose dated or located
+        instances pass relevance unchecked, if instances are partitioned and
+        it can be scoped
+        """
+        graph = self.tkg.instance_graph
+        partitions = graph.partitions
+        if partitions is None:
+            return None
+        with graph._lock:
+            opened = partitions.partitions_for(context)
+            if opened is None:
+                return None
+            opened = [(kind, key) for kind, key in opened if key is not None]
+            sizes = partitions.sizes()
+            rows = sum(sizes[kind][key] for kind, key in opened)
+            total = len(graph.nodes)
+        kind = opened[0][0] if opened else ("temporal" if context.type == "TemporalContext" else "spatial")
+        detail = {"graph": graph.name, "constraint": f"properties.conceptId = {parsed['conceptId']}",
+                  "partitions": f"{len(opened)} of {len(sizes[kind])} {kind}", "admits": "without relevance check"}
+        # Concept share of the instances, spread evenly over the partitions
+        share = fetch.estimated_rows / total if total else 0
+        return PlanNode("PartitionScan", detail, estimated_rows=round(rows * share, 2))
+    
+    def _relevance_filter(self, context: Node, input_rows: float, per_row_checks: int) -> PlanNode:
+        selectivity = RELEVANCE_SELECTIVITY.get(context.type, DEFAULT_SELECTIVITY) ** per_row_checks
+        return PlanNode(
+            "RelevanceFilter",
+            {"context": context.id, "context_type": context.type,
+             "checks_per_row": per_row_checks,
+             "fallback_adjunctions": "contextualization.left, exemplification.left"},
+            estimated_rows=round(input_rows * selectivity, 2)
+        )
+    
+    def _applicability_check(self, concept_id: str, context_id: str) -> PlanNode:
+        node = PlanNode("ApplicabilityCheck", {"concept": concept_id, "context": context_id}, estimated_rows=1)
+        if self.tkg.adjunctions:
+            node.add(PlanNode("AdjunctionApply", {"adjunction": "applicability", "direction": "left",
+                                                  "input": concept_id}, estimated_rows=1))
+            node.add(PlanNode("AdjunctionApply", {"adjunction": "interpretation", "direction": "left",
+                                                  "input": context_id}, estimated_rows=1))
+        return node
+    
+    def _build(self, query_string: str, context_id: str = None) -> Tuple[PlanNode, Optional[Dict], Optional[Node]]:
+        """Plan tree plus the parsed query and resolved context"""
+        parse = PlanNode("Parse", {"query": query_string}, estimated_rows=1)
+        parsed = self.tkg.parse_query(query_string)
+        if not parsed:
+            root = PlanNode("Result", {"status": "error", "message": "Failed to parse query"}, estimated_rows=0)
+            root.add(parse)
+            return root, None, None
+        parse.detail["type"] = parsed["type"]
+        if parsed["type"] == "aggregate" and not context_id:
+            context_id = parsed["contextId"]
+        
+        context = self.tkg.context_graph.get_node(context_id) if context_id else None
+        root = PlanNode("Result", {"type": parsed["type"]})
+        root.add(parse)
+        if context_id and not context:
+            root.detail["status"] = "error"
+            root.detail["message"] = f"Context {context_id} not found"
+            root.estimated_rows = 0
+            return root, parsed, None
+        
+        if parsed["type"] == "aggregate":
+            root.add(PlanNode("Aggregate", {
+                "function": parsed["function"],
+                "target": parsed["target"],
+                "group_by": [group["name"] for group in parsed["groupBy"]],
+                "strategy": QueryAggregator(self.tkg).strategy(parsed, context)
+            }))
+            return root, parsed, context
+        
+        if parsed["type"] == "pattern":
+            join = root.add(self._pattern_join(parsed, context))
+            root.estimated_rows = join.estimated_rows
+            if join.detail.get("status") == "error":
+                root.detail.update(join.detail)
+            return root, parsed, context
+        
+        subject = parsed.get("conceptId") or parsed.get("relationTypeId")
+        if not self.tkg.ontological_graph.get_node(subject):
+            label = "Concept" if parsed["type"] == "concept_instances" else "Relation type"
+            root.detail["status"] = "error"
+            root.detail["message"] = f"{label} {subject} not found"
+            root.estimated_rows = 0
+            return root, parsed, context
+        if context:
+            root.add(self._applicability_check(subject, context.id))
+        
+        fetch = self._candidate_fetch(parsed)
+        if context:
+            checks = 1 if parsed["type"] == "concept_instances" else 2
+            relevance = root.add(self._relevance_filter(context, fetch.estimated_rows, checks))
+            relevance.add(fetch)
+            partition_scan = self._partition_scan(parsed, context, fetch) if parsed["type"] == "concept_instances" else None
+            if partition_scan is not None:
+                relevance.add(partition_scan)
+            root.estimated_rows = relevance.estimated_rows
+        else:
+            root.add(fetch)
+            root.estimated_rows = fetch.estimated_rows
+        return root, parsed, context
+    
+    def _pattern_join(self, parsed: Dict, context: Optional[Node]) -> PlanNode:
+        """One Bind operator per variable, in join order, each fed by the previous"""
+        matcher = PatternMatcher(self.tkg)
+        try:
+            patterns, graphs = matcher.resolve(parsed, context)
+        except ValueError as error:
+            return PlanNode("PatternJoin", {"status": "error", "message": str(error)}, estimated_rows=0)
+        steps = matcher.plan(patterns, graphs)
+        join = PlanNode("PatternJoin", {"order": " ".join(step.variable for step in steps)},
+                        estimated_rows=steps[-1].estimated_rows if steps else 0)
+        parent = join
+        for step in reversed(steps):
+            detail = {"variable": step.variable, "graph": step.graph}
+            if step.generators:
+                detail["from"] = "; ".join(pattern.describe() for pattern in step.generators)
+            else:
+                detail["from"] = "scan"
+            if step.filters:
+                detail["check"] = "; ".join(pattern.describe() for pattern in step.filters)
+            parent = parent.add(PlanNode("Bind", detail, estimated_rows=step.estimated_rows))
+        return join
+    
+    def explain(self, query_string: str, context_id: str = None) -> PlanNode:
+        return self._build(query_string, context_id)[0]
+    
+    def analyze(self, query_string: str, context_id: str = None) -> PlanNode:
+        """Execute the plan operator by operator, recording actuals on each node"""
+        tkg = self.tkg
+        with tkg._explain_lock:
+            previous = tkg._metrics
+            tracer = _QueryTracer(previous)
+            tkg._attach_metrics(tracer)
+            try:
+                start = time.perf_counter()
+                root = self._execute(tracer, query_string, context_id)
+                root.time_ms = (time.perf_counter() - start) * 1e3
+            finally:
+                tkg._attach_metrics(previous)
+        return root
+    
+    def _execute(self, tracer: _QueryTracer, query_string: str, context_id: str = None) -> PlanNode:
+        tkg = self.tkg
+        parse_start = time.perf_counter()
+        root, parsed, context = self._build(query_string, context_id)
+        operators = {child.operator: child for child in root.children}
+        parse = operators["Parse"]
+        parse.time_ms = (time.perf_counter() - parse_start) * 1e3
+        parse.actual_rows = 1 if parsed else 0
+        if not parsed or root.detail.get("status") == "error":
+            root.actual_rows = 0
+            return root
+        
+        if parsed["type"] == "aggregate":
+            aggregate = operators["Aggregate"]
+            with tracer.operator(aggregate):
+                result = QueryAggregator(tkg).run(parsed, context)
+            aggregate.actual_rows = len(result["results"])
+            aggregate.detail["strategy"] = result.get("strategy", aggregate.detail["strategy"])
+            root.detail["status"] = result["status"]
+            root.actual_rows = aggregate.actual_rows
+            return root
+        
+        if parsed["type"] == "pattern":
+            join = operators["PatternJoin"]
+            with tracer.operator(join):
+                result = PatternMatcher(tkg).run(parsed, context)
+            join.actual_rows = len(result["results"])
+            root.detail["status"] = result["status"]
+            root.actual_rows = join.actual_rows
+            return root
+        
+        is_concept = parsed["type"] == "concept_instances"
+        subject = parsed["conceptId"] if is_concept else parsed["relationTypeId"]
+        
+        if context:
+            check = operators["ApplicabilityCheck"]
+            # Estimated-only children are replaced by the traced ones
+            check.children = []
+            with tracer.operator(check):
+                applicable = tkg.is_concept_applicable_in_context(subject, context.id)
+            check.actual_rows = 1 if applicable else 0
+            check.detail["applicable"] = applicable
+            if not applicable:
+                root.detail["status"] = "inapplicable"
+                root.actual_rows = 0
+                return root
+        
+        if context:
+            relevance = operators["RelevanceFilter"]
+            fetch = relevance.children[0]
+        else:
+            relevance = None
+            fetch = operators["CandidateFetch"]
+        
+        with tracer.operator(fetch):
+            if is_concept:
+                candidates = tkg.instance_graph.get_entities_of_concept(subject)
+            else:
+                candidates = tkg.instance_graph.get_relations_of_type(subject)
+        fetch.actual_rows = len(candidates)
+        
+        inside_ids = ()
+        if relevance is not None and len(relevance.children) > 1:
+            partition_scan = relevance.children[1]
+            with tracer.operator(partition_scan):
+                inside = tkg.scoped_instances(context, subject, bounded=True) or []
+            partition_scan.actual_rows = len(inside)
+            inside_ids = {instance.id for instance in inside}
+        
+        if relevance is not None:
+            with tracer.operator(relevance):
+                if is_concept:
+                    results = [
+                        instance for instance in candidates
+                        if instance.id in inside_ids or tkg.is_instance_relevant_in_context(instance.id, context.id)
+                    ]
+                else:
+                    results = [
+                        relation for relation in candidates
+                        if tkg.is_instance_relevant_in_context(relation.source.id, context.id) and
+                        tkg.is_instance_relevant_in_context(relation.target.id, context.id)
+                    ]
+            relevance.actual_rows = len(results)
+        else:
+            results = candidates
+        
+        root.detail["status"] = "success"
+        root.actual_rows = len(results)
+        return root
+
+
+# =============================================================================
+# 9. ADAPTIVE INDEXING
+# =============================================================================
+
+# Rough cost of one index entry (bucket slot plus its share of the key) for the memory budget
+INDEX_ENTRY_BYTES = 120
+# Prefix of indexes the auto-indexer owns; it never drops any other index
+AUTO_INDEX_PREFIX = "auto_"
+# Entities sampled to estimate how selective an equality key is
+SELECTIVITY_SAMPLE = 1000
+# Decisions kept for index_decisions(); older ones are forgotten
+INDEX_DECISION_LOG_SIZE = 1000
+
+
+@dataclass
+class KeyWorkload:
+    """Observed use of one constraint key during a tuning window"""
+    queries: int = 0
+    range_queries: int = 0
+    # Entities in the graph at query time and entities returned, summed over queries
+    examined: int = 0
+    returned: int = 0
+    
+    @property
+    def selectivity(self) -> float:
+        return self.returned / self.examined if self.examined else 1.0
+
+
+@dataclass
+class IndexDecision:
+    """One create, drop or skip decision made by the auto-indexer"""
+    action: str
+    graph: str
+    index: str
+    key: str
+    reason: str
+    timestamp: float = field(default_factory=time.time)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "graph": self.graph,
+            "index": self.index,
+            "key": self.key,
+            "reason": self.reason,
+            "timestamp": self.timestamp
+        }
+
+
+class WorkloadObserver:
+    """Records the constraint keys find_nodes/find_edges receive and how selective they are"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.window: Dict[Tuple[str, str, str], KeyWorkload] = defaultdict(KeyWorkload)
+        self.lookups: Dict[Tuple[str, str], int] = defaultdict(int)
+    
+    def record(self, graph: str, entity: str, constraints: Dict, total: int, returned: int,
+               index_name: Optional[str]) -> None:
+        """Account one finished find call"""
+        # Keys an index could serve, top-level or inside $and; a multi-key query's
+        # selectivity is charged to each of them and checked again when tuning
+        keys: Dict[str, bool] = {}
+        for key, value in _conjuncts(constraints):
+            if _indexable_key(key):
+                keys[key] = keys.get(key, False) or _range_operator(value) is not None
+        with self._lock:
+            for key, is_range in keys.items():
+                stats = self.window[(graph, entity, key)]
+                stats.queries += 1
+                if is_range:
+                    stats.range_queries += 1
+                stats.examined += total
+                stats.returned += returned
+            if index_name is not None:
+                self.lookups[(graph, index_name)] += 1
+    
+    def drain(self) -> Tuple[Dict[Tuple[str, str, str], KeyWorkload], Dict[Tuple[str, str], int]]:
+        """Hand over the current window and start a new one"""
+        with self._lock:
+            window, lookups = self.window, self.lookups
+            self.window = defaultdict(KeyWorkload)
+            self.lookups = defaultdict(int)
+        return window, lookups
+
+
+class AutoIndexer:
+    """
+    Builds and drops indexes from the workload find_nodes/find_edges observe.
+    
+    Every `interval` seconds the last window is reviewed. Keys queried at
+    least `min_queries` times whose queries return at most `max_selectivity`
+    of the graph get a hash index, or a btree when most of their queries are
+    ranges. Auto indexes unused for `idle_windows` windows are dropped. Auto
+    indexes are kept within `memory_budget` bytes; the fixed indexes the
+    graphs create themselves are never touched.
+    """
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph', memory_budget: int = 16 * 1024 * 1024,
+                 min_queries: int = 10, max_selectivity: float = 0.25, idle_windows: int = 3,
+                 interval: float = 1.0):
+        if memory_budget < 0:
+            raise ValueError("memory_budget must not be negative")
+        if min_queries < 1 or idle_windows < 1:
+            raise ValueError("min_queries and idle_windows must be at least 1")
+        if not 0 < max_selectivity <= 1:
+            raise ValueError("max_selectivity must be in (0, 1]")
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.tkg = tkg
+        self.memory_budget = memory_budget
+        self.min_queries = min_queries
+        self.max_selectivity = max_selectivity
+        self.idle_windows = idle_windows
+        self.interval = interval
+        self.observer = WorkloadObserver()
+        self.decisions: deque = deque(maxlen=INDEX_DECISION_LOG_SIZE)
+        # Decisions of the tuning pass in progress, returned by tune()
+        self._made: Optional[List[IndexDecision]] = None
+        # (graph, index) -> consecutive windows without a lookup
+        self._idle: Dict[Tuple[str, str], int] = {}
+        # Keys already reported as not selective enough, so each is logged once
+        self._rejected: Set[Tuple[str, str, str]] = set()
+        self._tune_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def _graphs(self) -> List[Graph]:
+        return [self.tkg.ontological_graph, self.tkg.instance_graph, self.tkg.context_graph]
+    
+    def start(self) -> None:
+        """Tune in a background thread every `interval` seconds"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tkg-auto-indexer", daemon=True)
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """Stop the background thread, letting a tuning pass in progress finish"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.tune()
+            except Exception:
+                logger.exception("auto-indexer tuning pass failed")
+    
+    def auto_indexes(self) -> List[Tuple[Graph, str, HashIndex]]:
+        """Every index the auto-indexer built that still exists"""
+        return [
+            (graph, name, index)
+            for graph in self._graphs()
+            for name, index in graph.indexes.items() if name.startswith(AUTO_INDEX_PREFIX)
+        ]
+    
+    def memory_usage(self) -> int:
+        """Estimated bytes held by auto indexes"""
+        return sum(index.entries() for _, _, index in self.auto_indexes()) * INDEX_ENTRY_BYTES
+    
+    def drop_all(self) -> None:
+        """Drop every auto index"""
+        with self._tune_lock:
+            for graph, name, _ in self.auto_indexes():
+                graph.drop_index(name)
+                self._log(IndexDecision("drop", graph.name, name, "", "auto-indexing disabled"))
+    
+    def _log(self, decision: IndexDecision) -> None:
+        self.decisions.append(decision)
+        if self._made is not None:
+            self._made.append(decision)
+        logger.info("auto-index %s %s.%s (%s): %s", decision.action, decision.graph,
+                    decision.index, decision.key or "-", decision.reason)
+    
+    def _sampled_selectivity(self, graph: Graph, entity: str, key: str) -> float:
+        """Expected fraction of entities an equality query on `key` returns, from a sample"""
+        path = f"{entity}.{key}"
+        counts: Dict[Any, int] = defaultdict(int)
+        sampled = 0
+        with graph._read() as version:
+            entities = version.nodes if entity == "node" else version.edges
+            for item in entities.values():
+                if sampled == SELECTIVITY_SAMPLE:
+                    break
+                sampled += 1
+                found, value = _index_value(item, path)
+                if found:
+                    try:
+                        counts[value] += 1
+                    except TypeError:
+                        return 1.0
+        if not sampled:
+            return 1.0
+        # Chance that two entities share a value: the selectivity of a query
+        # whose value is drawn from the data
+        return sum(count * count for count in counts.values()) / (sampled * sampled)
+    
+    def tune(self) -> List[IndexDecision]:
+        """Review one window of workload: drop idle auto indexes, then build for hot keys"""
+        with self._tune_lock:
+            window, lookups = self.observer.drain()
+            made = self._made = []
+            
+            for graph, name, _ in self.auto_indexes():
+                if lookups.get((graph.name, name)):
+                    self._idle[(graph.name, name)] = 0
+                    continue
+                idle = self._idle.get((graph.name, name), 0) + 1
+                self._idle[(graph.name, name)] = idle
+                if idle >= self.idle_windows:
+                    graph.drop_index(name)
+                    del self._idle[(graph.name, name)]
+                    self._log(IndexDecision("drop", graph.name, name, "", f"no lookups for {idle} windows"))
+            
+            graphs = {graph.name: graph for graph in self._graphs()}
+            candidates = []
+            for (graph_name, entity, key), stats in window.items():
+                graph = graphs[graph_name]
+                ordered = stats.range_queries * 2 > stats.queries
+                if stats.queries < self.min_queries or graph.index_for(key, entity, ordered=ordered):
+                    continue
+                selectivity = stats.selectivity
+                if not ordered:
+                    selectivity = max(selectivity, self._sampled_selectivity(graph, entity, key))
+                if selectivity > self.max_selectivity:
+                    if (graph_name, entity, key) not in self._rejected:
+                        self._rejected.add((graph_name, entity, key))
+                        self._log(IndexDecision("skip", graph_name, "", key,
+                                                f"selectivity {selectivity:.3f} above {self.max_selectivity}"))
+                    continue
+                # Entities the window's scans touched without returning them
+                saved = stats.examined - stats.returned
+                candidates.append((saved, graph, entity, key, ordered, stats, selectivity))
+            
+            candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+            for saved, graph, entity, key, ordered, stats, selectivity in candidates:
+                name = f"{AUTO_INDEX_PREFIX}{entity}_{key.replace('.', '_')}"
+                size = len(graph.nodes if entity == "node" else graph.edges)
+                cost = size * INDEX_ENTRY_BYTES
+                available = self.memory_budget - self.memory_usage()
+                if cost > available:
+                    self._log(IndexDecision("skip", graph.name, name, key,
+                                            f"needs ~{cost} bytes, {max(available, 0)} left in budget"))
+                    continue
+                index_type = "btree" if ordered else "hash"
+                graph.create_index(name, index_type, [f"{entity}.{key}"])
+                self._idle[(graph.name, name)] = 0
+                self._log(IndexDecision(
+                    "create", graph.name, name, key,
+                    f"{index_type}: {stats.queries} queries ({stats.range_queries} range), "
+                    f"selectivity {selectivity:.3f}, {saved} entities scanned needlessly"
+                ))
+            
+            self._made = None
+            return made
+
+
+# =============================================================================
+# 10. COMPILED ADJACENCY
+# =============================================================================
+
+class CompiledGraph:
+    """
+    Read-optimized, integer-encoded copy of a graph for traversal-heavy work.
+    
+    Node, node-type and edge-type IDs are dictionary-encoded to int32
+    ordinals, and edges are held in CSR (by source) and CSC (by target) NumPy
+    arrays per edge type. Writes arrive through a change subscription and are
+    kept in a delta buffer that traversals read alongside the arrays; once
+    `merge_threshold` changes accumulate they are merged into fresh arrays.
+    Ordinals stay stable for the life of the compiled graph; removed nodes and
+    edges are masked out until enough of them pile up to compact.
+    """
+    
+    def __init__(self, graph: Graph, merge_threshold: int = 4096):
+        if np is None:
+            raise ImportError("CompiledGraph requires NumPy")
+        if merge_threshold < 1:
+            raise ValueError("merge_threshold must be at least 1")
+        self.graph = graph
+        self.merge_threshold = merge_threshold
+        # Guards the arrays; writers only ever take _pending_lock
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[GraphEvent] = []
+        
+        self.ids: List[str] = []
+        self.ordinals: Dict[str, int] = {}
+        self.type_names: List[str] = []
+        self.type_codes: Dict[str, int] = {}
+        self.edge_type_names: List[str] = []
+        self.edge_type_codes: Dict[str, int] = {}
+        # Node columns with spare capacity; only [:len(self.ids)] is meaningful
+        self.node_type = np.zeros(64, dtype=np.int32)
+        self.node_alive = np.zeros(64, dtype=bool)
+        
+        # Merged edges, addressed by edge ordinal, plus the unmerged delta
+        self.edge_ordinals: Dict[str, int] = {}
+        self.src = np.zeros(0, dtype=np.int32)
+        self.dst = np.zeros(0, dtype=np.int32)
+        self.etype = np.zeros(0, dtype=np.int32)
+        self.edge_alive = np.zeros(0, dtype=bool)
+        self._delta_src: List[int] = []
+        self._delta_dst: List[int] = []
+        self._delta_type: List[int] = []
+        self._delta_alive: List[bool] = []
+        self._delta_arrays = None
+        self._dead_edges = 0
+        self._changes = 0
+        # Bumped for every applied change, so derived data can tell it is stale
+        self.generation = 0
+        
+        # Edge type code -> (indptr, neighbour ordinals, edge ordinals)
+        self._out: Dict[int, Tuple[Any, Any, Any]] = {}
+        self._in: Dict[int, Tuple[Any, Any, Any]] = {}
+        self._merged_nodes = 0
+        # Property columns, built on first use and dropped on node changes
+        self._columns: Dict[str, Any] = {}
+        # Computed columns (e.g. analytics scores), kept until replaced
+        self._derived: Dict[str, Any] = {}
+        
+        # Subscribe and pin in one step so every later change is seen exactly once
+        self._subscription = Subscription(self._buffer, batch_size=1)
+        with graph._lock:
+            self._subscription.attach(graph)
+            version = graph._acquire()
+        try:
+            with self._lock:
+                self._load(version)
+        finally:
+            graph._unpin(version)
+    
+    def _load(self, version: GraphVersion) -> None:
+        """Initial build straight into the arrays, without going through the delta"""
+        for node in version.nodes.values():
+            self._add_node(node)
+        edges = list(version.edges.values())
+        ordinals = self.ordinals
+        for edge in edges:
+            # Dangling endpoints still get an ordinal
+            if edge.source.id not in ordinals:
+                self._add_node(edge.source)
+            if edge.target.id not in ordinals:
+                self._add_node(edge.target)
+        for edge_type in {edge.type for edge in edges}:
+            self._code(self.edge_type_names, self.edge_type_codes, edge_type)
+        edge_type_codes = self.edge_type_codes
+        self.src = np.fromiter((ordinals[edge.source.id] for edge in edges), dtype=np.int32, count=len(edges))
+        self.dst = np.fromiter((ordinals[edge.target.id] for edge in edges), dtype=np.int32, count=len(edges))
+        self.etype = np.fromiter((edge_type_codes[edge.type] for edge in edges), dtype=np.int32, count=len(edges))
+        self.edge_alive = np.ones(len(edges), dtype=bool)
+        self.edge_ordinals = {edge.id: ordinal for ordinal, edge in enumerate(edges)}
+        self._merge()
+    
+    def _buffer(self, events: List[GraphEvent]) -> None:
+        with self._pending_lock:
+            self._pending.extend(events)
+    
+    def close(self) -> None:
+        """Stop following the graph"""
+        self._subscription.close()
+    
+    # Dictionary encoding and delta maintenance
+    
+    def _code(self, names: List[str], codes: Dict[str, int], name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+    
+    def _add_node(self, node: Node) -> int:
+        ordinal = self.ordinals.get(node.id)
+        if ordinal is None:
+            ordinal = self.ordinals[node.id] = len(self.ids)
+            self.ids.append(node.id)
+            if ordinal >= len(self.node_type):
+                capacity = 2 * len(self.node_type)
+                self.node_type = np.resize(self.node_type, capacity)
+                self.node_alive = np.concatenate([self.node_alive, np.zeros(capacity - len(self.node_alive), dtype=bool)])
+        self.node_type[ordinal] = self._code(self.type_names, self.type_codes, node.type)
+        self.node_alive[ordinal] = True
+        return ordinal
+    
+    def _add_edge(self, edge: Edge) -> None:
+        self._delta_src.append(self._endpoint(edge.source))
+        self._delta_dst.append(self._endpoint(edge.target))
+        self._delta_type.append(self._code(self.edge_type_names, self.edge_type_codes, edge.type))
+        self._delta_alive.append(True)
+        self.edge_ordinals[edge.id] = len(self.src) + len(self._delta_src) - 1
+        self._delta_arrays = None
+    
+    def _endpoint(self, node: Node) -> int:
+        ordinal = self.ordinals.get(node.id)
+        return ordinal if ordinal is not None else self._add_node(node)
+    
+    def _remove_edge(self, edge_id: str) -> None:
+        ordinal = self.edge_ordinals.pop(edge_id, None)
+        if ordinal is None:
+            return
+        if ordinal < len(self.src):
+            self.edge_alive[ordinal] = False
+        else:
+            self._delta_alive[ordinal - len(self.src)] = False
+            self._delta_arrays = None
+        self._dead_edges += 1
+    
+    def _update_node(self, previous: Node, node: Node) -> None:
+        """Re-encode an updated node's type and patch only the cached columns it changed"""
+        ordinal = self._add_node(node)
+        for name, column in list(self._columns.items()):
+            value = node.properties.get(name)
+            if value == previous.properties.get(name):
+                continue
+            if ordinal >= len(column):
+                del self._columns[name]
+            elif column.dtype == object:
+                column[ordinal] = value
+            elif value is None or (isinstance(value, (int, float)) and not isinstance(value, bool)):
+                column[ordinal] = np.nan if value is None else value
+            else:
+                # No longer numeric; rebuild as an object column on next use
+                del self._columns[name]
+    
+    def _apply(self, event: GraphEvent) -> None:
+        operation = event.operation
+        if operation == "node_updated":
+            # Structure is unchanged, so it does not count towards a merge
+            self._update_node(event.previous, event.entity)
+            self.generation += 1
+            return
+        if operation == "node_added":
+            self._add_node(event.entity)
+            self._columns.clear()
+        elif operation == "node_removed":
+            ordinal = self.ordinals.get(event.entity.id)
+            if ordinal is not None:
+                self.node_alive[ordinal] = False
+            self._columns.clear()
+        elif operation == "edge_added":
+            self._add_edge(event.entity)
+        elif operation == "edge_updated":
+            self._remove_edge(event.previous.id)
+            self._add_edge(event.entity)
+        elif operation == "edge_removed":
+            self._remove_edge(event.entity.id)
+        self._changes += 1
+        self.generation += 1
+    
+    def _sync(self) -> None:
+        """Fold buffered change events into the delta, merging once it is large enough"""
+        with self._pending_lock:
+            events, self._pending = self._pending, []
+        for event in events:
+            self._apply(event)
+        if self._changes >= self.merge_threshold:
+            self._merge()
+    
+    def _merge(self) -> None:
+        """Move the delta into the arrays and rebuild CSR/CSC for every edge type"""
+        if self._delta_src:
+            self.src = np.concatenate([self.src, np.array(self._delta_src, dtype=np.int32)])
+            self.dst = np.concatenate([self.dst, np.array(self._delta_dst, dtype=np.int32)])
+            self.etype = np.concatenate([self.etype, np.array(self._delta_type, dtype=np.int32)])
+            self.edge_alive = np.concatenate([self.edge_alive, np.array(self._delta_alive, dtype=bool)])
+            self._delta_src, self._delta_dst, self._delta_type, self._delta_alive = [], [], [], []
+            self._delta_arrays = None
+        if self._dead_edges * 2 > len(self.src):
+            self._compact()
+        
+        node_count = len(self.ids)
+        alive = np.flatnonzero(self.edge_alive)
+        self._out = {}
+        self._in = {}
+        for code in range(len(self.edge_type_names)):
+            ordinals = alive[self.etype[alive] == code]
+            if not ordinals.size:
+                continue
+            self._out[code] = self._csr(self.src[ordinals], self.dst[ordinals], ordinals, node_count)
+            self._in[code] = self._csr(self.dst[ordinals], self.src[ordinals], ordinals, node_count)
+        self._merged_nodes = node_count
+        self._changes = 0
+    
+    def _csr(self, keys: Any, neighbours: Any, ordinals: Any, node_count: int) -> Tuple[Any, Any, Any]:
+        order = np.argsort(keys, kind="stable")
+        indptr = np.zeros(node_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=node_count), out=indptr[1:])
+        return indptr, neighbours[order], ordinals[order]
+    
+    def _compact(self) -> None:
+        """Drop dead edges from the arrays, renumbering edge ordinals"""
+        keep = np.flatnonzero(self.edge_alive)
+        remap = np.full(len(self.src), -1, dtype=np.int64)
+        remap[keep] = np.arange(len(keep))
+        self.edge_ordinals = {edge_id: int(remap[ordinal]) for edge_id, ordinal in self.edge_ordinals.items()}
+        self.src, self.dst, self.etype = self.src[keep], self.dst[keep], self.etype[keep]
+        self.edge_alive = np.ones(len(keep), dtype=bool)
+        self._dead_edges = 0
+    
+    def merge(self) -> None:
+        """Apply pending changes and merge the delta now"""
+        with self._lock:
+            self._sync()
+            self._merge()
+    
+    # Array traversals
+    
+    def _type_codes_for(self, edge_types: Optional[List[str]]) -> List[int]:
+        if edge_types is None:
+            return list(range(len(self.edge_type_names)))
+        return [self.edge_type_codes[name] for name in edge_types if name in self.edge_type_codes]
+    
+    def _delta(self) -> Tuple[Any, Any, Any]:
+        """Live delta edges as arrays: (src, dst, type)"""
+        if self._delta_arrays is None:
+            alive = np.array(self._delta_alive, dtype=bool)
+            self._delta_arrays = (
+                np.array(self._delta_src, dtype=np.int32)[alive],
+                np.array(self._delta_dst, dtype=np.int32)[alive],
+                np.array(self._delta_type, dtype=np.int32)[alive]
+            )
+        return self._delta_arrays
+    
+    def _expand(self, csr: Tuple[Any, Any, Any], frontier: Any) -> Any:
+        """Neighbours of every frontier ordinal in one CSR, as a flat array"""
+        indptr, neighbours, ordinals = csr
+        frontier = frontier[frontier < len(indptr) - 1]
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            return np.zeros(0, dtype=np.int32)
+        # Positions of every slice laid end to end: start of its slice plus offset within it
+        positions = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+        return neighbours[positions][self.edge_alive[ordinals[positions]]]
+    
+    def _neighbours(self, frontier: Any, codes: List[int], direction: str) -> Any:
+        parts = []
+        delta_src, delta_dst, delta_type = self._delta()
+        in_codes = np.isin(delta_type, codes) if delta_src.size else None
+        for forward in ((True,) if direction == "out" else (False,) if direction == "in" else (True, False)):
+            arrays = self._out if forward else self._in
+            for code in codes:
+                if code in arrays:
+                    parts.append(self._expand(arrays[code], frontier))
+            if in_codes is not None:
+                keys, neighbours = (delta_src, delta_dst) if forward else (delta_dst, delta_src)
+                parts.append(neighbours[in_codes & np.isin(keys, frontier)])
+        return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+    
+    def _distances(self, start_ids: List[str], edge_types: Optional[List[str]],
+                   direction: str, max_depth: Optional[int]) -> Any:
+        if direction not in ("out", "in", "both"):
+            raise ValueError(f"Invalid direction: {direction}")
+        self._sync()
+        codes = self._type_codes_for(edge_types)
+        node_count = len(self.ids)
+        distance = np.full(node_count, -1, dtype=np.int32)
+        frontier = np.array(
+            [self.ordinals[node_id] for node_id in start_ids if node_id in self.ordinals], dtype=np.int64
+        )
+        frontier = frontier[self.node_alive[frontier]]
+        distance[frontier] = 0
+        depth = 0
+        while frontier.size and (max_depth is None or depth < max_depth):
+            depth += 1
+            reached = np.unique(self._neighbours(frontier, codes, direction))
+            reached = reached[(distance[reached] < 0) & self.node_alive[reached]]
+            distance[reached] = depth
+            frontier = reached.astype(np.int64)
+        return distance
+    
+    def bfs(self, start_ids: Union[str, List[str]], edge_types: List[str] = None,
+            direction: str = "out", max_depth: int = None) -> Dict[str, int]:
+        """Hop distance to every node reachable from the start nodes, one array step per level"""
+        if isinstance(start_ids, str):
+            start_ids = [start_ids]
+        with self._lock:
+            distance = self._distances(start_ids, edge_types, direction, max_depth)
+            reached = np.flatnonzero(distance >= 0)
+            order = reached[np.argsort(distance[reached], kind="stable")]
+            return {self.ids[ordinal]: int(distance[ordinal]) for ordinal in order}
+    
+    def k_hop(self, start_ids: Union[str, List[str]], k: int, edge_types: List[str] = None,
+              direction: str = "out") -> List[str]:
+        """Nodes 1..k hops from the start nodes, nearest first"""
+        return [node_id for node_id, depth in
+                self.bfs(start_ids, edge_types, direction, k).items() if depth > 0]
+    
+    def is_a_descendants(self, concept_id: str) -> List[str]:
+        """Every concept below `concept_id` in the IS_A hierarchy"""
+        return self.k_hop(concept_id, None, ["IS_A"], "in")
+    
+    def is_a_ancestors(self, concept_id: str) -> List[str]:
+        """Every concept above `concept_id` in the IS_A hierarchy"""
+        return self.k_hop(concept_id, None, ["IS_A"], "out")
+    
+    def degree(self, edge_types: List[str] = None, direction: str = "out") -> Any:
+        """Live degree of every node ordinal"""
+        with self._lock:
+            src, dst = self.edge_arrays(edge_types)
+            result = np.zeros(len(self.ids), dtype=np.int64)
+            if direction in ("out", "both"):
+                result += np.bincount(src, minlength=len(self.ids))
+            if direction in ("in", "both"):
+                result += np.bincount(dst, minlength=len(self.ids))
+            return result
+    
+    def column(self, name: str) -> Any:
+        """
+        One node property as an array aligned with ordinals.
+        
+        Numeric properties come back as float64 with NaN where missing; any
+        other property as an object array with None where missing. Computed
+        columns stored with set_column take precedence, NaN-padded for nodes
+        added since. Property updates patch cached columns in place; copy a
+        column to keep it as it was.
+        """
+        with self._lock:
+            self._sync()
+            derived = self._derived.get(name)
+            if derived is not None:
+                if len(derived) < len(self.ids):
+                    derived = np.concatenate([derived, np.full(len(self.ids) - len(derived), np.nan)])
+                return derived
+            column = self._columns.get(name)
+            if column is not None:
+                return column
+            values = [None] * len(self.ids)
+            with self.graph._read() as version:
+                for ordinal, node_id in enumerate(self.ids):
+                    node = version.nodes.get(node_id)
+                    if node is not None:
+                        values[ordinal] = node.properties.get(name)
+            numeric = all(
+                value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+                for value in values
+            )
+            if numeric:
+                column = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+            self._columns[name] = column
+            return column
+    
+    def set_column(self, name: str, values: Any) -> None:
+        """Store a computed float column aligned with ordinals"""
+        with self._lock:
+            self._derived[name] = np.asarray(values, dtype=np.float64)
+    
+    def value(self, name: str, node_id: str, default: float = 0.0) -> float:
+        """One node's entry in a computed column"""
+        with self._lock:
+            derived = self._derived.get(name)
+            ordinal = self.ordinals.get(node_id)
+            if derived is None or ordinal is None or ordinal >= len(derived) or np.isnan(derived[ordinal]):
+                return default
+            return float(derived[ordinal])
+    
+    def edge_arrays(self, edge_types: List[str] = None) -> Tuple[Any, Any]:
+        """(src, dst) ordinals of every live edge of the given types between live nodes"""
+        with self._lock:
+            self.merge()
+            codes = self._type_codes_for(edge_types)
+            alive = self.edge_alive & np.isin(self.etype, codes) & \
+                self.node_alive[self.src] & self.node_alive[self.dst]
+            return self.src[alive], self.dst[alive]
+    
+    def to_scipy_sparse(self, edge_types: List[str] = None) -> Any:
+        """Adjacency as a scipy.sparse CSR matrix over node ordinals; parallel edges are summed"""
+        from scipy import sparse
+        
+        with self._lock:
+            src, dst = self.edge_arrays(edge_types)
+            node_count = len(self.ids)
+            return sparse.csr_matrix(
+                (np.ones(len(src), dtype=np.float64), (src, dst)),
+                shape=(node_count, node_count)
+            )
+
+
+# =============================================================================
+# 11. GRAPH ANALYTICS
+# =============================================================================
+
+class InstanceAnalytics:
+    """
+    Entity importance over the instance graph's RELATION edges.
+    
+    PageRank, personalized PageRank per context and degree centrality are
+    computed by power iteration over the compiled instance graph (each step a
+    bincount over the edge arrays, i.e. a sparse matrix-vector product) and
+    stored as computed columns on it: "pagerank", "degree_centrality" and
+    "pagerank:<context id>". refresh() recomputes only after the graph
+    changed, warm-starting from the previous scores so small changes
+    converge in a few iterations.
+    """
+    
+    EDGE_TYPES = ["RELATION"]
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph', damping: float = 0.85,
+                 tolerance: float = 1e-6, max_iterations: int = 100):
+        if not 0 < damping < 1:
+            raise ValueError("damping must be in (0, 1)")
+        self.tkg = tkg
+        self.compiled = tkg.instance_graph.compiled()
+        self.damping = damping
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.contexts: List[str] = []
+        self.generation: Optional[int] = None
+        self.iterations: Dict[str, int] = {}
+        # Column name -> max score, for normalizing importance into [0, 1]
+        self._max: Dict[str, float] = {}
+    
+    def _pagerank(self, src: Any, dst: Any, alive: Any, personalization: Any,
+                  start: Any, column: str) -> Any:
+        node_count = len(alive)
+        out_degree = np.bincount(src, minlength=node_count).astype(np.float64)
+        dangling = alive & (out_degree == 0)
+        inverse_degree = np.divide(1.0, out_degree, out=np.zeros(node_count), where=out_degree > 0)
+        rank = start
+        for iteration in range(1, self.max_iterations + 1):
+            spread = np.bincount(dst, weights=(rank * inverse_degree)[src], minlength=node_count)
+            # Dangling mass and teleportation both follow the personalization vector
+            updated = self.damping * spread + \
+                (self.damping * rank[dangling].sum() + 1.0 - self.damping) * personalization
+            delta = np.abs(updated - rank).sum()
+            rank = updated
+            if delta < self.tolerance:
+                break
+        self.iterations[column] = iteration
+        return rank
+    
+    def _start(self, column: str, fallback: Any) -> Any:
+        """Previous scores for a warm start, or `fallback` the first time"""
+        previous = self.compiled.column(column) if column in self._max else None
+        if previous is None:
+            return fallback
+        start = np.nan_to_num(previous[:len(fallback)], nan=0.0)
+        total = start.sum()
+        return start / total if total > 0 else fallback
+    
+    def _members(self, context_id: str, alive: Any) -> Any:
+        """Personalization vector: the context's instances weighted by representativeness"""
+        weights = np.zeros(len(alive))
+        context = self.tkg.context_graph.get_node(context_id)
+        if context is not None:
+            ordinals = self.compiled.ordinals
+            for instance, score in self.tkg._exemplar_candidates(context):
+                ordinal = ordinals.get(instance.id)
+                if ordinal is not None and ordinal < len(weights):
+                    # Keep members at the edge of a period in the personalization
+                    weights[ordinal] = max(score, 0.0) + 1e-3
+        weights[~alive] = 0.0
+        total = weights.sum()
+        return weights / total if total > 0 else None
+    
+    def compute(self, contexts: List[str] = None) -> Dict[str, int]:
+        """Recompute every score column; returns iterations used per column"""
+        with self.compiled._lock:
+            src, dst = self.compiled.edge_arrays(self.EDGE_TYPES)
+            node_count = len(self.compiled.ids)
+            alive = self.compiled.node_alive[:node_count].copy()
+            self.generation = self.compiled.generation
+        if contexts is not None:
+            self.contexts = list(contexts)
+        self.iterations = {}
+        live = int(alive.sum())
+        uniform = np.where(alive, 1.0 / max(live, 1), 0.0)
+        
+        columns = {"pagerank": self._pagerank(src, dst, alive, uniform, self._start("pagerank", uniform), "pagerank")}
+        degree = np.bincount(src, minlength=node_count) + np.bincount(dst, minlength=node_count)
+        columns["degree_centrality"] = np.where(alive, degree / max(live - 1, 1), np.nan)
+        for context_id in self.contexts:
+            personalization = self._members(context_id, alive)
+            if personalization is None:
+                continue
+            column = f"pagerank:{context_id}"
+            columns[column] = self._pagerank(src, dst, alive, personalization,
+                                             self._start(column, personalization), column)
+        
+        self._max = {}
+        for column, values in columns.items():
+            values = np.where(alive, values, np.nan)
+            self.compiled.set_column(column, values)
+            self._max[column] = float(np.nanmax(values)) if live else 0.0
+        return self.iterations
+    
+    def refresh(self) -> bool:
+        """Recompute if the instance graph changed since the last compute"""
+        self.compiled.merge()
+        if self.compiled.generation == self.generation:
+            return False
+        self.compute()
+        return True
+    
+    def score(self, node_id: str, column: str = "pagerank") -> float:
+        """Raw score of one entity; 0 if it has none"""
+        return self.compiled.value(column, node_id)
+    
+    def importance(self, node_id: str, context_id: str = None) -> float:
+        """Score normalized to [0, 1]: personalized to the context when computed, else global"""
+        column = f"pagerank:{context_id}" if context_id is not None else "pagerank"
+        if column not in self._max:
+            column = "pagerank"
+        top = self._max.get(column, 0.0)
+        return self.compiled.value(column, node_id) / top if top > 0 else 0.0
+    
+    def top(self, k: int = 10, column: str = "pagerank") -> List[Tuple[str, float]]:
+        """The k highest-scoring entities in a column"""
+        values = np.nan_to_num(self.compiled.column(column), nan=-np.inf)
+        k = min(k, len(values))
+        if k <= 0:
+            return []
+        best = np.argpartition(-values, k - 1)[:k]
+        best = best[np.argsort(-values[best], kind="stable")]
+        return [(self.compiled.ids[ordinal], float(values[ordinal])) for ordinal in best if values[ordinal] > -np.inf]
+
+
+# =============================================================================
+# 12. VECTOR SEARCH
+# =============================================================================
+
+VECTOR_METRICS = ("cosine", "dot", "l2")
+
+
+class VectorIndex:
+    """
+    Node embeddings for one graph with exact and IVF approximate k-NN search.
+    
+    Vectors are float32 rows of one matrix (normalized up front for cosine).
+    Exact search is a single matrix-vector (or matrix-matrix for batches)
+    product with argpartition top-k. build_ivf() clusters the rows with
+    k-means into inverted lists; approximate search then scores only the
+    `nprobe` lists whose centroids are closest to the query. Rows of nodes
+    removed from the graph are dropped through a change subscription.
+    """
+    
+    def __init__(self, graph: Graph, dimension: int, metric: str = "cosine"):
+        if np is None:
+            raise ImportError("VectorIndex requires NumPy")
+        if metric not in VECTOR_METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if dimension < 1:
+            raise ValueError("dimension must be at least 1")
+        self.graph = graph
+        self.dimension = dimension
+        self.metric = metric
+        self._lock = threading.RLock()
+        self.ids: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.vectors = np.zeros((64, dimension), dtype=np.float32)
+        self.alive = np.zeros(64, dtype=bool)
+        # Node type code per row, for type filters
+        self.type_codes: Dict[str, int] = {}
+        self.row_type = np.zeros(64, dtype=np.int32)
+        # Squared norms per row, for l2
+        self.norms = np.zeros(64, dtype=np.float32)
+        self.centroids = None
+        self.lists: List[Any] = []
+        self._list_of_row = np.zeros(64, dtype=np.int32)
+        self._subscription = graph.subscribe(self._on_removed, operations=["node_removed"])
+    
+    def _on_removed(self, events: List[GraphEvent]) -> None:
+        for event in events:
+            self.remove(event.entity.id)
+    
+    def close(self) -> None:
+        """Stop following the graph"""
+        self._subscription.close()
+    
+    def __len__(self) -> int:
+        return int(self.alive[:len(self.ids)].sum())
+    
+    def _prepare(self, vectors: Any) -> Any:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[None, :]
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got {vectors.shape[1]}")
+        if self.metric == "cosine":
+            lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(lengths > 0, lengths, 1.0)
+        return vectors
+    
+    def _grow(self, size: int) -> None:
+        capacity = len(self.alive)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+        vectors[:len(self.ids)] = self.vectors[:len(self.ids)]
+        self.vectors = vectors
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - len(self.alive), dtype=bool)])
+        self.row_type = np.resize(self.row_type, capacity)
+        self.norms = np.resize(self.norms, capacity)
+        self._list_of_row = np.resize(self._list_of_row, capacity)
+    
+    def add(self, node_id: str, vector: Any) -> None:
+        """Store or replace the embedding of one node"""
+        self.add_batch([node_id], vector)
+    
+    def add_batch(self, node_ids: List[str], vectors: Any) -> None:
+        """Store or replace embeddings for many nodes; `vectors` is (len(node_ids), dimension)"""
+        vectors = self._prepare(vectors)
+        if len(node_ids) != len(vectors):
+            raise ValueError("node_ids and vectors differ in length")
+        with self._lock:
+            self._grow(len(self.ids) + len(node_ids))
+            rows = []
+            for node_id in node_ids:
+                node = self.graph.get_node(node_id)
+                if node is None:
+                    raise ValueError(f"Node {node_id} not found in {self.graph.name}")
+                row = self.rows.get(node_id)
+                if row is None:
+                    row = self.rows[node_id] = len(self.ids)
+                    self.ids.append(node_id)
+                elif self.centroids is not None and self.alive[row]:
+                    self.lists[self._list_of_row[row]] = self.lists[self._list_of_row[row]][
+                        self.lists[self._list_of_row[row]] != row]
+                code = self.type_codes.setdefault(node.type, len(self.type_codes))
+                self.row_type[row] = code
+                self.alive[row] = True
+                rows.append(row)
+            rows = np.array(rows, dtype=np.int64)
+            self.vectors[rows] = vectors
+            self.norms[rows] = np.einsum("ij,ij->i", vectors, vectors)
+            if self.centroids is not None:
+                # Later additions join the inverted list of their nearest centroid
+                assigned = self._nearest_lists(vectors, 1)[:, 0]
+                for list_number in np.unique(assigned):
+                    self.lists[list_number] = np.concatenate([self.lists[list_number], rows[assigned == list_number]])
+                self._list_of_row[rows] = assigned
+    
+    def remove(self, node_id: str) -> bool:
+        """Drop one node's embedding"""
+        with self._lock:
+            row = self.rows.get(node_id)
+            if row is None or not self.alive[row]:
+                return False
+            self.alive[row] = False
+            if self.centroids is not None:
+                list_number = self._list_of_row[row]
+                self.lists[list_number] = self.lists[list_number][self.lists[list_number] != row]
+            return True
+    
+    def _scores(self, queries: Any, rows: Any = None) -> Any:
+        """Similarity of each query to each row (higher is closer)"""
+        vectors = self.vectors[:len(self.ids)] if rows is None else self.vectors[rows]
+        scores = queries @ vectors.T
+        if self.metric == "l2":
+            norms = self.norms[:len(self.ids)] if rows is None else self.norms[rows]
+            scores = 2 * scores - norms - np.einsum("ij,ij->i", queries, queries)[:, None]
+        return scores
+    
+    def _nearest_lists(self, queries: Any, count: int) -> Any:
+        if self.metric == "l2":
+            similarity = 2 * queries @ self.centroids.T - np.einsum("ij,ij->i", self.centroids, self.centroids)
+        else:
+            similarity = queries @ self.centroids.T
+        count = min(count, len(self.centroids))
+        if count == 1:
+            return np.argmax(similarity, axis=1)[:, None]
+        nearest = np.argpartition(-similarity, count - 1, axis=1)[:, :count]
+        return np.take_along_axis(
+            nearest, np.argsort(-np.take_along_axis(similarity, nearest, axis=1), axis=1), axis=1)
+    
+    def build_ivf(self, nlist: int = None, iterations: int = 10, sample: int = 50000, seed: int = 0) -> None:
+        """Cluster the stored vectors into `nlist` inverted lists (default ~sqrt(n)) for approximate search"""
+        with self._lock:
+            live = np.flatnonzero(self.alive[:len(self.ids)])
+            if not live.size:
+                raise ValueError("No vectors to cluster")
+            nlist = min(nlist or max(1, int(np.sqrt(live.size))), live.size)
+            rng = np.random.default_rng(seed)
+            training = self.vectors[rng.choice(live, min(sample, live.size), replace=False)]
+            centroids = training[rng.choice(len(training), nlist, replace=False)].copy()
+            for _ in range(iterations):
+                assigned = np.argmax(training @ centroids.T - 0.5 * np.einsum("ij,ij->i", centroids, centroids), axis=1)
+                # Per-cluster means via one sort and reduceat; empty clusters keep their centroid
+                order = np.argsort(assigned, kind="stable")
+                counts = np.bincount(assigned, minlength=nlist)
+                occupied = np.flatnonzero(counts)
+                sums = np.add.reduceat(training[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[occupied])
+                centroids[occupied] = sums / counts[occupied, None]
+                if self.metric == "cosine":
+                    centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+            self.centroids = centroids
+            assigned = np.empty(live.size, dtype=np.int32)
+            for start in range(0, live.size, 65536):
+                chunk = live[start:start + 65536]
+                assigned[start:start + len(chunk)] = self._nearest_lists(self.vectors[chunk], 1)[:, 0]
+            self._list_of_row[live] = assigned
+            order = np.argsort(assigned, kind="stable")
+            bounds = np.searchsorted(assigned[order], np.arange(nlist + 1))
+            self.lists = [live[order[bounds[i]:bounds[i + 1]]] for i in range(nlist)]
+    
+    def search(self, query: Any, k: int = 10, node_type: str = None,
+               predicate: Callable[[str], bool] = None, approximate: bool = False,
+               nprobe: int = 8) -> List[Tuple[str, float]]:
+        """
+        The k nodes whose embeddings are most similar to `query`, best first.
+        
+        `node_type` restricts results to one node type; `predicate` is checked
+        on candidates in score order until k pass. With `approximate` the IVF
+        lists are used (build_ivf first).
+        """
+        return self.search_batch(self._prepare(query), k, node_type, predicate, approximate, nprobe)[0]
+    
+    def search_batch(self, queries: Any, k: int = 10, node_type: str = None,
+                     predicate: Callable[[str], bool] = None, approximate: bool = False,
+                     nprobe: int = 8) -> List[List[Tuple[str, float]]]:
+        """search() for a (m, dimension) batch of queries in one matrix multiply"""
+        queries = self._prepare(queries)
+        if approximate and self.centroids is None:
+            raise ValueError("build_ivf() must be called before approximate search")
+        with self._lock:
+            count = len(self.ids)
+            mask = self.alive[:count].copy()
+            if node_type is not None:
+                mask &= self.row_type[:count] == self.type_codes.get(node_type, -1)
+            if not approximate:
+                scores = self._scores(queries)
+                scores[:, ~mask] = -np.inf
+                ranked = [(row_scores, None) for row_scores in scores]
+            else:
+                ranked = []
+                for query, probes in zip(queries, self._nearest_lists(queries, nprobe)):
+                    rows = np.concatenate([self.lists[list_number] for list_number in probes])
+                    rows = rows[mask[rows]]
+                    ranked.append((self._scores(query[None, :], rows)[0], rows))
+        # The predicate may read the graph, whose writers call remove(); check it unlocked
+        return [self._top(scores, rows, k, predicate) for scores, rows in ranked]
+    
+    def _top(self, scores: Any, rows: Any, k: int, predicate: Optional[Callable[[str], bool]]) -> List[Tuple[str, float]]:
+        """Best k of one score vector, verifying `predicate` on growing prefixes of the ranking"""
+        finite = int(np.isfinite(scores).sum())
+        result = []
+        taken = 0
+        window = k if predicate is None else 4 * k
+        while len(result) < k and taken < finite:
+            window = min(window, finite)
+            best = np.argpartition(-scores, window - 1)[:window] if window < len(scores) else np.arange(len(scores))
+            best = best[np.argsort(-scores[best], kind="stable")][taken:window]
+            for position in best:
+                if not np.isfinite(scores[position]):
+                    continue
+                node_id = self.ids[position if rows is None else rows[position]]
+                if predicate is None or predicate(node_id):
+                    result.append((node_id, float(scores[position])))
+                    if len(result) == k:
+                        break
+            taken = window
+            window *= 2
+        return result
+
+
+# =============================================================================
+# 13. FULL-TEXT SEARCH
+# =============================================================================
+
+# Node properties indexed for keyword search unless others are given
+TEXT_PROPERTIES = ("name", "title", "description")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens of a text"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TextIndex:
+    """
+    Inverted index over text properties of one graph's nodes, ranked with BM25.
+    
+    Postings map each term to the nodes containing it and their term
+    frequencies; a sorted term list serves prefix matches. The index follows
+    the graph through a change subscription, so adds, updates and removals
+    touch only the postings of the node involved.
+    """
+    
+    def __init__(self, graph: Graph, properties: List[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.graph = graph
+        self.properties = list(properties or TEXT_PROPERTIES)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.terms: List[str] = []
+        self.lengths: Dict[str, int] = {}
+        self.types: Dict[str, str] = {}
+        self.total_length = 0
+        
+        # Subscribe and pin in one step so every later change is seen exactly once;
+        # changes made while building are held back and applied afterwards
+        self._held: Optional[List[GraphEvent]] = []
+        self._subscription = Subscription(self._apply)
+        with graph._lock:
+            self._subscription.attach(graph)
+            version = graph._acquire()
+        try:
+            for node in version.nodes.values():
+                self._add(node)
+        finally:
+            graph._unpin(version)
+        with self._lock:
+            held, self._held = self._held, None
+            self._apply(held)
+    
+    def close(self) -> None:
+        """Stop following the graph"""
+        self._subscription.close()
+    
+    def _apply(self, events: List[GraphEvent]) -> None:
+        # Runs on the writer's thread, which holds the graph lock; never take
+        # the graph lock while holding ours
+        with self._lock:
+            if self._held is not None:
+                self._held.extend(events)
+                return
+            for event in events:
+                if event.operation == "node_added":
+                    self._add(event.entity)
+                elif event.operation == "node_updated":
+                    if (event.entity.type == event.previous.type and
+                            self._tokens(event.entity) == self._tokens(event.previous)):
+                        continue
+                    self._remove(event.previous)
+                    self._add(event.entity)
+                elif event.operation == "node_removed":
+                    self._remove(event.entity)
+    
+    def _tokens(self, node: Node) -> List[str]:
+        tokens = []
+        for prop in self.properties:
+            value = node.properties.get(prop)
+            if isinstance(value, str):
+                tokens.extend(tokenize(value))
+        return tokens
+    
+    def _add(self, node: Node) -> None:
+        tokens = self._tokens(node)
+        if not tokens:
+            return
+        for term in tokens:
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                bisect.insort(self.terms, term)
+            posting[node.id] = posting.get(node.id, 0) + 1
+        self.lengths[node.id] = len(tokens)
+        self.types[node.id] = node.type
+        self.total_length += len(tokens)
+    
+    def _remove(self, node: Node) -> None:
+        length = self.lengths.pop(node.id, None)
+        if length is None:
+            return
+        self.types.pop(node.id, None)
+        self.total_length -= length
+        for term in set(self._tokens(node)):
+            posting = self.postings.get(term)
+            if posting is not None and posting.pop(node.id, None) is not None and not posting:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+    
+    def _expand(self, prefix: str) -> List[str]:
+        """Indexed terms starting with `prefix`"""
+        start = bisect.bisect_left(self.terms, prefix)
+        end = bisect.bisect_left(self.terms, prefix + "\U0010ffff")
+        return self.terms[start:end]
+    
+    def search(self, query: str, k: int = 10, prefix: bool = True, node_type: str = None,
+               predicate: Callable[[str], bool] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k nodes for a keyword query by BM25, best first.
+        
+        With `prefix` the last query word also matches every term it starts.
+        `predicate` is checked on candidates in score order until k pass.
+        """
+        words = tokenize(query)
+        if not words or k <= 0:
+            return []
+        with self._lock:
+            document_count = len(self.lengths)
+            if not document_count:
+                return []
+            average_length = self.total_length / document_count
+            terms = set(words)
+            if prefix:
+                terms.update(self._expand(words[-1]))
+            
+            scores: Dict[str, float] = defaultdict(float)
+            for term in terms:
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (document_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for node_id, frequency in posting.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[node_id] / average_length)
+                    scores[node_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+            if node_type is not None:
+                scores = {node_id: score for node_id, score in scores.items() if self.types.get(node_id) == node_type}
+        
+        if predicate is None:
+            ranked = heapq.nsmallest(k, scores.items(), key=lambda item: (-item[1], item[0]))
+            return [(node_id, score) for node_id, score in ranked]
+        # The predicate may read the graph, whose writers need our lock; check it unlocked
+        result = []
+        for node_id, score in sorted(scores.items(), key=lambda item: (-item[1], item[0])):
+            if predicate(node_id):
+                result.append((node_id, score))
+                if len(result) == k:
+                    break
+        return result
+
+
+# =============================================================================
+# 14. HISTORY
+# =============================================================================
+
+# Past TKGs kept by TrinitarianKnowledgeGraph.as_of
+AS_OF_CACHE_SIZE = 4
+
+
+@dataclass
+class HistoryEntry:
+    """One recorded change; `entity` is a frozen copy, None once removed"""
+    version: int
+    timestamp: float
+    kind: str
+    entity_id: str
+    entity: Optional[Union[Node, Edge]]
+
+
+class _VersionedMap(Mapping):
+    """
+    Read-only mapping of a graph's nodes or edges as of one version, read
+    from the history's per-entity chains; iterates in the order the graph's
+    own maps had then, by when each entity last (re)appeared
+    """
+    
+    _MISSING = object()
+    
+    def __init__(self, history: 'GraphHistory', kind: str, version: int):
+        self.history = history
+        self.kind = kind
+        self.version = version
+        self._length: Optional[int] = None
+    
+    def _state(self, chain: List[Tuple[int, Any, Optional[int]]]) -> Optional[Tuple[int, Any, Optional[int]]]:
+        """A chain's (version, entity, appeared) as of the version; None if it did not exist yet"""
+        if chain[-1][0] <= self.version:
+            return chain[-1]
+        position = bisect.bisect_left(chain, (self.version + 1,))
+        return chain[position - 1] if position else None
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        self.history._require(self.version)
+        chain = self.history._chains[self.kind].get(key)
+        state = self._state(chain) if chain is not None else None
+        return default if state is None or state[1] is None else state[1]
+    
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, self._MISSING)
+        if value is self._MISSING:
+            raise KeyError(key)
+        return value
+    
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, self._MISSING) is not self._MISSING
+    
+    def items(self):
+        self.history._require(self.version)
+        chains = self.history._chains[self.kind]
+        # Appended to as changes are recorded, but only beyond this version
+        for appeared, key in self.history._order[self.kind]:
+            if appeared > self.version:
+                break
+            chain = chains.get(key)
+            state = self._state(chain) if chain is not None else None
+            if state is not None and state[1] is not None and state[2] == appeared:
+                yield key, state[1]
+    
+    def __iter__(self):
+        return (key for key, _ in self.items())
+    
+    def values(self):
+        return (entity for _, entity in self.items())
+    
+    def __len__(self) -> int:
+        if self._length is not None:
+            return self._length
+        length = sum(1 for _ in self.items())
+        if self.version <= self.history.graph.version:
+            # Later changes all come at later versions; this count is final
+            self._length = length
+        return length
+
+
+class HistoricalGraph(GraphView):
+    """Read-only view of a graph at a past version, answered by scans"""
+    
+    def __init__(self, graph: Graph, version: int, nodes: _VersionedMap, edges: _VersionedMap):
+        self.graph = graph
+        self.name = graph.name
+        self.version = version
+        self.nodes = nodes
+        self.edges = edges
+        self._version = GraphVersion(version, nodes, edges)
+    
+    @contextmanager
+    def _read(self):
+        yield self._version
+
+
+class GraphHistory:
+    """
+    Opt-in, delta-versioned history of one graph.
+    
+    Every committed change is recorded as a frozen copy of the entity at the
+    graph version it produced, appended to that entity's chain of versions.
+    Past versions are read straight from the chains, so no full copy of the
+    state is ever taken: every version shares the entities it did not change
+    with the others. Every `checkpoint_interval` changes (or on compact()),
+    deltas older than `retention_seconds` or `retention_versions` are
+    compacted away, each entity keeping only its state from the horizon on.
+    """
+    
+    def __init__(self, graph: Graph, checkpoint_interval: int = 1000,
+                 retention_seconds: float = None, retention_versions: int = None):
+        if checkpoint_interval < 1:
+            raise ValueError("checkpoint_interval must be at least 1")
+        self.graph = graph
+        self.checkpoint_interval = checkpoint_interval
+        self.retention_seconds = retention_seconds
+        self.retention_versions = retention_versions
+        self._lock = threading.RLock()
+        self.entries: List[HistoryEntry] = []
+        self._entry_versions: List[int] = []
+        self._entry_times: List[float] = []
+        # Kind -> entity id -> [(version, frozen entity or None once removed,
+        # version it last appeared at)], oldest first
+        self._chains: Dict[str, Dict[str, List[Tuple[int, Any, Optional[int]]]]] = {"node": {}, "edge": {}}
+        # Kind -> (version, entity id) each time an entity appeared, in order;
+        # the order the graph's maps iterate in at any version
+        self._order: Dict[str, List[Tuple[int, str]]] = {"node": [], "edge": []}
+        # Kind -> length of the order when compaction last pruned it
+        self._order_pruned: Dict[str, int] = {}
+        # Changes recorded since the retention policy was last applied
+        self._since_compaction = 0
+        
+        self._subscription = Subscription(self._record)
+        with graph._lock:
+            # Attached and captured together so the base state misses nothing
+            self._subscription.attach(graph)
+            self._earliest_version = graph.version
+            self._earliest_time = time.time()
+            for kind, entities in (("node", graph.nodes), ("edge", graph.edges)):
+                for entity_id, entity in entities.items():
+                    self._chains[kind][entity_id] = [(graph.version, self._freeze(entity), graph.version)]
+                    self._order[kind].append((graph.version, entity_id))
+                self._order_pruned[kind] = max(len(self._order[kind]), 1)
+    
+    def close(self) -> None:
+        """Stop recording"""
+        self._subscription.close()
+    
+    @staticmethod
+    def _freeze(entity: Union[Node, Edge]) -> Union[Node, Edge]:
+        """Copy whose properties later in-place edits cannot reach"""
+        if isinstance(entity, Node):
+            return Node(entity.id, entity.type, dict(entity.properties), entity.graph)
+        return Edge(entity.id, entity.source, entity.target, entity.type, dict(entity.properties), entity.graph)
+    
+    def _record(self, events: List[GraphEvent]) -> None:
+        with self._lock:
+            # A batch is one commit's events; they share its time
+            now = time.time()
+            for event in events:
+                kind = "node" if event.operation.startswith("node") else "edge"
+                chains = self._chains[kind]
+                chain = chains.get(event.entity.id)
+                if event.operation.endswith("_removed"):
+                    frozen = appeared = None
+                else:
+                    frozen = self._freeze(event.entity)
+                    if chain is not None and chain[-1][1] is not None:
+                        appeared = chain[-1][2]
+                    else:
+                        # New, or back after a removal: last in order, as in the graph's maps
+                        appeared = event.version
+                        self._order[kind].append((event.version, event.entity.id))
+                if chain is None:
+                    chains[event.entity.id] = [(event.version, frozen, appeared)]
+                else:
+                    # Several changes within one version leave its last state visible
+                    chain.append((event.version, frozen, appeared))
+                self.entries.append(HistoryEntry(event.version, now, kind, event.entity.id, frozen))
+                self._entry_versions.append(event.version)
+                self._entry_times.append(now)
+                self._since_compaction += 1
+                if self._since_compaction >= self.checkpoint_interval:
+                    self._since_compaction = 0
+                    self.compact()
+    
+    @property
+    def earliest_version(self) -> int:
+        return self._earliest_version
+    
+    def _require(self, version: int) -> None:
+        """Raise unless the history still covers a version"""
+        if version < self._earliest_version:
+            raise ValueError(f"History before version {self._earliest_version} has been compacted")
+    
+    def version_at(self, timestamp: float) -> int:
+        """Graph version current at a point in time"""
+        with self._lock:
+            if timestamp < self._earliest_time:
+                raise ValueError("History before that time is not available")
+            position = bisect.bisect_right(self._entry_times, timestamp)
+            return self._entry_versions[position - 1] if position else self._earliest_version
+    
+    def state_at(self, version: int) -> Tuple[_VersionedMap, _VersionedMap]:
+        """(nodes, edges) as of a version, read from the chains without copying them"""
+        self._require(version)
+        return _VersionedMap(self, "node", version), _VersionedMap(self, "edge", version)
+    
+    def view(self, version: int) -> HistoricalGraph:
+        """Read-only GraphView of the graph as of a version"""
+        nodes, edges = self.state_at(version)
+        return HistoricalGraph(self.graph, version, nodes, edges)
+    
+    def restore_into(self, version: int, target: Graph) -> None:
+        """Load the state as of a version into an empty graph"""
+        nodes, edges = self.state_at(version)
+        for node in nodes.values():
+            target.add_node(Node(node.id, node.type, dict(node.properties)))
+        for edge in edges.values():
+            source = target.get_node(edge.source.id) or Node(edge.source.id, edge.source.type, dict(edge.source.properties))
+            destination = target.get_node(edge.target.id) or Node(edge.target.id, edge.target.type, dict(edge.target.properties))
+            target.add_edge(Edge(edge.id, source, destination, edge.type, dict(edge.properties)))
+    
+    def changes(self, entity_id: str, kind: str = "node") -> List[HistoryEntry]:
+        """Retained deltas of one entity, oldest first"""
+        with self._lock:
+            return [entry for entry in self.entries if entry.entity_id == entity_id and entry.kind == kind]
+    
+    def compact(self, now: float = None) -> int:
+        """Drop deltas beyond the retention horizon, trimming only the chains they belong to"""
+        with self._lock:
+            horizon = self._earliest_version
+            if self.retention_versions is not None:
+                horizon = max(horizon, self.graph.version - self.retention_versions)
+            if self.retention_seconds is not None:
+                cutoff = (time.time() if now is None else now) - self.retention_seconds
+                position = bisect.bisect_right(self._entry_times, cutoff)
+                if position:
+                    horizon = max(horizon, self._entry_versions[position - 1])
+            horizon = min(horizon, self._entry_versions[-1] if self.entries else horizon)
+            if horizon <= self._earliest_version:
+                return 0
+            
+            dropped = bisect.bisect_right(self._entry_versions, horizon)
+            if dropped:
+                self._earliest_time = self._entry_times[dropped - 1]
+            # Raised first, so readers refuse the versions about to go
+            self._earliest_version = horizon
+            trimmed: Set[Tuple[str, str]] = set()
+            for entry in self.entries[:dropped]:
+                if (entry.kind, entry.entity_id) in trimmed:
+                    continue
+                trimmed.add((entry.kind, entry.entity_id))
+                chains = self._chains[entry.kind]
+                chain = chains[entry.entity_id]
+                position = bisect.bisect_left(chain, (horizon + 1,))
+                if position == len(chain) and chain[-1][1] is None:
+                    # Removed by the horizon and not back since
+                    del chains[entry.entity_id]
+                elif position > 1:
+                    # A new list, so readers iterating the old one are undisturbed
+                    chains[entry.entity_id] = chain[position - 1:]
+            for kind, order in self._order.items():
+                if len(order) > 2 * self._order_pruned[kind]:
+                    # Drop appearances no retained state refers to, once they could be half the order
+                    chains = self._chains[kind]
+                    order = [(appeared, key) for appeared, key in order
+                             if key in chains and any(state[2] == appeared for state in chains[key])]
+                    self._order[kind] = order
+                    self._order_pruned[kind] = max(len(order), 1)
+            del self.entries[:dropped]
+            del self._entry_versions[:dropped]
+            del self._entry_times[:dropped]
+            return dropped
+
+
+# =============================================================================
+# 15. STORAGE ENGINES
+# =============================================================================
+
+class StorageEngine:
+    """
+    Where a graph keeps its nodes and edges.
+    
+    An engine hands the graph the node and edge maps its versions use, and
+    may take over adjacency lookups and index maintenance; returning None
+    from those hooks leaves them to the graph.
+    """
+    
+    def attach(self, graph: Graph) -> Tuple[MutableMapping, MutableMapping]:
+        """Bind to a graph; returns its (nodes, edges) maps"""
+        raise NotImplementedError
+    
+    def fork(self, entities: MutableMapping) -> MutableMapping:
+        """Writable copy of a map that readers still hold"""
+        raise NotImplementedError
+    
+    def edges_for_node(self, node_id: str, direction: str = "both") -> Optional[List[Edge]]:
+        """Edges at a node; None if the engine keeps no adjacency"""
+        return None
+    
+    def create_index(self, name: str, index_type: str, properties: List[str]) -> Optional[Any]:
+        """An index maintained by the engine itself; None to let the graph build one"""
+        return None
+    
+    def drop_index(self, name: str) -> None:
+        """Drop an index created by create_index"""
+    
+    def flush(self) -> None:
+        """Persist buffered writes"""
+    
+    def close(self) -> None:
+        """Flush and release the engine's resources"""
+        self.flush()
+
+
+class MemoryStorage(StorageEngine):
+    """Plain dicts, with a full copy per version that readers still hold"""
+    
+    def attach(self, graph: Graph) -> Tuple[Dict[str, Node], Dict[str, Edge]]:
+        return {}, {}
+    
+    def fork(self, entities: Dict[str, Any]) -> Dict[str, Any]:
+        return dict(entities)
+
+
+class _LazyIndex:
+    """Stand-in for an index that `build` makes on first use; what index_for reads is known up front"""
+    
+    def __init__(self, build: Callable[[], Any], properties: List[str] = (),
+                 ordered: bool = False, answers_constraints: bool = False):
+        self._build = build
+        self._index = None
+        self.properties = properties
+        self.ordered = ordered
+        self.answers_constraints = answers_constraints
+    
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for what the index itself provides
+        if self._index is None:
+            self._index = self._build()
+        return getattr(self._index, name)
+
+
+class HistoryStorage(StorageEngine):
+    """
+    A graph's state at a past version, served from its GraphHistory.
+    
+    Nothing is copied on attach: the maps read the history's change chains
+    and indexes are built from them on first use. The maps belong to the
+    history, so the graph must keep its version pinned; its first write
+    then forks them into plain dicts.
+    """
+    
+    def __init__(self, history: 'GraphHistory', version: int):
+        self.history = history
+        self.version = version
+        self.graph: Optional[Graph] = None
+    
+    def attach(self, graph: Graph) -> Tuple[MutableMapping, MutableMapping]:
+        self.graph = graph
+        return self.history.state_at(self.version)
+    
+    def fork(self, entities: MutableMapping) -> Dict[str, Any]:
+        return dict(entities.items())
+    
+    def create_index(self, name: str, index_type: str, properties: List[str]) -> Optional[Any]:
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        kind = INDEX_TYPES[index_type]
+        graph = self.graph
+        
+        def build() -> Any:
+            index = kind(properties)
+            if properties[0].startswith("node."):
+                for node in graph._version.nodes.values():
+                    index.add_node(node)
+            else:
+                for edge in graph._version.edges.values():
+                    index.add_edge(edge)
+            return index
+        
+        return _LazyIndex(build, properties, kind.ordered, kind.answers_constraints)
+
+
+# Decoded entities an SQLiteStorage keeps in memory; the least recently used go first
+SQLITE_CACHE_SIZE = 100000
+# Buffered writes that trigger a flush
+SQLITE_BATCH_SIZE = 10000
+# Rows fetched per query while scanning a table
+SQLITE_SCAN_CHUNK = 1000
+
+
+def _sql_name(name: str) -> str:
+    """A graph or index name made safe to use as an SQL identifier"""
+    return re.sub(r"\W", "_", name)
+
+
+def _sql_expression(path: str) -> Optional[str]:
+    """Column expression for an index property such as 'node.properties.location'"""
+    _, _, key = path.partition(".")
+    if key in ("type", "id"):
+        return key
+    if key in ("source.id", "target.id"):
+        return key.split(".")[0]
+    if key.startswith("properties.") and key.count(".") == 1:
+        name = key.split(".", 1)[1].replace('"', '""')
+        return f"json_extract(properties, '$.\"{name}\"')"
+    return None
+
+
+class SQLiteTable(MutableMapping):
+    """
+    Node or edge map stored in one SQLite table.
+    
+    Point reads go through an LRU cache of decoded entities, writes are
+    buffered and flushed in batches, and scans page through the table by
+    rowid so they stay in insertion order without loading it whole.
+    """
+    
+    def __init__(self, storage: 'SQLiteStorage', table: str, kind: str, count: int = None):
+        self.storage = storage
+        self.table = table
+        self.kind = kind
+        self.cache: 'OrderedDict[str, Union[Node, Edge]]' = OrderedDict()
+        # id -> entity to write, or None to delete, in commit order
+        self.pending: Dict[str, Optional[Union[Node, Edge]]] = {}
+        # Reads go through the storage's connection until the table is frozen (see SQLiteStorage.fork)
+        self.connection = storage.connection
+        # Node table a frozen edge table resolves endpoints in; None for the storage's current one
+        self.endpoints: Optional['SQLiteTable'] = None
+        if count is None:
+            with storage._lock:
+                count = storage.connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        self._count = count
+    
+    def _remember(self, entity: Union[Node, Edge]) -> None:
+        self.cache[entity.id] = entity
+        self.cache.move_to_end(entity.id)
+        if len(self.cache) > self.storage.cache_size:
+            self.cache.popitem(last=False)
+    
+    def _load(self, key: str) -> Optional[Union[Node, Edge]]:
+        if key in self.pending:
+            return self.pending[key]
+        entity = self.cache.get(key)
+        if entity is not None:
+            self.cache.move_to_end(key)
+            return entity
+        row = self.connection.execute(
+            f"SELECT {self.storage.columns(self.kind)} FROM {self.table} WHERE id = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        entity = self.storage.decode(self.kind, row, self.endpoints)
+        self._remember(entity)
+        return entity
+    
+    def __getitem__(self, key: str) -> Union[Node, Edge]:
+        with self.storage._lock:
+            entity = self._load(key)
+        if entity is None:
+            raise KeyError(key)
+        return entity
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        with self.storage._lock:
+            entity = self._load(key)
+        return default if entity is None else entity
+    
+    def __contains__(self, key: object) -> bool:
+        return self.get(key) is not None
+    
+    def __setitem__(self, key: str, entity: Union[Node, Edge]) -> None:
+        with self.storage._lock:
+            if self._load(key) is None:
+                self._count += 1
+            self.pending[key] = entity
+            self._remember(entity)
+            if len(self.pending) >= self.storage.batch_size:
+                self.storage.flush()
+    
+    def __delitem__(self, key: str) -> None:
+        with self.storage._lock:
+            if self._load(key) is None:
+                raise KeyError(key)
+            self._count -= 1
+            self.pending[key] = None
+            self.cache.pop(key, None)
+            if len(self.pending) >= self.storage.batch_size:
+                self.storage.flush()
+    
+    def __len__(self) -> int:
+        return self._count
+    
+    def _scan(self, columns: str, decode: Callable[[Tuple], Any]):
+        """The whole table, decoded a chunk per query"""
+        after = 0
+        while True:
+            with self.storage._lock:
+                self._flush()
+                rows = self.connection.execute(
+                    f"SELECT rowid, {columns} FROM {self.table} WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (after, SQLITE_SCAN_CHUNK)).fetchall()
+                chunk = [decode(row[1:]) for row in rows]
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield from chunk
+    
+    def _decode(self, row: Tuple) -> Union[Node, Edge]:
+        # Not added to the cache, so a scan does not evict the hot entities
+        cached = self.cache.get(row[0])
+        return cached if cached is not None else self.storage.decode(self.kind, row, self.endpoints)
+    
+    def __iter__(self):
+        return self._scan("id", lambda row: row[0])
+    
+    def values(self):
+        return self._scan(self.storage.columns(self.kind), self._decode)
+    
+    def items(self):
+        for entity in self.values():
+            yield entity.id, entity
+    
+    def rows(self, where: str, parameters: Tuple = (), order: str = "rowid") -> List[Union[Node, Edge]]:
+        """Entities matching an SQL condition, decoded through the cache"""
+        with self.storage._lock:
+            self._flush()
+            rows = self.connection.execute(
+                f"SELECT {self.storage.columns(self.kind)} FROM {self.table} WHERE {where} ORDER BY {order}",
+                parameters).fetchall()
+            return [self._decode(row) for row in rows]
+    
+    def _flush(self) -> None:
+        """Write buffered changes before a query, unless frozen: those read a fixed state"""
+        if self.connection is self.storage.connection:
+            self.storage.flush()
+
+
+class SQLiteIndex:
+    """A graph index pushed down into SQLite: expression indexes maintained by the engine"""
+    
+    answers_constraints = True
+    
+    def __init__(self, storage: 'SQLiteStorage', name: str, index_type: str, properties: List[str]):
+        self.storage = storage
+        self.name = name
+        self.index_type = index_type
+        self.properties = properties
+        self.kind = "node" if properties[0].startswith("node.") else "edge"
+        self.expressions = []
+        for prop in properties:
+            expression = _sql_expression(prop)
+            if expression is None or not prop.startswith(self.kind + "."):
+                raise ValueError(f"SQLite storage cannot index {prop}")
+            self.expressions.append(expression)
+        self.ordered = index_type == "btree" and len(self.expressions) == 1
+    
+    # Maintained by SQLite as rows are written
+    def add_node(self, node: Node) -> None:
+        pass
+    
+    def remove_node(self, node: Node) -> None:
+        pass
+    
+    def update_node(self, previous: Node, node: Node) -> None:
+        pass
+    
+    def add_edge(self, edge: Edge) -> None:
+        pass
+    
+    def remove_edge(self, edge: Edge) -> None:
+        pass
+    
+    def update_edge(self, previous: Edge, edge: Edge) -> None:
+        pass
+    
+    def apply(self, changes: List[Tuple[str, Union[Node, Edge], Optional[Union[Node, Edge]]]]) -> None:
+        pass
+    
+    def _match(self, operator: str) -> str:
+        return " OR ".join(f"{expression} {operator} ?" for expression in self.expressions)
+    
+    def lookup(self, value: Any, entity: str = "node") -> List[Union[Node, Edge]]:
+        """Entities filed under one key"""
+        if entity != self.kind:
+            return []
+        return self.storage.table(entity).rows(self._match("IS"), (value,) * len(self.expressions))
+    
+    def bucket_size(self, value: Any, entity: str = "node") -> int:
+        """Number of entities filed under one key"""
+        if entity != self.kind:
+            return 0
+        table = self.storage.table(entity)
+        with self.storage._lock:
+            self.storage.flush()
+            return self.storage.connection.execute(
+                f"SELECT COUNT(*) FROM {table.table} WHERE {self._match('IS')}",
+                (value,) * len(self.expressions)).fetchone()[0]
+    
+    def range(self, low: Any = None, high: Any = None, entity: str = "node") -> List[Union[Node, Edge]]:
+        """Entities whose key lies in [low, high]; None leaves a side open"""
+        if entity != self.kind:
+            return []
+        if not self.ordered:
+            raise ValueError(f"Index {self.name} does not support ranges")
+        expression = self.expressions[0]
+        conditions = [f"{expression} IS NOT NULL"]
+        parameters = []
+        if low is not None:
+            conditions.append(f"{expression} >= ?")
+            parameters.append(low)
+        if high is not None:
+            conditions.append(f"{expression} <= ?")
+            parameters.append(high)
+        return self.storage.table(entity).rows(" AND ".join(conditions), tuple(parameters),
+                                               order=f"{expression}, rowid")
+    
+    def range_nodes(self, low: Any, high: Any) -> List[Node]:
+        """Nodes whose key lies in [low, high]"""
+        return self.range(low, high, "node")
+    
+    def _aggregate(self, entity: str, select: str, group: bool = False) -> List[Tuple]:
+        if entity != self.kind or len(self.expressions) != 1:
+            raise ValueError(f"Index {self.name} cannot aggregate {entity}s")
+        expression = self.expressions[0]
+        table = self.storage.table(entity)
+        with self.storage._lock:
+            self.storage.flush()
+            return self.storage.connection.execute(
+                f"SELECT {select.format(key=expression)} FROM {table.table} WHERE {expression} IS NOT NULL"
+                + (f" GROUP BY {expression}" if group else "")).fetchall()
+    
+    def counts(self, entity: str = "node") -> Dict[Any, int]:
+        """Number of entities under every key, counted by SQLite"""
+        return dict(self._aggregate(entity, "{key}, COUNT(*)", group=True))
+    
+    def bounds(self, entity: str = "node") -> Tuple[Any, Any]:
+        """Lowest and highest key, computed by SQLite"""
+        return self._aggregate(entity, "MIN({key}), MAX({key})")[0]
+    
+    def entries(self) -> int:
+        """Number of (key, entity) entries held"""
+        table = self.storage.table(self.kind)
+        with self.storage._lock:
+            self.storage.flush()
+            return sum(
+                self.storage.connection.execute(
+                    f"SELECT COUNT(*) FROM {table.table} WHERE {expression} IS NOT NULL").fetchone()[0]
+                for expression in self.expressions
+            )
+
+
+class SQLiteStorage(StorageEngine):
+    """
+    Embedded on-disk engine: one SQLite table each for nodes and edges.
+    
+    Properties are stored as JSON, so they must be JSON-serializable. Edges
+    are indexed by source and target for adjacency, and graph indexes become
+    SQLite expression indexes answered by SQL. A version that readers still
+    hold when a write comes in is frozen on a read transaction of its own
+    (a copy, for an in-memory database), so snapshots, as_of and pinned
+    reads do not see later writes.
+    """
+    
+    def __init__(self, path: str, cache_size: int = SQLITE_CACHE_SIZE, batch_size: int = SQLITE_BATCH_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self.batch_size = max(1, batch_size)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        # Innermost lock: held around connection use and never while calling into the graph
+        self._lock = threading.RLock()
+        self.graph: Optional[Graph] = None
+        self.nodes: Optional[SQLiteTable] = None
+        self.edges: Optional[SQLiteTable] = None
+        self.flushes = 0
+        # (connection, frozen node table) of a fork whose edges are still to come
+        self._frozen: Optional[Tuple[sqlite3.Connection, Optional[SQLiteTable]]] = None
+    
+    def attach(self, graph: Graph) -> Tuple[SQLiteTable, SQLiteTable]:
+        if self.graph is not None:
+            raise ValueError("An SQLiteStorage serves one graph")
+        self.graph = graph
+        prefix = _sql_name(graph.name)
+        with self._lock, self.connection:
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {prefix}_nodes "
+                f"(id TEXT PRIMARY KEY, type TEXT, properties TEXT)")
+            self.connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {prefix}_edges "
+                f"(id TEXT PRIMARY KEY, type TEXT, properties TEXT, source TEXT, source_type TEXT, "
+                f"target TEXT, target_type TEXT)")
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_edges_source ON {prefix}_edges(source)")
+            self.connection.execute(f"CREATE INDEX IF NOT EXISTS {prefix}_edges_target ON {prefix}_edges(target)")
+        self.nodes = SQLiteTable(self, f"{prefix}_nodes", "node")
+        self.edges = SQLiteTable(self, f"{prefix}_edges", "edge")
+        return self.nodes, self.edges
+    
+    def fork(self, entities: SQLiteTable) -> SQLiteTable:
+        """Freeze the table readers hold at the rows it has now; the writer gets a fresh one"""
+        with self._lock:
+            if entities.kind == "node" or self._frozen is None:
+                # A version forks its nodes, then its edges: both freeze on one connection
+                self.flush()
+                self._frozen = (self._snapshot_connection(), None)
+            connection, nodes = self._frozen
+            fresh = SQLiteTable(self, entities.table, entities.kind, len(entities))
+            # Cached entities are the same on both sides; the writer's side reads more
+            fresh.cache, entities.cache = entities.cache, OrderedDict()
+            entities.connection = connection
+            if entities.kind == "node":
+                self.nodes = fresh
+                self._frozen = (connection, entities)
+            else:
+                entities.endpoints = nodes
+                self.edges = fresh
+                self._frozen = None
+            return fresh
+    
+    def _snapshot_connection(self) -> sqlite3.Connection:
+        """A connection that keeps reading the database as it is now"""
+        if self.path in ("", ":memory:"):
+            connection = sqlite3.connect(":memory:", check_same_thread=False)
+            self.connection.backup(connection)
+            return connection
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        # In WAL mode a read transaction sees the database as of its first read
+        connection.execute("BEGIN")
+        connection.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        return connection
+    
+    def table(self, kind: str) -> SQLiteTable:
+        return self.nodes if kind == "node" else self.edges
+    
+    @staticmethod
+    def columns(kind: str) -> str:
+        if kind == "node":
+            return "id, type, properties"
+        return "id, type, properties, source, source_type, target, target_type"
+    
+    def _encode_properties(self, entity: Union[Node, Edge]) -> str:
+        try:
+            return json.dumps(entity.properties)
+        except TypeError as error:
+            raise ValueError(f"Properties of {entity.id} cannot be stored: {error}") from error
+    
+    def decode(self, kind: str, row: Tuple, endpoints: SQLiteTable = None) -> Union[Node, Edge]:
+        """Entity for a row read with columns(kind), its endpoints looked up in `endpoints` or the nodes"""
+        if kind == "node":
+            return Node(row[0], row[1], json.loads(row[2]), self.graph)
+        nodes = endpoints if endpoints is not None else self.nodes
+        source = nodes._load(row[3]) or Node(row[3], row[4])
+        target = nodes._load(row[5]) or Node(row[5], row[6])
+        return Edge(row[0], source, target, row[1], json.loads(row[2]), self.graph)
+    
+    def flush(self) -> None:
+        """Write the buffered changes of both tables in one transaction"""
+        with self._lock:
+            if not self.nodes or not (self.nodes.pending or self.edges.pending):
+                return
+            node_writes, self.nodes.pending = self.nodes.pending, {}
+            edge_writes, self.edges.pending = self.edges.pending, {}
+            with self.connection:
+                self._write(self.nodes.table, node_writes, lambda node: (
+                    node.id, node.type, self._encode_properties(node)))
+                self._write(self.edges.table, edge_writes, lambda edge: (
+                    edge.id, edge.type, self._encode_properties(edge),
+                    edge.source.id, edge.source.type, edge.target.id, edge.target.type))
+            self.flushes += 1
+    
+    def _write(self, table: str, writes: Dict[str, Any], encode: Callable[[Any], Tuple]) -> None:
+        deleted = [(key,) for key, entity in writes.items() if entity is None]
+        rows = [encode(entity) for entity in writes.values() if entity is not None]
+        if deleted:
+            self.connection.executemany(f"DELETE FROM {table} WHERE id = ?", deleted)
+        if rows:
+            columns = [column.strip() for column in self.columns("node" if table == self.nodes.table else "edge").split(",")]
+            updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+            # An upsert keeps the rowid, so a replaced entity keeps its scan position
+            self.connection.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}", rows)
+    
+    def edges_for_node(self, node_id: str, direction: str = "both") -> List[Edge]:
+        if direction == "outgoing":
+            return self.edges.rows("source = ?", (node_id,))
+        if direction == "incoming":
+            return self.edges.rows("target = ?", (node_id,))
+        return self.edges.rows("source = ? OR target = ?", (node_id, node_id))
+    
+    def create_index(self, name: str, index_type: str, properties: List[str]) -> Optional[SQLiteIndex]:
+        if index_type == "adjacency":
+            # Traversals need per-hop lookups without a query each; kept in memory over the rows
+            return None
+        if index_type not in ("hash", "btree"):
+            raise ValueError(f"Unknown index type: {index_type}")
+        index = SQLiteIndex(self, name, index_type, properties)
+        table = self.table(index.kind).table
+        with self._lock, self.connection:
+            for position, expression in enumerate(index.expressions):
+                self.connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{_sql_name(name)}_{position} ON {table}({expression})")
+        return index
+    
+    def drop_index(self, name: str) -> None:
+        with self._lock, self.connection:
+            for table in (self.nodes.table, self.edges.table):
+                prefix = f"{table}_{_sql_name(name)}_"
+                for (index_name,) in self.connection.execute(
+                        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?", (table,)).fetchall():
+                    if index_name.startswith(prefix):
+                        self.connection.execute(f"DROP INDEX {index_name}")
+    
+    def close(self) -> None:
+        with self._lock:
+            self.flush()
+            self.connection.close()
+
+
+# =============================================================================
+# 16. AGGREGATION
+# =============================================================================
+
+AGGREGATE_PATTERN = re.compile(
+    r"(COUNT|MIN|MAX|AVG|SUM)(?:\s*\(\s*(\w+)\s*\))?\s+(?:OF\s+)?(INSTANCES|RELATIONS)"
+    r"(?:\s+OF\s+(?:CONCEPT|TYPE)\s+(\w+))?"
+    r"(?:\s+IN\s+CONTEXT\s+(\w+))?"
+    r"(?:\s+GROUP\s+BY\s+(.+?))?\s*$",
+    re.IGNORECASE
+)
+GROUP_PATTERN = re.compile(
+    r"(?:(CONCEPT)|(?:(TEMPORAL|SPATIAL|PERSPECTIVE)\s+)?(CONTEXT)|PROPERTY\s+(\w+)(?:\s+PER\s+([0-9.]+))?)$",
+    re.IGNORECASE
+)
+
+
+def parse_aggregate_query(query_string: str) -> Optional[Dict]:
+    """
+    Parse an aggregate query, e.g.
+        
+        COUNT INSTANCES OF CONCEPT Author IN CONTEXT europe GROUP BY TEMPORAL CONTEXT
+        AVG(birthYear) OF INSTANCES GROUP BY CONCEPT, PROPERTY location
+        COUNT RELATIONS OF TYPE wrote GROUP BY PROPERTY year PER 10
+    """
+    match = AGGREGATE_PATTERN.match(query_string.strip())
+    if not match:
+        return None
+    function, prop, target, subject_id, context_id, group_clause = match.groups()
+    function = function.lower()
+    if (function == "count") != (prop is None):
+        # COUNT takes no property; the other aggregates need one
+        return None
+    group_by = []
+    for item in (group_clause.split(",") if group_clause else []):
+        group = GROUP_PATTERN.match(item.strip())
+        if not group:
+            return None
+        concept, context_kind, context, group_prop, width = group.groups()
+        if concept:
+            group_by.append({"kind": "concept", "name": "concept"})
+        elif context:
+            context_type = f"{context_kind.capitalize()}Context" if context_kind else None
+            group_by.append({"kind": "context", "name": "context", "contextType": context_type})
+        else:
+            group_by.append({"kind": "property", "name": group_prop, "property": group_prop,
+                             "width": float(width) if width else None})
+    return {
+        "type": "aggregate",
+        "function": function,
+        "property": prop,
+        "target": target.lower(),
+        "subjectId": subject_id,
+        "contextId": context_id,
+        "groupBy": group_by
+    }
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _bucket(value: Any, width: Optional[float]) -> Any:
+    """Lower bound of the width-sized bucket a numeric value falls in"""
+    if width is None or not _is_number(value):
+        return value
+    lower = math.floor(value / width) * width
+    return int(lower) if float(lower).is_integer() else lower
+
+
+def _group_order(key: Tuple) -> Tuple:
+    """Sort key for group tuples: numbers by value, then everything else by text, None last"""
+    return tuple((value is None, not _is_number(value), value if _is_number(value) else str(value)) for value in key)
+
+
+class _Accumulator:
+    """Running COUNT / MIN / MAX / SUM of one group"""
+    
+    __slots__ = ("count", "total", "minimum", "maximum")
+    
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+    
+    def add(self, value: Any) -> None:
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+    
+    def result(self, function: str) -> Any:
+        if function == "count":
+            return self.count
+        if not self.count:
+            return None
+        if function == "avg":
+            return self.total / self.count
+        return {"min": self.minimum, "max": self.maximum, "sum": self.total}[function]
+
+
+class QueryAggregator:
+    """
+    Answers aggregate queries without building result lists.
+    
+    Without a context filter, counts come straight from index bucket sizes,
+    MIN/MAX from the ends of a B-tree index and numeric aggregates from the
+    compiled graph's columns, when those exist. Everything else scans the
+    candidates once with the same relevance rules as FIND queries.
+    """
+    
+    def __init__(self, tkg: TrinitarianKnowledgeGraph, lookups: 'QueryLookups' = None):
+        self.tkg = tkg
+        self.lookups = lookups or QueryLookups(tkg)
+    
+    @staticmethod
+    def _subject_key(parsed: Dict) -> str:
+        return "properties.relationTypeId" if parsed["target"] == "relations" else "properties.conceptId"
+    
+    def _group_key(self, parsed: Dict, group: Dict) -> str:
+        if group["kind"] == "concept":
+            return self._subject_key(parsed)
+        return f"properties.{group['property']}"
+    
+    def strategy(self, parsed: Dict, context: Optional[Node]) -> str:
+        """How the query will be answered: an index, the columns, or a scan"""
+        if context is not None:
+            return "scan"
+        graph = self.tkg.instance_graph
+        entity = "edge" if parsed["target"] == "relations" else "node"
+        function = parsed["function"]
+        groups = parsed["groupBy"]
+        subject_id = parsed["subjectId"]
+        if function == "count" and not groups:
+            if subject_id is None or graph.index_for(self._subject_key(parsed), entity):
+                return "index count"
+        if function == "count" and len(groups) == 1 and groups[0]["kind"] != "context" and subject_id is None:
+            name = graph.index_for(self._group_key(parsed, groups[0]), entity)
+            if name and len(graph.indexes[name].properties) == 1:
+                return "index counts"
+        if function in ("min", "max") and not groups and subject_id is None:
+            if graph.index_for(f"properties.{parsed['property']}", entity, ordered=True):
+                return "index bounds"
+        if function != "count" and not groups and entity == "node" and np is not None and graph._compiled is not None \
+                and graph._thread_version() is None:
+            # The compiled columns follow the latest version, not a transaction's or a snapshot's
+            return "columnar"
+        return "scan"
+    
+    def run(self, parsed: Dict, context: Optional[Node] = None) -> Dict[str, Any]:
+        """Evaluate a parsed aggregate query; `context` filters by relevance"""
+        tkg = self.tkg
+        relations = parsed["target"] == "relations"
+        subject_id = parsed["subjectId"]
+        if subject_id is not None:
+            label = "Relation type" if relations else "Concept"
+            if not self.lookups.concept(subject_id):
+                return {"status": "error", "message": f"{label} {subject_id} not found", "results": []}
+            if context and not self.lookups.applicable(subject_id, context.id):
+                return {
+                    "status": "inapplicable",
+                    "message": f"{label} {subject_id} is not applicable in context {context.id}",
+                    "results": []
+                }
+        
+        strategy = self.strategy(parsed, context)
+        values = self._from_index(strategy, parsed)
+        if values is None:
+            strategy = "scan"
+            values = self._scan(parsed, context)
+        
+        names = [group["name"] for group in parsed["groupBy"]]
+        rows = [
+            {"group": dict(zip(names, key)), "value": value}
+            for key, value in sorted(values.items(), key=lambda item: _group_order(item[0]))
+        ]
+        result = {
+            "status": "success",
+            "function": parsed["function"],
+            "property": parsed["property"],
+            "context": context,
+            "strategy": strategy,
+            "results": rows,
+            "count": len(rows)
+        }
+        if not names:
+            result["value"] = values.get((), 0 if parsed["function"] == "count" else None)
+        return result
+    
+    def _from_index(self, strategy: str, parsed: Dict) -> Optional[Dict[Tuple, Any]]:
+        """Group values without touching entities; None when the strategy does not apply after all"""
+        graph = self.tkg.instance_graph
+        entity = "edge" if parsed["target"] == "relations" else "node"
+        # Index reads come back None once the indexes have moved past the pinned version; that query scans it
+        if strategy == "index count":
+            with graph._read() as version:
+                if parsed["subjectId"] is None:
+                    return {(): len(version.nodes if entity == "node" else version.edges)}
+                name = graph.index_for(self._subject_key(parsed), entity)
+                count = graph._index_read(version, lambda: graph.index_bucket_size(name, parsed["subjectId"], entity))
+            return {(): count} if count is not None else None
+        if strategy == "index counts":
+            group = parsed["groupBy"][0]
+            with graph._read() as version:
+                name = graph.index_for(self._group_key(parsed, group), entity)
+                counts = graph._index_read(version, lambda: graph.indexes[name].counts(entity))
+                total = len(version.nodes if entity == "node" else version.edges)
+            if counts is None:
+                return None
+            values: Dict[Tuple, int] = defaultdict(int)
+            for key, count in counts.items():
+                values[(_bucket(key, group.get("width")),)] += count
+            # Entities without the property are not filed; report them as one group
+            missing = total - sum(counts.values())
+            if missing > 0:
+                values[(None,)] += missing
+            return dict(values)
+        if strategy == "index bounds":
+            with graph._read() as version:
+                name = graph.index_for(f"properties.{parsed['property']}", entity, ordered=True)
+                bounds = graph._index_read(version, lambda: graph.indexes[name].bounds(entity))
+            if bounds is None:
+                return None
+            low, high = bounds
+            bound = low if parsed["function"] == "min" else high
+            if bound is not None and not _is_number(bound):
+                return None
+            return {(): bound} if bound is not None else {}
+        if strategy == "columnar":
+            compiled = graph._compiled
+            column = compiled.column(parsed["property"])
+            if column.dtype == object:
+                return None
+            with compiled._lock:
+                mask = compiled.node_alive[:len(column)].copy()
+            if parsed["subjectId"] is not None:
+                mask &= compiled.column("conceptId") == parsed["subjectId"]
+            selected = column[mask]
+            selected = selected[~np.isnan(selected)]
+            if not len(selected):
+                return {}
+            function = parsed["function"]
+            value = {"min": selected.min, "max": selected.max, "sum": selected.sum, "avg": selected.mean}[function]()
+            return {(): float(value)}
+        return None
+    
+    def _candidates(self, parsed: Dict, context: Optional[Node]) -> List[Union[Node, Edge]]:
+        """Instances or relations in scope, filtered by relevance as FIND queries are"""
+        graph = self.tkg.instance_graph
+        relevant = self.lookups.relevant
+        subject_id = parsed["subjectId"]
+        if parsed["target"] == "relations":
+            if subject_id is not None:
+                candidates = self.lookups.relations(subject_id)
+            else:
+                with graph._read() as version:
+                    candidates = list(version.edges.values())
+            if context:
+                candidates = [
+                    relation for relation in candidates
+                    if relevant(relation.source.id, context.id) and relevant(relation.target.id, context.id)
+                ]
+            return candidates
+        if subject_id is not None:
+            candidates = self.lookups.instances(subject_id)
+        else:
+            with graph._read() as version:
+                candidates = list(version.nodes.values())
+        if context:
+            # Instances the context's partitions place inside it need no relevance check
+            inside = self.lookups.scoped_instances(subject_id, context.id)
+            inside_ids = {instance.id for instance in inside} if inside else ()
+            candidates = [instance for instance in candidates
+                          if instance.id in inside_ids or relevant(instance.id, context.id)]
+        return candidates
+    
+    def _scan(self, parsed: Dict, context: Optional[Node]) -> Dict[Tuple, Any]:
+        tkg = self.tkg
+        function = parsed["function"]
+        prop = parsed["property"]
+        relations = parsed["target"] == "relations"
+        subject_prop = "relationTypeId" if relations else "conceptId"
+        
+        contexts_by_type: Dict[Optional[str], List[Node]] = {}
+        for group in parsed["groupBy"]:
+            if group["kind"] == "context":
+                with tkg.context_graph._read() as version:
+                    contexts_by_type[group["contextType"]] = [
+                        node for node in version.nodes.values()
+                        if group["contextType"] is None or node.type == group["contextType"]
+                    ]
+        # Each (instance, context) pair is checked once, however many groups need it
+        lookups = self.lookups if isinstance(self.lookups, SharedQueryLookups) else SharedQueryLookups(tkg)
+        is_relevant = lookups.relevant
+        
+        def keys_of(entity: Union[Node, Edge], group: Dict) -> List[Any]:
+            if group["kind"] == "concept":
+                return [entity.properties.get(subject_prop)]
+            if group["kind"] == "property":
+                return [_bucket(entity.properties.get(group["property"]), group["width"])]
+            # Every context the entity is relevant in; a relation needs both ends relevant
+            ends = [entity.source.id, entity.target.id] if relations else [entity.id]
+            return [
+                context_node.id for context_node in contexts_by_type[group["contextType"]]
+                if all(is_relevant(end, context_node.id) for end in ends)
+            ]
+        
+        accumulators: Dict[Tuple, _Accumulator] = {}
+        for entity in self._candidates(parsed, context):
+            if function == "count":
+                value = 0
+            else:
+                value = entity.properties.get(prop)
+                if not _is_number(value):
+                    continue
+            combinations = [()]
+            for group in parsed["groupBy"]:
+                combinations = [key + (group_key,) for key in combinations for group_key in keys_of(entity, group)]
+            for key in combinations:
+                accumulator = accumulators.get(key)
+                if accumulator is None:
+                    accumulator = accumulators[key] = _Accumulator()
+                accumulator.add(value)
+        return {key: accumulator.result(function) for key, accumulator in accumulators.items()}
+
+
+# =============================================================================
+# 17. BATCH QUERIES
+# =============================================================================
+
+class QueryLookups:
+    """The fetches and checks a query makes, answered directly"""
+    
+    def __init__(self, tkg: TrinitarianKnowledgeGraph):
+        self.tkg = tkg
+    
+    def parse(self, query_string: str) -> Optional[Dict]:
+        return self.tkg.parse_query(query_string)
+    
+    def context(self, context_id: str) -> Optional[Node]:
+        return self.tkg.context_graph.get_node(context_id)
+    
+    def concept(self, concept_id: str) -> Optional[Node]:
+        return self.tkg.ontological_graph.get_node(concept_id)
+    
+    def applicable(self, concept_id: str, context_id: str) -> bool:
+        return self.tkg.is_concept_applicable_in_context(concept_id, context_id)
+    
+    def instances(self, concept_id: str) -> List[Node]:
+        return self.tkg.instance_graph.get_entities_of_concept(concept_id)
+    
+    def scoped_instances(self, concept_id: str, context_id: str) -> Optional[List[Node]]:
+        return self.tkg.scoped_instances(self.context(context_id), concept_id, bounded=True)
+    
+    def relations(self, relation_type_id: str) -> List[Edge]:
+        return self.tkg.instance_graph.get_relations_of_type(relation_type_id)
+    
+    def relevant(self, instance_id: str, context_id: str) -> bool:
+        return self.tkg.is_instance_relevant_in_context(instance_id, context_id)
+
+
+class SharedQueryLookups(QueryLookups):
+    """
+    Lookups memoized across the queries of a batch.
+    
+    Parses, concept fetches, applicability and relevance checks are each
+    computed once per distinct argument, and relevance checks also share
+    context compatibility and exemplar neighbourhoods between pairs.
+    """
+    
+    def __init__(self, tkg: TrinitarianKnowledgeGraph):
+        super().__init__(tkg)
+        self.memo: Dict[Tuple, Any] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def _shared(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        memo = self.memo
+        if key in memo:
+            self.hits += 1
+            return memo[key]
+        self.misses += 1
+        value = memo[key] = compute()
+        return value
+    
+    def parse(self, query_string: str) -> Optional[Dict]:
+        return self._shared(("parse", query_string), lambda: QueryLookups.parse(self, query_string))
+    
+    def context(self, context_id: str) -> Optional[Node]:
+        return self._shared(("context", context_id), lambda: QueryLookups.context(self, context_id))
+    
+    def concept(self, concept_id: str) -> Optional[Node]:
+        return self._shared(("concept", concept_id), lambda: QueryLookups.concept(self, concept_id))
+    
+    def applicable(self, concept_id: str, context_id: str) -> bool:
+        return self._shared(("applicable", concept_id, context_id),
+                            lambda: QueryLookups.applicable(self, concept_id, context_id))
+    
+    def instances(self, concept_id: str) -> List[Node]:
+        return self._shared(("instances", concept_id), lambda: QueryLookups.instances(self, concept_id))
+    
+    def scoped_instances(self, concept_id: str, context_id: str) -> Optional[List[Node]]:
+        return self._shared(("scoped_instances", concept_id, context_id),
+                            lambda: QueryLookups.scoped_instances(self, concept_id, context_id))
+    
+    def relations(self, relation_type_id: str) -> List[Edge]:
+        return self._shared(("relations", relation_type_id),
+                            lambda: QueryLookups.relations(self, relation_type_id))
+    
+    def relevant(self, instance_id: str, context_id: str) -> bool:
+        return self._shared(("relevant", instance_id, context_id),
+                            lambda: self.tkg.is_instance_relevant_in_context(instance_id, context_id, self.memo))
+
+
+# =============================================================================
+# 18. PATTERN QUERIES
+# =============================================================================
+
+PATTERN_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*"|\?\w+|[{}]|>=|>|[^\s{}"]+')
+PATTERN_BLOCKS = {"ONTOLOGICAL": "ontological", "INSTANCE": "instance", "CONTEXT": "context"}
+# WITH ADJUNCTIONS predicates answered by the relevance rules: kind, subject graph
+RELEVANCE_PREDICATES = {
+    "relevant_in": ("relevant", "instance"),
+    "applicable_in": ("applicable", "ontological")
+}
+# Pattern kinds whose object is a node rather than a value
+NODE_OBJECT_KINDS = ("instanceOf", "edge", "relevant", "applicable", "adjunction")
+# Planner guess for the candidates an adjunction maps one node to
+ADJUNCTION_FANOUT = 4
+
+
+def _is_variable(term: Any) -> bool:
+    return isinstance(term, str) and term.startswith("?")
+
+
+def _pattern_term(token: str) -> Tuple[bool, Any]:
+    """(is a literal, value) of one query token; bare words are node ids or names"""
+    if token.startswith('"'):
+        return True, re.sub(r'\\(.)', r'\1', token[1:-1])
+    if token in ("true", "false"):
+        return True, token == "true"
+    for convert in (int, float):
+        try:
+            return True, convert(token)
+        except ValueError:
+            pass
+    return False, token
+
+
+@dataclass
+class TriplePattern:
+    """One `subject predicate object` clause of a pattern query"""
+    graph: Optional[str]  # graph of the subject; None until an adjunction is resolved
+    kind: str  # type, hasProperty, property, instanceOf, edge, relevant, applicable or adjunction
+    subject: str
+    predicate: str
+    object: Any
+    object_graph: Optional[str] = None
+    direction: str = "left"
+    
+    @property
+    def variables(self) -> List[str]:
+        terms = [self.subject, self.object] if self.kind in NODE_OBJECT_KINDS else [self.subject]
+        return list(dict.fromkeys(term for term in terms if _is_variable(term)))
+    
+    def describe(self) -> str:
+        obj = f'"{self.object}"' if self.kind == "property" and isinstance(self.object, str) else self.object
+        predicate = self.predicate if self.direction == "left" else f"{self.predicate}.right"
+        return f"{self.subject} {predicate} {obj}"
+
+
+def _triple_pattern(block: str, subject: str, predicate: str, obj: str) -> Optional[TriplePattern]:
+    """Classify one clause of a block; None when it is malformed"""
+    subject_literal, subject = _pattern_term(subject)
+    object_literal, value = _pattern_term(obj)
+    if subject_literal:
+        return None
+    if block == "adjunctions":
+        if object_literal:
+            return None
+        if predicate in RELEVANCE_PREDICATES:
+            kind, graph = RELEVANCE_PREDICATES[predicate]
+            return TriplePattern(graph, kind, subject, predicate, value, "context")
+        name, _, direction = predicate.partition(".")
+        if direction not in ("", "left", "right"):
+            return None
+        return TriplePattern(None, "adjunction", subject, name, value, direction=direction or "left")
+    if predicate in ("type", "hasProperty"):
+        if _is_variable(value):
+            return None
+        return TriplePattern(block, predicate, subject, predicate, value)
+    if predicate == "instanceOf":
+        if block != "instance" or object_literal:
+            return None
+        return TriplePattern(block, "instanceOf", subject, predicate, value, "ontological")
+    if object_literal:
+        return TriplePattern(block, "property", subject, predicate, value)
+    return TriplePattern(block, "edge", subject, predicate, value, block)
+
+
+def parse_pattern_query(query_string: str) -> Optional[Dict]:
+    """
+    Parse a multi-graph pattern query, e.g.
+        
+        QUERY {
+          ONTOLOGICAL { ?concept type Medicine }
+          INSTANCE { ?medicine instanceOf ?concept
+                     ?medicine hasActiveIngredient "acetaminophen" }
+          CONTEXT { ?ctx type PatientContext
+                    ?ctx hasProperty PregnancyStatus }
+          WITH ADJUNCTIONS { ?medicine relevant_in ?ctx }
+          CONFIDENCE > 0.8
+          LIMIT 10
+        }
+    
+    In a graph block, `type` matches a node type (in the ontology: a concept
+    or any of its subconcepts), `instanceOf` an entity's concept, `hasProperty`
+    the presence of a property, a quoted or numeric object a property value and
+    anything else an edge whose type or relation type is the predicate.
+    WITH ADJUNCTIONS takes `relevant_in`, `applicable_in` or an adjunction name,
+    optionally suffixed with `.left` or `.right`.
+    """
+    tokens = [token for token in PATTERN_TOKEN.findall(query_string) if token != "."]
+    if len(tokens) < 3 or tokens[0].upper() != "QUERY" or tokens[1] != "{" or tokens[-1] != "}":
+        return None
+    patterns = []
+    confidence = None
+    limit = None
+    position = 2
+    end = len(tokens) - 1
+    while position < end:
+        word = tokens[position].upper()
+        if word == "CONFIDENCE" and position + 2 < end:
+            operator = tokens[position + 1]
+            is_literal, threshold = _pattern_term(tokens[position + 2])
+            if operator not in (">", ">=") or not is_literal or not _is_number(threshold):
+                return None
+            confidence = (operator, float(threshold))
+            position += 3
+            continue
+        if word == "LIMIT" and position + 1 < end and tokens[position + 1].isdigit():
+            limit = int(tokens[position + 1])
+            position += 2
+            continue
+        if word == "WITH" and tokens[position + 1:position + 3] == ["ADJUNCTIONS", "{"]:
+            block = "adjunctions"
+            position += 3
+        elif word in PATTERN_BLOCKS and tokens[position + 1:position + 2] == ["{"]:
+            block = PATTERN_BLOCKS[word]
+            position += 2
+        else:
+            return None
+        if "}" not in tokens[position:end]:
+            return None
+        close = tokens.index("}", position)
+        clause = tokens[position:close]
+        if len(clause) % 3 or "{" in clause:
+            return None
+        for start in range(0, len(clause), 3):
+            pattern = _triple_pattern(block, *clause[start:start + 3])
+            if pattern is None:
+                return None
+            patterns.append(pattern)
+        position = close + 1
+    if not patterns:
+        return None
+    return {
+        "type": "pattern",
+        "patterns": patterns,
+        "variables": list(dict.fromkeys(variable for pattern in patterns for variable in pattern.variables)),
+        "confidence": confidence,
+        "limit": limit
+    }
+
+
+@dataclass
+class JoinStep:
+    """Binding of one variable: the patterns producing its candidates and those checked once it is bound"""
+    variable: str
+    graph: str
+    generators: List[TriplePattern]
+    filters: List[TriplePattern]
+    estimated_rows: float
+
+
+class PatternMatcher:
+    """
+    Evaluates pattern queries as a join across the three graphs.
+    
+    Variables are bound one at a time, most selective first. A variable's
+    candidates come from every pattern that can produce them given what is
+    already bound - index lookups for constant patterns, per-predicate hash
+    maps of edges built once per query, adjunction mappings for WITH
+    ADJUNCTIONS - intersected smallest first, so the join is worst-case
+    optimal and no graph is scanned once per partial result.
+    """
+    
+    def __init__(self, tkg: TrinitarianKnowledgeGraph, lookups: Optional[QueryLookups] = None):
+        self.tkg = tkg
+        # A join repeats the same relevance checks across partial rows, so they are always memoized
+        self.lookups = lookups if isinstance(lookups, SharedQueryLookups) else SharedQueryLookups(tkg)
+        self._domains: Dict[Tuple, Dict[str, float]] = {}
+        self._edge_maps: Dict[Tuple[str, str], Tuple[Dict[str, Dict[str, float]], Dict[str, Dict[str, float]]]] = {}
+    
+    def resolve(self, parsed: Dict, context: Optional[Node] = None) -> Tuple[List[TriplePattern], Dict[str, str]]:
+        """Patterns with adjunction graphs filled in, and the graph of each variable"""
+        tkg = self.tkg
+        patterns = []
+        for pattern in parsed["patterns"]:
+            if pattern.kind == "adjunction":
+                adjunction = tkg.adjunctions.get(pattern.predicate)
+                if adjunction is None:
+                    raise ValueError(f"Unknown adjunction: {pattern.predicate}")
+                ends = [tkg.graph_name(adjunction.source_graph), tkg.graph_name(adjunction.target_graph)]
+                if pattern.direction == "right":
+                    ends.reverse()
+                pattern = replace(pattern, graph=ends[0], object_graph=ends[1])
+            patterns.append(pattern)
+        
+        graphs: Dict[str, str] = {}
+        for pattern in patterns:
+            for term, graph in ((pattern.subject, pattern.graph), (pattern.object, pattern.object_graph)):
+                if graph is None or not _is_variable(term) or term not in pattern.variables:
+                    continue
+                if graphs.setdefault(term, graph) != graph:
+                    raise ValueError(f"Variable {term} is used in both the {graphs[term]} and {graph} graphs")
+        if context is not None:
+            # Like FIND queries, instances must be relevant in the query context
+            patterns.extend(
+                TriplePattern("instance", "relevant", variable, "relevant_in", context.id, "context")
+                for variable, graph in graphs.items() if graph == "instance"
+            )
+        return patterns, graphs
+    
+    # --- candidate generation ---------------------------------------------------
+    
+    @staticmethod
+    def _bound(term: Any, binding: Dict[str, str]) -> Optional[str]:
+        return binding.get(term) if _is_variable(term) else term
+    
+    def _domain(self, pattern: TriplePattern, concept_id: Optional[str] = None) -> Dict[str, float]:
+        """Nodes matching a pattern whose only unknown is its subject, looked up once per query"""
+        key = (pattern.graph, pattern.kind, pattern.predicate, concept_id if pattern.kind == "instanceOf" else pattern.object)
+        domain = self._domains.get(key)
+        if domain is None:
+            domain = self._domains[key] = dict.fromkeys(self._domain_ids(pattern, concept_id), 1.0)
+        return domain
+    
+    def _domain_ids(self, pattern: TriplePattern, concept_id: Optional[str]) -> List[str]:
+        graph = self.tkg.get_graph(pattern.graph)
+        kind = pattern.kind
+        if kind == "instanceOf":
+            return [node.id for node in self.lookups.instances(concept_id)]
+        if kind == "type" and pattern.graph == "ontological":
+            if graph.get_node(pattern.object) is None:
+                return []
+            return [pattern.object] + [node.id for node in graph.get_all_subconcepts(pattern.object)]
+        if kind == "hasProperty":
+            with graph._read() as version:
+                return [node.id for node in version.nodes.values() if pattern.object in node.properties]
+        return [node.id for node in graph.find_nodes(self._constraints(pattern))]
+    
+    @staticmethod
+    def _constraints(pattern: TriplePattern) -> Dict[str, Any]:
+        if pattern.kind == "type":
+            return {"type": pattern.object}
+        if pattern.kind == "instanceOf":
+            return {"properties.conceptId": pattern.object}
+        return {f"properties.{pattern.predicate}": pattern.object}
+    
+    def _all(self, graph_name: str) -> Dict[str, float]:
+        """Every node of a graph, for a variable no pattern can produce"""
+        key = (graph_name, "all")
+        domain = self._domains.get(key)
+        if domain is None:
+            with self.tkg.get_graph(graph_name)._read() as version:
+                domain = self._domains[key] = dict.fromkeys(version.nodes, 1.0)
+        return domain
+    
+    def _edge_map(self, graph_name: str, predicate: str) -> Tuple[Dict[str, Dict[str, float]], Dict[str, Dict[str, float]]]:
+        """Hash tables source -> targets and target -> sources of one predicate's edges"""
+        key = (graph_name, predicate)
+        maps = self._edge_maps.get(key)
+        if maps is None:
+            graph = self.tkg.get_graph(graph_name)
+            forward: Dict[str, Dict[str, float]] = defaultdict(dict)
+            backward: Dict[str, Dict[str, float]] = defaultdict(dict)
+            edges = graph.find_edges({"type": predicate}) + graph.find_edges({"properties.relationTypeId": predicate})
+            for edge in edges:
+                forward[edge.source.id][edge.target.id] = 1.0
+                backward[edge.target.id][edge.source.id] = 1.0
+            maps = self._edge_maps[key] = (dict(forward), dict(backward))
+        return maps
+    
+    def _edge_ends(self, pattern: TriplePattern, side: int) -> Dict[str, float]:
+        """Sources (side 0) or targets (side 1) of a predicate's edges: the keys of its hash table"""
+        key = (pattern.graph, "ends", pattern.predicate, side)
+        domain = self._domains.get(key)
+        if domain is None:
+            domain = self._domains[key] = dict.fromkeys(self._edge_map(pattern.graph, pattern.predicate)[side], 1.0)
+        return domain
+    
+    def _generate(self, pattern: TriplePattern, variable: str, binding: Dict[str, str]) -> Optional[Dict[str, float]]:
+        """Scored candidates a pattern yields for `variable`; None if it cannot given `binding`"""
+        kind = pattern.kind
+        if pattern.subject == pattern.object and kind in NODE_OBJECT_KINDS:
+            return None
+        if variable == pattern.subject:
+            if kind in ("type", "hasProperty", "property"):
+                return self._domain(pattern)
+            obj = self._bound(pattern.object, binding)
+            if kind == "edge":
+                if obj is None:
+                    return self._edge_ends(pattern, 0)
+                return self._edge_map(pattern.graph, pattern.predicate)[1].get(obj, {})
+            if kind == "instanceOf" and obj is not None:
+                return self._domain(pattern, obj)
+            return None
+        subject = self._bound(pattern.subject, binding)
+        if subject is None:
+            return self._edge_ends(pattern, 1) if kind == "edge" else None
+        if kind == "instanceOf":
+            node = self.tkg.instance_graph.get_node(subject)
+            concept_id = node.properties.get("conceptId") if node else None
+            return {concept_id: 1.0} if concept_id is not None else {}
+        if kind == "edge":
+            return self._edge_map(pattern.graph, pattern.predicate)[0].get(subject, {})
+        if kind == "adjunction":
+            adjunction = self.tkg.adjunctions[pattern.predicate]
+            return dict(adjunction.candidates(pattern.direction, [subject])[subject])
+        return None
+    
+    def _check(self, pattern: TriplePattern, binding: Dict[str, str]) -> Optional[float]:
+        """Score of a fully bound pattern, None when it does not hold"""
+        kind = pattern.kind
+        subject = self._bound(pattern.subject, binding)
+        obj = self._bound(pattern.object, binding) if kind in NODE_OBJECT_KINDS else pattern.object
+        if kind == "relevant":
+            return 1.0 if self.lookups.relevant(subject, obj) else None
+        if kind == "applicable":
+            return 1.0 if self.lookups.applicable(subject, obj) else None
+        if kind == "adjunction":
+            adjunction = self.tkg.adjunctions[pattern.predicate]
+            return dict(adjunction.candidates(pattern.direction, [subject])[subject]).get(obj)
+        if kind == "edge":
+            return self._edge_map(pattern.graph, pattern.predicate)[0].get(subject, {}).get(obj)
+        if kind == "type" and pattern.graph == "ontological":
+            return self._domain(pattern).get(subject)
+        node = self.tkg.get_graph(pattern.graph).get_node(subject)
+        if node is None:
+            return None
+        if kind == "type":
+            holds = node.type == obj
+        elif kind == "hasProperty":
+            holds = obj in node.properties
+        elif kind == "instanceOf":
+            holds = node.properties.get("conceptId") == obj
+        else:
+            holds = pattern.predicate in node.properties and node.properties[pattern.predicate] == obj
+        return 1.0 if holds else None
+    
+    # --- planning -----------------------------------------------------------------
+    
+    def _index_estimate(self, graph: Graph, constraints: Dict[str, Any]) -> float:
+        """Rows an equality lookup returns: exact from an index, a guess otherwise"""
+        access = graph.access_path(constraints)
+        if access is not None:
+            return graph.index_bucket_size(access[0], access[2])
+        return len(graph.nodes) * DEFAULT_EQUALITY_SELECTIVITY
+    
+    def _fanout(self, pattern: TriplePattern, variable: str, bound: Set[str]) -> Optional[float]:
+        """Estimated candidates a pattern yields for `variable` per partial row; None if it cannot yield any"""
+        kind = pattern.kind
+        if pattern.subject == pattern.object and kind in NODE_OBJECT_KINDS:
+            return None
+        graph = self.tkg.get_graph(pattern.graph) if pattern.graph else None
+        
+        def known(term: Any) -> bool:
+            return not _is_variable(term) or term in bound
+        
+        if variable == pattern.subject:
+            if kind == "type":
+                if pattern.graph == "ontological":
+                    return len(self._domain(pattern))
+                return self._index_estimate(graph, self._constraints(pattern))
+            if kind == "property":
+                return self._index_estimate(graph, self._constraints(pattern))
+            if kind == "hasProperty":
+                # Answered by one scan of the graph
+                return len(graph.nodes)
+            if kind == "edge":
+                forward, backward = self._edge_map(pattern.graph, pattern.predicate)
+                if not known(pattern.object):
+                    return len(forward)
+                return sum(map(len, backward.values())) / max(1, len(backward))
+            if not known(pattern.object):
+                return None
+            if kind == "instanceOf":
+                if not _is_variable(pattern.object):
+                    return self._index_estimate(graph, self._constraints(pattern))
+                return len(graph.nodes) / max(1, len(self.tkg.ontological_graph.nodes))
+            return None
+        if not known(pattern.subject):
+            return len(self._edge_map(pattern.graph, pattern.predicate)[1]) if kind == "edge" else None
+        if kind == "instanceOf":
+            return 1
+        if kind == "edge":
+            forward = self._edge_map(pattern.graph, pattern.predicate)[0]
+            return sum(map(len, forward.values())) / max(1, len(forward))
+        if kind == "adjunction":
+            return ADJUNCTION_FANOUT
+        return None
+    
+    def plan(self, patterns: List[TriplePattern], graphs: Dict[str, str]) -> List[JoinStep]:
+        """Greedy join order: repeatedly bind the joined variable with the fewest expected candidates"""
+        remaining = list(graphs)
+        bound: Set[str] = set()
+        applied: Set[int] = set()
+        steps = []
+        rows = 1.0
+        while remaining:
+            best = None
+            for variable in remaining:
+                producers = []
+                for position, pattern in enumerate(patterns):
+                    if position in applied or variable not in pattern.variables:
+                        continue
+                    fanout = self._fanout(pattern, variable, bound)
+                    if fanout is not None:
+                        producers.append((fanout, position))
+                if producers:
+                    estimate = min(fanout for fanout, _ in producers)
+                else:
+                    estimate = len(self.tkg.get_graph(graphs[variable]).nodes)
+                # Joined variables before cross products; one nothing produces is scanned, so it goes last
+                connected = any(bound.intersection(pattern.variables) for pattern in patterns if variable in pattern.variables)
+                rank = (not producers, not connected, estimate)
+                if best is None or rank < best[0]:
+                    best = (rank, estimate, variable, [position for _, position in producers])
+            _, estimate, variable, generators = best
+            remaining.remove(variable)
+            bound.add(variable)
+            # A pattern producing its subject from its edge table's keys still joins its object later
+            applied.update(position for position in generators if set(patterns[position].variables) <= bound)
+            filters = [
+                position for position, pattern in enumerate(patterns)
+                if position not in applied and set(pattern.variables) <= bound
+            ]
+            applied.update(filters)
+            rows *= estimate
+            steps.append(JoinStep(
+                variable, graphs[variable],
+                [patterns[position] for position in generators],
+                [patterns[position] for position in filters],
+                rows
+            ))
+        return steps
+    
+    # --- execution ----------------------------------------------------------------
+    
+    def run(self, parsed: Dict, context: Optional[Node] = None) -> Dict[str, Any]:
+        """Evaluate a parsed pattern query; `context` requires instances to be relevant in it"""
+        try:
+            patterns, graphs = self.resolve(parsed, context)
+        except ValueError as error:
+            return {"status": "error", "message": str(error), "results": []}
+        steps = self.plan(patterns, graphs)
+        matches: List[Tuple[Dict[str, str], float]] = []
+        # Clauses without variables hold or fail once for the whole query
+        if all(self._check(pattern, {}) is not None for pattern in patterns if not pattern.variables):
+            self._join(steps, parsed["limit"], matches)
+        
+        threshold = parsed["confidence"]
+        rows = []
+        for binding, confidence in matches:
+            if threshold is not None and not (confidence > threshold[1] if threshold[0] == ">" else confidence >= threshold[1]):
+                continue
+            rows.append({
+                "bindings": {
+                    variable[1:]: self.tkg.get_graph(graphs[variable]).get_node(node_id)
+                    for variable, node_id in binding.items()
+                },
+                "confidence": confidence
+            })
+        return {
+            "status": "success",
+            "variables": [variable[1:] for variable in graphs],
+            "order": [step.variable[1:] for step in steps],
+            "context": context,
+            "results": rows,
+            "count": len(rows)
+        }
+    
+    def _join(self, steps: List[JoinStep], limit: Optional[int], matches: List[Tuple[Dict[str, str], float]]) -> None:
+        binding: Dict[str, str] = {}
+        
+        def extend(depth: int, confidence: float) -> bool:
+            """Bind steps[depth:] under the current binding; True once the limit is reached"""
+            if depth == len(steps):
+                matches.append((dict(binding), confidence))
+                return limit is not None and len(matches) >= limit
+            step = steps[depth]
+            variable = step.variable
+            if step.generators:
+                candidate_sets = sorted(
+                    (self._generate(pattern, variable, binding) for pattern in step.generators), key=len
+                )
+            else:
+                candidate_sets = [self._all(step.graph)]
+            smallest, others = candidate_sets[0], candidate_sets[1:]
+            for candidate, score in smallest.items():
+                for other in others:
+                    other_score = other.get(candidate)
+                    if other_score is None:
+                        break
+                    score *= other_score
+                else:
+                    binding[variable] = candidate
+                    for pattern in step.filters:
+                        check = self._check(pattern, binding)
+                        if check is None:
+                            break
+                        score *= check
+                    else:
+                        if extend(depth + 1, confidence * score):
+                            return True
+            binding.pop(variable, None)
+            return False
+        
+        if limit is None or limit > 0:
+            extend(0, 1.0)
+
+
+# =============================================================================
+# 19. PATH QUERIES
+# =============================================================================
+
+PATH_TOKEN = re.compile(r"\s*(?:([\w:.-]+)|([|/*+?()^]))")
+PATH_OPERATORS = set("|/*+?()^")
+
+
+class PathAutomaton:
+    """
+    Deterministic automaton of a regular path expression over edge labels.
+    
+    `a/b` follows a then b, `a|b` either, `a*`, `a+` and `a?` repeat or make
+    optional, `^a` follows a backwards and parentheses group. Each state
+    lists the (label, direction, next state) moves it can make, so a
+    traversal only ever looks up the labels the expression can use next.
+    """
+    
+    def __init__(self, expression: str):
+        self.expression = expression
+        self._tokens = self._tokenize(expression)
+        self._position = 0
+        # Thompson NFA: epsilon moves and labelled moves per state
+        self._epsilon: List[List[int]] = []
+        self._labelled: List[List[Tuple[str, str, int]]] = []
+        start, accept = self._alternation()
+        if self._position != len(self._tokens):
+            raise ValueError(f"Unexpected {self._tokens[self._position]!r} in path expression {expression!r}")
+        
+        # Subset construction; state 0 is the start
+        initial = self._closure({start})
+        states = {initial: 0}
+        pending = [initial]
+        self.moves: List[List[Tuple[str, str, int]]] = []
+        self.accepting: List[bool] = []
+        while len(self.moves) < len(pending):
+            current = pending[len(self.moves)]
+            grouped: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+            for state in current:
+                for label, direction, target in self._labelled[state]:
+                    grouped[(label, direction)].add(target)
+            moves = []
+            for (label, direction), targets in sorted(grouped.items()):
+                target = self._closure(targets)
+                if target not in states:
+                    states[target] = len(pending)
+                    pending.append(target)
+                moves.append((label, direction, states[target]))
+            self.moves.append(moves)
+            self.accepting.append(accept in current)
+        self.start = 0
+        self.labels = sorted({label for moves in self.moves for label, _, _ in moves})
+        del self._epsilon, self._labelled, self._tokens
+    
+    @staticmethod
+    def _tokenize(expression: str) -> List[str]:
+        tokens = []
+        position = 0
+        expression = expression.rstrip()
+        while position < len(expression):
+            match = PATH_TOKEN.match(expression, position)
+            if not match:
+                raise ValueError(f"Unexpected {expression[position:].strip()[:1]!r} in path expression {expression!r}")
+            tokens.append(match.group(1) or match.group(2))
+            position = match.end()
+        if not tokens:
+            raise ValueError("Empty path expression")
+        return tokens
+    
+    def _state(self) -> int:
+        self._epsilon.append([])
+        self._labelled.append([])
+        return len(self._epsilon) - 1
+    
+    def _closure(self, states: Set[int]) -> frozenset:
+        reached = set(states)
+        stack = list(states)
+        while stack:
+            for target in self._epsilon[stack.pop()]:
+                if target not in reached:
+                    reached.add(target)
+                    stack.append(target)
+        return frozenset(reached)
+    
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._position] if self._position < len(self._tokens) else None
+    
+    def _alternation(self) -> Tuple[int, int]:
+        start, accept = self._sequence()
+        if self._peek() != "|":
+            return start, accept
+        entry, exit_ = self._state(), self._state()
+        branches = [(start, accept)]
+        while self._peek() == "|":
+            self._position += 1
+            branches.append(self._sequence())
+        for branch_start, branch_accept in branches:
+            self._epsilon[entry].append(branch_start)
+            self._epsilon[branch_accept].append(exit_)
+        return entry, exit_
+    
+    def _sequence(self) -> Tuple[int, int]:
+        start, accept = self._repetition()
+        while self._peek() == "/":
+            self._position += 1
+            next_start, next_accept = self._repetition()
+            self._epsilon[accept].append(next_start)
+            accept = next_accept
+        return start, accept
+    
+    def _repetition(self) -> Tuple[int, int]:
+        start, accept = self._atom()
+        while self._peek() in ("*", "+", "?"):
+            operator = self._tokens[self._position]
+            self._position += 1
+            entry, exit_ = self._state(), self._state()
+            self._epsilon[entry].append(start)
+            self._epsilon[accept].append(exit_)
+            if operator in ("*", "+"):
+                self._epsilon[accept].append(start)
+            if operator in ("*", "?"):
+                self._epsilon[entry].append(exit_)
+            start, accept = entry, exit_
+        return start, accept
+    
+    def _atom(self) -> Tuple[int, int]:
+        token = self._peek()
+        if token == "(":
+            self._position += 1
+            fragment = self._alternation()
+            if self._peek() != ")":
+                raise ValueError(f"Unbalanced parentheses in path expression {self.expression!r}")
+            self._position += 1
+            return fragment
+        direction = "out"
+        if token == "^":
+            self._position += 1
+            token = self._peek()
+            direction = "in"
+        if token is None or token in PATH_OPERATORS:
+            raise ValueError(f"Expected a label in path expression {self.expression!r}")
+        self._position += 1
+        start, accept = self._state(), self._state()
+        self._labelled[start].append((token, direction, accept))
+        return start, accept
+
+
+# =============================================================================
+# 20. REACHABILITY
+# =============================================================================
+
+# Edges a reachability index chains through before relabelling from scratch
+REACHABILITY_REBUILD_THRESHOLD = 256
+
+
+class ReachabilityIndex:
+    """
+    Exact "is there a path from a to b" over a graph's edges, optionally
+    only those of some labels (relation types or edge types).
+    
+    Strongly connected components are condensed and the resulting DAG gets
+    a 2-hop labelling (pruned landmark labelling): each component keeps the
+    hub components it reaches and those that reach it, and a reaches b
+    exactly when the two sets meet. Inserted edges go to a delta that
+    queries chain through until `rebuild_threshold` of them pile up;
+    removals invalidate the labels until the next rebuild. Changes arrive
+    through a subscription and are folded in when the index is next read.
+    """
+    
+    def __init__(self, graph: Graph, edge_types: List[str] = None,
+                 rebuild_threshold: int = REACHABILITY_REBUILD_THRESHOLD):
+        if rebuild_threshold < 1:
+            raise ValueError("rebuild_threshold must be at least 1")
+        self.graph = graph
+        self.edge_types = frozenset(edge_types) if edge_types is not None else None
+        self.rebuild_threshold = rebuild_threshold
+        # Guards everything below; writers only ever take _pending_lock
+        self._lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[GraphEvent] = []
+        
+        # Covered edges as adjacency with multiplicities, kept current
+        self.nodes: Set[str] = set()
+        self.successors: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.predecessors: Dict[str, Dict[str, int]] = defaultdict(dict)
+        # Labels as of the last rebuild, by component number
+        self.component: Dict[str, int] = {}
+        self.reaches: List[Set[int]] = []
+        self.reached_by: List[Set[int]] = []
+        # Edges inserted since, and whether a removal made the labels unsafe
+        self.delta: List[Tuple[str, str]] = []
+        self._stale = False
+        self.rebuilds = 0
+        
+        self._subscription = Subscription(self._buffer, batch_size=1)
+        with graph._lock:
+            self._subscription.attach(graph)
+            version = graph._acquire()
+        try:
+            with self._lock:
+                self.nodes.update(version.nodes)
+                for edge in version.edges.values():
+                    if self._covers(edge):
+                        self._link(edge.source.id, edge.target.id)
+                self._rebuild()
+        finally:
+            graph._unpin(version)
+    
+    def _buffer(self, events: List[GraphEvent]) -> None:
+        with self._pending_lock:
+            self._pending.extend(events)
+    
+    def close(self) -> None:
+        """Stop following the graph"""
+        self._subscription.close()
+    
+    def _covers(self, edge: Edge) -> bool:
+        return self.edge_types is None or edge.type in self.edge_types or \
+            edge.properties.get("relationTypeId") in self.edge_types
+    
+    # --- maintenance ----------------------------------------------------------
+    
+    def _link(self, source: str, target: str) -> bool:
+        """Count one more covered edge; True if the pair was not linked before"""
+        count = self.successors[source].get(target, 0)
+        self.successors[source][target] = count + 1
+        self.predecessors[target][source] = count + 1
+        return count == 0
+    
+    def _unlink(self, source: str, target: str) -> None:
+        count = self.successors.get(source, {}).get(target, 0)
+        if count > 1:
+            self.successors[source][target] = count - 1
+            self.predecessors[target][source] = count - 1
+        elif count == 1:
+            del self.successors[source][target]
+            del self.predecessors[target][source]
+            self._stale = True
+    
+    def _apply(self, event: GraphEvent) -> None:
+        operation = event.operation
+        if operation == "node_added":
+            self.nodes.add(event.entity.id)
+        elif operation == "node_removed":
+            # Its edges were removed first, so the labels only lose the node itself
+            self.nodes.discard(event.entity.id)
+        elif operation in ("edge_removed", "edge_updated"):
+            previous = event.previous if operation == "edge_updated" else event.entity
+            if self._covers(previous):
+                self._unlink(previous.source.id, previous.target.id)
+        if operation in ("edge_added", "edge_updated"):
+            edge = event.entity
+            if self._covers(edge) and self._link(edge.source.id, edge.target.id):
+                self.delta.append((edge.source.id, edge.target.id))
+    
+    def _sync(self) -> None:
+        """Fold buffered changes in, relabelling after removals or once the delta is large"""
+        with self._pending_lock:
+            events, self._pending = self._pending, []
+        for event in events:
+            self._apply(event)
+        if self._stale or len(self.delta) >= self.rebuild_threshold:
+            self._rebuild()
+    
+    def rebuild(self) -> None:
+        """Relabel from the current edges now"""
+        with self._lock:
+            self._sync()
+            if self.delta:
+                self._rebuild()
+    
+    def _components(self) -> List[List[str]]:
+        """Strongly connected components (iterative Tarjan), sinks first"""
+        order: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+        on_stack: Set[str] = set()
+        components = []
+        successors = self.successors
+        for root in self.nodes.union(successors, self.predecessors):
+            if root in order:
+                continue
+            order[root] = low[root] = len(order)
+            stack.append(root)
+            on_stack.add(root)
+            work = [(root, iter(successors.get(root, ())))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in order:
+                        order[child] = low[child] = len(order)
+                        stack.append(child)
+                        on_stack.add(child)
+                        work.append((child, iter(successors.get(child, ()))))
+                        break
+                    if child in on_stack and order[child] < low[node]:
+                        low[node] = order[child]
+                else:
+                    work.pop()
+                    if work and low[node] < low[work[-1][0]]:
+                        low[work[-1][0]] = low[node]
+                    if low[node] == order[node]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack.discard(member)
+                            component.append(member)
+                            if member == node:
+                                break
+                        components.append(component)
+        return components
+    
+    def _rebuild(self) -> None:
+        components = self._components()
+        component = {node: number for number, members in enumerate(components) for node in members}
+        count = len(components)
+        forward: List[Set[int]] = [set() for _ in range(count)]
+        backward: List[Set[int]] = [set() for _ in range(count)]
+        for source, targets in self.successors.items():
+            source_component = component[source]
+            for target in targets:
+                target_component = component[target]
+                if source_component != target_component:
+                    forward[source_component].add(target_component)
+                    backward[target_component].add(source_component)
+        
+        # Hubs in order of how many paths they are likely to cover
+        reaches: List[Set[int]] = [set() for _ in range(count)]
+        reached_by: List[Set[int]] = [set() for _ in range(count)]
+        for hub in sorted(range(count), key=lambda c: -(len(forward[c]) + 1) * (len(backward[c]) + 1)):
+            for adjacency, own, other in ((forward, reaches, reached_by), (backward, reached_by, reaches)):
+                # Pruned BFS: stop wherever an earlier hub already answers the pair
+                frontier = [hub]
+                seen = {hub}
+                while frontier:
+                    following = []
+                    for current in frontier:
+                        if current != hub and not own[hub].isdisjoint(other[current]):
+                            continue
+                        other[current].add(hub)
+                        for neighbour in adjacency[current]:
+                            if neighbour not in seen:
+                                seen.add(neighbour)
+                                following.append(neighbour)
+                    frontier = following
+        self.component = component
+        self.reaches = reaches
+        self.reached_by = reached_by
+        self.delta = []
+        self._stale = False
+        self.rebuilds += 1
+    
+    # --- queries --------------------------------------------------------------
+    
+    def _labelled(self, source: str, target: str) -> bool:
+        """Reachability as of the last rebuild"""
+        if source == target:
+            return True
+        source_component = self.component.get(source)
+        target_component = self.component.get(target)
+        if source_component is None or target_component is None:
+            return False
+        return source_component == target_component or \
+            not self.reaches[source_component].isdisjoint(self.reached_by[target_component])
+    
+    def reachable(self, source_id: str, target_id: str) -> bool:
+        """Whether a path of covered edges leads from source to target; a node reaches itself"""
+        with self._lock:
+            self._sync()
+            if source_id not in self.nodes or target_id not in self.nodes:
+                return False
+            if self._labelled(source_id, target_id):
+                return True
+            if not self.delta:
+                return False
+            # Chain labelled segments through edges inserted since the rebuild
+            frontier = [source_id]
+            seen = {source_id}
+            remaining = self.delta
+            while frontier:
+                following = []
+                unused = []
+                for source, target in remaining:
+                    if target in seen:
+                        continue
+                    if any(self._labelled(node, source) for node in frontier):
+                        seen.add(target)
+                        following.append(target)
+                    else:
+                        unused.append((source, target))
+                if any(self._labelled(node, target_id) for node in following):
+                    return True
+                frontier, remaining = following, unused
+            return False
+    
+    def label_entries(self) -> int:
+        """Hub entries held across all components"""
+        with self._lock:
+            return sum(map(len, self.reaches)) + sum(map(len, self.reached_by))
+
+
+# =============================================================================
+# 21. PARTITIONING
+# =============================================================================
+
+class ContextPartitions:
+    """
+    Instances bucketed by the contexts that can scope them.
+    
+    Temporal partitions each cover `granularity` timestamp units; spatial
+    partitions hold one region, a location's region coming from `regions`
+    (the location itself if it has none). Instances without a numeric
+    timestamp or a hashable location go to an unbounded partition of that
+    kind. A temporal or spatial context opens only the partitions it
+    overlaps, plus the unbounded one. The partitions only say which
+    instances a context places inside it; relevance can still admit others
+    through the adjunction fallbacks, so readers check those as before.
+    Maintained by the instance graph alongside its indexes; read under the
+    graph lock.
+    """
+    
+    def __init__(self, granularity: float = 100, regions: Dict[str, str] = None):
+        if not _is_number(granularity) or granularity <= 0:
+            raise ValueError("granularity must be a positive number")
+        self.granularity = granularity
+        self.regions = dict(regions or {})
+        # Partition key -> instances by id; the None key is the unbounded partition
+        self.temporal: Dict[Optional[int], Dict[str, Node]] = defaultdict(dict)
+        self.spatial: Dict[Optional[str], Dict[str, Node]] = defaultdict(dict)
+        # Temporal partition keys in order, for overlap lookups
+        self._periods: List[int] = []
+        # Position of each instance in the graph's scan order, so scans can keep it
+        self._positions: Dict[str, int] = {}
+        self._next_position = 0
+        # Partitions opened by scans so far
+        self.opened = 0
+    
+    def _temporal_key(self, node: Node) -> Optional[int]:
+        timestamp = node.properties.get("timestamp")
+        return math.floor(timestamp / self.granularity) if _is_number(timestamp) else None
+    
+    def _spatial_key(self, node: Node) -> Optional[str]:
+        location = node.properties.get("location")
+        return self.regions.get(location, location) if _is_hashable(location) else None
+    
+    # --- maintenance ----------------------------------------------------------
+    
+    def add_node(self, node: Node) -> None:
+        """File an instance under its temporal and spatial partitions"""
+        if node.id not in self._positions:
+            self._positions[node.id] = self._next_position
+            self._next_position += 1
+        key = self._temporal_key(node)
+        if key is not None and key not in self.temporal:
+            bisect.insort(self._periods, key)
+        self.temporal[key][node.id] = node
+        self.spatial[self._spatial_key(node)][node.id] = node
+    
+    def remove_node(self, node: Node) -> None:
+        """Drop an instance from its partitions"""
+        self._positions.pop(node.id, None)
+        for partitions, key in ((self.temporal, self._temporal_key(node)),
+                                (self.spatial, self._spatial_key(node))):
+            if node.id not in partitions.get(key, ()):
+                # Its properties changed in place since it was filed; look everywhere
+                found = [candidate for candidate, members in partitions.items() if node.id in members]
+                if not found:
+                    continue
+                key = found[0]
+            members = partitions[key]
+            del members[node.id]
+            if not members:
+                del partitions[key]
+                if partitions is self.temporal and key is not None:
+                    del self._periods[bisect.bisect_left(self._periods, key)]
+    
+    def update_node(self, previous: Node, node: Node) -> None:
+        """Refile an instance replaced by an update, keeping its place if its partitions are unchanged"""
+        if (self._temporal_key(previous) == self._temporal_key(node) and
+                self._spatial_key(previous) == self._spatial_key(node) and
+                node.id in self.temporal.get(self._temporal_key(node), ()) and
+                node.id in self.spatial.get(self._spatial_key(node), ())):
+            self.temporal[self._temporal_key(node)][node.id] = node
+            self.spatial[self._spatial_key(node)][node.id] = node
+            return
+        # An update keeps the instance's place in the graph
+        position = self._positions.get(node.id)
+        self.remove_node(previous)
+        if position is not None:
+            self._positions[node.id] = position
+        self.add_node(node)
+    
+    # --- pruning --------------------------------------------------------------
+    
+    @staticmethod
+    def _bounds(context: Node) -> Optional[Tuple[Any, Any]]:
+        if context.type != "TemporalContext":
+            return None
+        start_time = context.properties.get("startTime")
+        end_time = context.properties.get("endTime")
+        if not _is_number(start_time) or not _is_number(end_time):
+            return None
+        return start_time, end_time
+    
+    def partitions_for(self, context: Node) -> Optional[List[Tuple[str, Any]]]:
+        """
+        (kind, key) of every non-empty partition the context opens, or None
+        if the context is neither a bounded temporal nor a located spatial one
+        """
+        bounds = self._bounds(context)
+        if bounds is not None:
+            low = bisect.bisect_left(self._periods, math.floor(bounds[0] / self.granularity))
+            high = bisect.bisect_right(self._periods, math.floor(bounds[1] / self.granularity))
+            opened = [("temporal", key) for key in self._periods[low:high]]
+            if None in self.temporal:
+                opened.append(("temporal", None))
+            return opened
+        location = context.properties.get("location")
+        if context.type == "SpatialContext" and location is not None and _is_hashable(location):
+            region = self.regions.get(location, location)
+            return [("spatial", key) for key in (region, None) if key in self.spatial]
+        return None
+    
+    def scan(self, context: Node, concept_id: str = None, bounded: bool = False) -> Optional[List[Node]]:
+        """
+        Instances in the context's scope in graph order, read from the
+        partitions it opens only; None if partitions cannot scope
+        the context. `concept_id` keeps one concept's instances, and
+        `bounded` leaves out the unbounded partition, so that only
+        instances dated or located inside the context remain.
+        """
+        opened = self.partitions_for(context)
+        if opened is None:
+            return None
+        if bounded:
+            opened = [(kind, key) for kind, key in opened if key is not None]
+        self.opened += len(opened)
+        bounds = self._bounds(context)
+        location = context.properties.get("location")
+        # Only the first and last temporal partitions can reach past the period
+        dated = [key for kind, key in opened if kind == "temporal" and key is not None]
+        boundary = {dated[0], dated[-1]} if dated else set()
+        scoped = []
+        for kind, key in opened:
+            members = (self.temporal if kind == "temporal" else self.spatial)[key].values()
+            if concept_id is not None:
+                members = [node for node in members if node.properties.get("conceptId") == concept_id]
+            if key is None:
+                scoped.extend(members)
+            elif kind == "spatial":
+                # A region may hold other locations
+                scoped.extend(node for node in members if node.properties["location"] == location)
+            elif key not in boundary:
+                scoped.extend(members)
+            else:
+                scoped.extend(node for node in members if bounds[0] <= node.properties["timestamp"] <= bounds[1])
+        # Refiled instances sit at the end of their new partition but keep their graph place
+        positions = self._positions
+        scoped.sort(key=lambda node: positions[node.id])
+        return scoped
+    
+    def sizes(self) -> Dict[str, Dict[Any, int]]:
+        """Instances per partition of each kind"""
+        return {
+            "temporal": {key: len(members) for key, members in self.temporal.items()},
+            "spatial": {key: len(members) for key, members in self.spatial.items()}
+        }
+
+
+# =============================================================================
+# 22. TRANSACTIONS
+# =============================================================================
+
+# Marks an entity a transaction removed
+_REMOVED = object()
+
+
+class TransactionConflict(RuntimeError):
+    """Another writer committed a change to an entity the transaction also changed"""
+
+
+def _same_entity(first: Optional[Union[Node, Edge]], second: Optional[Union[Node, Edge]]) -> bool:
+    """Whether two map values are the same version of an entity (engines may decode copies)"""
+    if first is second:
+        return True
+    return first is not None and second is not None and first == second and \
+        first.properties == second.properties
+
+
+class _StagedMap(MutableMapping):
+    """A node or edge map with a transaction's changes laid over it"""
+    
+    def __init__(self, base: MutableMapping):
+        self.base = base
+        # Id -> entity, or _REMOVED
+        self.changes: Dict[str, Any] = {}
+        # Id -> what the base held when the transaction first changed it
+        self.originals: Dict[str, Optional[Union[Node, Edge]]] = {}
+        self._size = len(base)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.changes.get(key, self)
+        if value is self:
+            return self.base.get(key, default)
+        return default if value is _REMOVED else value
+    
+    def __getitem__(self, key: str) -> Union[Node, Edge]:
+        value = self.get(key, _REMOVED)
+        if value is _REMOVED:
+            raise KeyError(key)
+        return value
+    
+    def __contains__(self, key: object) -> bool:
+        return self.get(key, _REMOVED) is not _REMOVED
+    
+    def __setitem__(self, key: str, entity: Union[Node, Edge]) -> None:
+        changes = self.changes
+        # originals gains a key exactly when changes does
+        value = changes.get(key, self)
+        if value is self:
+            original = self.base.get(key)
+            self.originals[key] = original
+            if original is None:
+                self._size += 1
+        elif value is _REMOVED:
+            self._size += 1
+        changes[key] = entity
+    
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self._size -= 1
+        if key not in self.originals:
+            self.originals[key] = self.base.get(key)
+        self.changes[key] = _REMOVED
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def __iter__(self):
+        changes = self.changes
+        for key in self.base:
+            if changes.get(key) is not _REMOVED:
+                yield key
+        for key, value in changes.items():
+            if value is not _REMOVED and key not in self.base:
+                yield key
+    
+    def values(self):
+        return [self[key] for key in self]
+    
+    def items(self):
+        return [(key, self[key]) for key in self]
+    
+    def net_changes(self) -> List[Tuple[str, Optional[Union[Node, Edge]], Optional[Union[Node, Edge]]]]:
+        """(id, before, after) for every entity whose final state differs from before; None is absent"""
+        result = []
+        for key, value in self.changes.items():
+            before = self.originals[key]
+            after = None if value is _REMOVED else value
+            if before is not after:
+                result.append((key, before, after))
+        return result
+
+
+class _GraphStaging:
+    """One graph's side of a transaction: a pinned version with the staged changes over it"""
+    
+    def __init__(self, graph: Graph):
+        self.graph = graph
+        self.base = graph._acquire()
+        self.version = GraphVersion(self.base.number, _StagedMap(self.base.nodes), _StagedMap(self.base.edges))
+    
+    def release(self) -> None:
+        if self.base is not None:
+            self.graph._unpin(self.base)
+            self.base = None
+    
+    def conflicts(self) -> List[str]:
+        """Ids changed here that another writer has changed since, and staged edges whose endpoints are gone"""
+        graph = self.graph
+        conflicts = []
+        for staged, current in ((self.version.nodes, graph._version.nodes), (self.version.edges, graph._version.edges)):
+            for key, original in staged.originals.items():
+                if not _same_entity(current.get(key), original):
+                    conflicts.append(key)
+        # A staged edge also read its endpoints; each must still exist once committed
+        staged_nodes = self.version.nodes.changes
+        current_nodes = graph._version.nodes
+        for key, edge in self.version.edges.changes.items():
+            if edge is _REMOVED:
+                continue
+            for endpoint in (edge.source.id, edge.target.id):
+                node = staged_nodes.get(endpoint, self)
+                if node is _REMOVED or (node is self and endpoint not in current_nodes):
+                    conflicts.append(key)
+                    break
+        return conflicts
+
+
+class Transaction:
+    """
+    Mutations across the three graphs of a TKG, applied all at once or not
+    at all; use it as `with tkg.transaction():`.
+    
+    While it is open, writes made on the opening thread (through the graphs,
+    the TKG or the API) are staged instead of applied, and reads on that
+    thread see the graphs as of the start plus the staged changes; find
+    queries scan rather than use indexes, which still describe the committed
+    state. Other threads see none of it until commit.
+    
+    Commit coalesces each entity's changes into one net change, checks that
+    no other writer changed the same entities meanwhile (raising
+    TransactionConflict otherwise), and then, under the writer lock,
+    advances each changed graph by one version, maintains its indexes in
+    one pass and hands every subscriber (caches, views, history, ...) the
+    whole transaction as one batch. Leaving the block with an exception
+    discards the staged changes.
+    """
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph'):
+        self.tkg = tkg
+        self.graphs = (tkg.ontological_graph, tkg.instance_graph, tkg.context_graph)
+        self.stagings: Dict[Graph, _GraphStaging] = {}
+        self.state = "new"
+        self.committed_versions: Dict[str, int] = {}
+    
+    def begin(self) -> 'Transaction':
+        """Pin the three graphs and start staging this thread's writes"""
+        if self.state != "new":
+            raise ValueError(f"Transaction is already {self.state}")
+        if self.tkg._in_transaction():
+            raise ValueError("A transaction on this TKG is already open on this thread")
+        for graph in self.graphs:
+            graph._check_writer()
+        self._thread = threading.get_ident()
+        with self.tkg._lock:
+            for graph in self.graphs:
+                self.stagings[graph] = graph._stagings[self._thread] = _GraphStaging(graph)
+        self.state = "open"
+        return self
+    
+    def __len__(self) -> int:
+        """Entities with a staged change"""
+        return sum(len(staging.version.nodes.changes) + len(staging.version.edges.changes)
+                   for staging in self.stagings.values())
+    
+    def _close(self, state: str) -> None:
+        with self.tkg._lock:
+            for graph, staging in self.stagings.items():
+                staging.release()
+                graph._stagings.pop(self._thread, None)
+        self.state = state
+    
+    def rollback(self) -> None:
+        """Discard every staged change"""
+        if self.state != "open":
+            raise ValueError(f"Transaction is {self.state}")
+        self._close("rolled back")
+    
+    def commit(self) -> Dict[str, int]:
+        """Apply the staged changes atomically; returns the new version of each changed graph"""
+        if self.state != "open":
+            raise ValueError(f"Transaction is {self.state}")
+        with self.tkg._lock:
+            conflicts = [key for staging in self.stagings.values() for key in staging.conflicts()]
+            if conflicts:
+                self._close("rolled back")
+                raise TransactionConflict(f"Changed concurrently: {', '.join(sorted(conflicts)[:10])}")
+            changes = {
+                graph: (staging.version.nodes.net_changes(), staging.version.edges.net_changes())
+                for graph, staging in self.stagings.items()
+            }
+            # Stop staging first so the graphs' own maps and maintenance are used below
+            self._close("committed")
+            batches: Dict[Subscription, List[GraphEvent]] = {}
+            size = sum(len(node_changes) + len(edge_changes) for node_changes, edge_changes in changes.values())
+            with self.tkg._writing(size):
+                for graph, (node_changes, edge_changes) in changes.items():
+                    if node_changes or edge_changes:
+                        self.committed_versions[graph.name] = self._apply(graph, node_changes, edge_changes, batches)
+            # Under the lock, like any write's events, so subscribers see commits in order
+            for subscription, events in batches.items():
+                subscription.deliver_batch(events)
+        return dict(self.committed_versions)
+    
+    @staticmethod
+    def _apply(graph: Graph, node_changes: List[Tuple], edge_changes: List[Tuple],
+               batches: Dict[Subscription, List[GraphEvent]]) -> int:
+        """Write one graph's net changes as a single new version, then maintain it in one pass"""
+        version = graph._writable_version()
+        for entities, changed in ((version.nodes, node_changes), (version.edges, edge_changes)):
+            for key, _, after in changed:
+                if after is None:
+                    entities.pop(key, None)
+                else:
+                    entities[key] = after
+        
+        def event(kind: str, before: Optional[Union[Node, Edge]], after: Optional[Union[Node, Edge]]) -> Tuple:
+            if after is None:
+                return f"{kind}_removed", before, None
+            if before is None:
+                return f"{kind}_added", after, None
+            return f"{kind}_updated", after, before
+        
+        # Edges go before the nodes they hang off and come after the nodes they need
+        ordered = [event("edge", before, after) for _, before, after in edge_changes if after is None]
+        ordered += [event("node", before, after) for _, before, after in node_changes if after is None]
+        ordered += [event("node", before, after) for _, before, after in node_changes if after is not None]
+        ordered += [event("edge", before, after) for _, before, after in edge_changes if after is not None]
+        graph._update_indexes_batch(ordered)
+        if graph._metrics is not None and graph.indexes:
+            for operation, _, _ in ordered:
+                graph._metrics.record_index_updates(graph.name, graph.indexes, operation)
+        if graph._subscribers:
+            events = [GraphEvent(operation, graph.name, entity, version.number, previous)
+                      for operation, entity, previous in ordered]
+            for subscription in graph._subscribers:
+                batches.setdefault(subscription, []).extend(events)
+        return version.number
+    
+    def __enter__(self) -> 'Transaction':
+        return self.begin()
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if self.state != "open":
+            return
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+# =============================================================================
+# 23. REPLICATION
+# =============================================================================
+
+# Frames a primary keeps for replicas to resume from; older positions bootstrap from a snapshot
+REPLICATION_LOG_SIZE = 100000
+# Seconds between heartbeats on an idle stream (and between a replica's reconnect attempts)
+REPLICATION_HEARTBEAT = 0.5
+# Frames per send, and entities per snapshot message
+REPLICATION_BATCH = 256
+SNAPSHOT_CHUNK = 5000
+
+
+def _replication_message(message: Dict[str, Any]) -> bytes:
+    """One protocol message: a JSON object on its own line"""
+    return json.dumps(message, default=str).encode() + b"\n"
+
+
+def _encode_entity(entity: Union[Node, Edge]) -> Dict[str, Any]:
+    data = entity.to_dict()
+    if isinstance(entity, Edge):
+        # So a replica can stand in for an endpoint it does not hold
+        data["sourceType"] = entity.source.type
+        data["targetType"] = entity.target.type
+    return data
+
+
+def _decode_entity(graph: Graph, kind: str, data: Dict[str, Any]) -> Union[Node, Edge]:
+    if kind == "node":
+        return Node(data["id"], data["type"], data["properties"])
+    source = graph.get_node(data["source"]) or Node(data["source"], data["sourceType"])
+    target = graph.get_node(data["target"]) or Node(data["target"], data["targetType"])
+    return Edge(data["id"], source, target, data["type"], data["properties"])
+
+
+def _listen(address: Union[Tuple[str, int], str]) -> socket.socket:
+    """Listening socket on a (host, port) or, for a string, a Unix socket path"""
+    if isinstance(address, str):
+        listener = socket.socket(socket.AF_UNIX)
+        listener.bind(address)
+        listener.listen()
+        return listener
+    return socket.create_server(address)
+
+
+def _connect(address: Union[Tuple[str, int], str]) -> socket.socket:
+    if isinstance(address, str):
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(address)
+        return connection
+    return socket.create_connection(address)
+
+
+class ReplicationLog:
+    """
+    The committed changes of a TKG's three graphs as numbered frames.
+    
+    Each write, or each transaction, becomes one frame, encoded once as a
+    protocol message when it commits; positions count frames from 1. At
+    least the newest `capacity` frames are kept for replicas to resume
+    from. `log_id` tells this log apart from any other a replica followed.
+    """
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph', capacity: int = REPLICATION_LOG_SIZE):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.tkg = tkg
+        self.capacity = capacity
+        self.log_id = uuid.uuid4().hex
+        self.position = 0
+        # (position, commit time, encoded frame), oldest first; frames[0] is at _first
+        self.frames: List[Tuple[int, float, bytes]] = []
+        self._first = 1
+        self.appended = threading.Condition()
+        self._subscription = tkg.subscribe(self._append)
+    
+    def close(self) -> None:
+        """Stop logging"""
+        self._subscription.close()
+    
+    def _append(self, events: List[GraphEvent]) -> None:
+        # Delivered on the writer's thread under the writer lock, so positions follow commit order
+        now = time.time()
+        encoded = [[event.graph, event.operation, _encode_entity(event.entity)] for event in events]
+        with self.appended:
+            self.position += 1
+            frame = _replication_message({"type": "frame", "position": self.position, "time": now, "events": encoded})
+            self.frames.append((self.position, now, frame))
+            if len(self.frames) >= 2 * self.capacity:
+                dropped = len(self.frames) - self.capacity
+                del self.frames[:dropped]
+                self._first += dropped
+            self.appended.notify_all()
+    
+    def covers(self, log_id: Optional[str], position: int) -> bool:
+        """Whether a replica at this position of this log can resume from the retained frames"""
+        with self.appended:
+            return log_id == self.log_id and self._first - 1 <= position <= self.position
+    
+    def read(self, after: int, limit: int = REPLICATION_BATCH,
+             timeout: float = None) -> Optional[List[Tuple[int, float, bytes]]]:
+        """
+        Up to `limit` frames after a position, waiting up to `timeout` for
+        one if there are none yet; None once the frames after it are no
+        longer retained
+        """
+        with self.appended:
+            if after >= self.position and timeout:
+                self.appended.wait(timeout)
+            if after < self._first - 1:
+                return None
+            start = after + 1 - self._first
+            return self.frames[start:start + limit]
+    
+    def frame_time(self, position: int) -> Optional[float]:
+        """Commit time of a retained frame"""
+        with self.appended:
+            index = position - self._first
+            return self.frames[index][1] if 0 <= index < len(self.frames) else None
+    
+    def snapshot(self) -> Tuple[int, 'TKGSnapshot']:
+        """The current position with a snapshot of the three graphs exactly as of it"""
+        with self.tkg._lock:
+            return self.position, self.tkg.snapshot()
+
+
+@dataclass
+class ReplicaStatus:
+    """What a primary knows of one connected replica"""
+    name: str
+    connected_at: float
+    sent: int = 0
+    acked: int = 0
+    acked_at: Optional[float] = None
+    snapshots: int = 0
+
+
+class ReplicationPrimary:
+    """
+    Serves a TKG's replication log to replicas on a local address.
+    
+    A replica says which log and position it has; one that is new, follows
+    another log or is behind the retained frames first gets a snapshot of
+    the three graphs as of some position, then every frame after it, with
+    heartbeats when there is nothing to send. Replicas acknowledge what
+    they have applied, which is what lag is measured against. A token from
+    token() lets a client wait until a replica has its writes.
+    """
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph', address: Union[Tuple[str, int], str] = ("127.0.0.1", 0),
+                 log_size: int = REPLICATION_LOG_SIZE, heartbeat: float = REPLICATION_HEARTBEAT):
+        self.tkg = tkg
+        self.heartbeat = heartbeat
+        self.log = ReplicationLog(tkg, log_size)
+        self._listener = _listen(address)
+        # Wakes accept() now and then so close() is noticed
+        self._listener.settimeout(heartbeat)
+        self.address = self._listener.getsockname()
+        self.replicas: Dict[int, ReplicaStatus] = {}
+        self._connections: Dict[int, socket.socket] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._accept, name="tkg-replication", daemon=True)
+        self._thread.start()
+    
+    def token(self) -> str:
+        """Read-your-writes token covering every write committed so far"""
+        with self.log.appended:
+            return f"{self.log.log_id}:{self.log.position}"
+    
+    def _accept(self) -> None:
+        while not self._stop.is_set():
+            try:
+                connection, _ = self._listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            connection.settimeout(None)
+            threading.Thread(target=self._serve, args=(connection,), name="tkg-replication-sender",
+                             daemon=True).start()
+    
+    def _serve(self, connection: socket.socket) -> None:
+        """Bring one replica up to date, then stream to it until it disconnects"""
+        key = id(connection)
+        try:
+            reader = connection.makefile("rb")
+            hello = json.loads(reader.readline() or b"null")
+            if not isinstance(hello, dict) or hello.get("type") != "hello":
+                return
+            status = ReplicaStatus(str(hello.get("name")), time.time())
+            with self._lock:
+                if self._stop.is_set():
+                    return
+                self.replicas[key] = status
+                self._connections[key] = connection
+            position = hello.get("position", 0)
+            if self.log.covers(hello.get("log_id"), position):
+                status.acked = position
+            else:
+                position = self._send_snapshot(connection, status)
+            status.sent = position
+            threading.Thread(target=self._read_acks, args=(reader, status), name="tkg-replication-acks",
+                             daemon=True).start()
+            while not self._stop.is_set():
+                frames = self.log.read(position, REPLICATION_BATCH, self.heartbeat)
+                if frames is None:
+                    # Fell behind the retained frames while streaming
+                    position = self._send_snapshot(connection, status)
+                elif frames:
+                    connection.sendall(b"".join(frame for _, _, frame in frames))
+                    position = frames[-1][0]
+                else:
+                    connection.sendall(_replication_message(
+                        {"type": "heartbeat", "position": self.log.position, "time": time.time()}))
+                status.sent = position
+        except (OSError, ValueError):
+            # Connection lost or garbled; the replica reconnects and resumes
+            pass
+        finally:
+            with self._lock:
+                self.replicas.pop(key, None)
+                self._connections.pop(key, None)
+            connection.close()
+    
+    def _send_snapshot(self, connection: socket.socket, status: ReplicaStatus) -> int:
+        """Send all three graphs as of the current position; returns that position"""
+        position, snapshot = self.log.snapshot()
+        with snapshot:
+            connection.sendall(_replication_message(
+                {"type": "snapshot", "log_id": self.log.log_id, "position": position, "time": time.time()}))
+            for graph in (snapshot.ontological_graph, snapshot.instance_graph, snapshot.context_graph):
+                for kind, entities in (("node", graph.nodes.values()), ("edge", graph.edges.values())):
+                    chunk = []
+                    for entity in entities:
+                        chunk.append(_encode_entity(entity))
+                        if len(chunk) == SNAPSHOT_CHUNK:
+                            connection.sendall(_replication_message(
+                                {"type": "entities", "graph": graph.name, "kind": kind, "items": chunk}))
+                            chunk = []
+                    if chunk:
+                        connection.sendall(_replication_message(
+                            {"type": "entities", "graph": graph.name, "kind": kind, "items": chunk}))
+            connection.sendall(_replication_message({"type": "snapshot_end", "position": position}))
+        status.snapshots += 1
+        return position
+    
+    @staticmethod
+    def _read_acks(reader: Any, status: ReplicaStatus) -> None:
+        try:
+            for line in reader:
+                message = json.loads(line)
+                if message.get("type") == "ack":
+                    status.acked = message["position"]
+                    status.acked_at = time.time()
+        except (OSError, ValueError):
+            pass
+    
+    def status(self) -> List[Dict[str, Any]]:
+        """
+        Each connected replica's positions and lag: frames it has not
+        acknowledged, and seconds since the oldest of them committed
+        """
+        now = time.time()
+        head = self.log.position
+        with self._lock:
+            replicas = list(self.replicas.values())
+        result = []
+        for status in replicas:
+            behind = max(head - status.acked, 0)
+            seconds = 0.0
+            if behind:
+                committed = self.log.frame_time(status.acked + 1)
+                seconds = max(now - (committed if committed is not None else status.connected_at), 0.0)
+            result.append({
+                "name": status.name,
+                "sent": status.sent,
+                "acked": status.acked,
+                "head": head,
+                "frames_behind": behind,
+                "seconds_behind": seconds,
+                "snapshots": status.snapshots
+            })
+        return result
+    
+    def close(self) -> None:
+        """Stop serving and disconnect every replica"""
+        self._stop.set()
+        self._thread.join()
+        self._listener.close()
+        if isinstance(self.address, str):
+            try:
+                os.unlink(self.address)
+            except OSError:
+                pass
+        with self._lock:
+            connections = list(self._connections.values())
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.log.close()
+
+
+class Replica:
+    """
+    Keeps a TKG a copy of a primary's by following its replication stream.
+    
+    Frames are applied in order, each in one transaction, so readers never
+    see part of a primary commit; a snapshot replaces the whole state in
+    one transaction too. The replica resumes from the log id and position
+    it reached after a lost connection; pass state() back in to resume one
+    whose storage outlived its process. While it follows, only its own
+    thread may write to the TKG; other writes raise ValueError, since the
+    primary would never see them and the copy would drift.
+    """
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph', address: Union[Tuple[str, int], str],
+                 name: str = None, log_id: str = None, position: int = 0,
+                 retry_interval: float = REPLICATION_HEARTBEAT):
+        self.tkg = tkg
+        self.address = address
+        self.name = name or tkg.name
+        self.retry_interval = retry_interval
+        self.log_id = log_id
+        self.position = position
+        # Newest position the primary has reported, and commit time of the last frame applied
+        self.head = position
+        self.applied_time: Optional[float] = None
+        self.connected = False
+        self.snapshots = 0
+        self.last_error: Optional[Exception] = None
+        self._graphs = {graph.name: graph for graph in (tkg.ontological_graph, tkg.instance_graph, tkg.context_graph)}
+        self._applied = threading.Condition()
+        self._connection: Optional[socket.socket] = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tkg-replica", daemon=True)
+        for graph in self._graphs.values():
+            graph._replica = self._thread
+        self._thread.start()
+    
+    def state(self) -> Dict[str, Any]:
+        """Log id and position reached, to resume from later"""
+        with self._applied:
+            return {"log_id": self.log_id, "position": self.position}
+    
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self._follow()
+            except (OSError, ValueError) as error:
+                self.last_error = error
+                logger.debug("replica %s lost its primary: %s", self.name, error)
+            self.connected = False
+            self._stop.wait(self.retry_interval)
+    
+    def _follow(self) -> None:
+        connection = _connect(self.address)
+        self._connection = connection
+        loading: Optional[Tuple[Transaction, Dict[str, Any], Dict[str, Tuple[Set[str], Set[str]]]]] = None
+        try:
+            if self._stop.is_set():
+                return
+            connection.sendall(_replication_message(
+                {"type": "hello", "name": self.name, "log_id": self.log_id, "position": self.position}))
+            self.connected = True
+            acked = None
+            pending = b""
+            while True:
+                received = connection.recv(65536)
+                if not received:
+                    return
+                lines = (pending + received).split(b"\n")
+                pending = lines.pop()
+                heartbeat = False
+                for line in lines:
+                    message = json.loads(line)
+                    kind = message["type"]
+                    if kind == "frame":
+                        if message["position"] != self.position + 1:
+                            raise ValueError(f"Expected frame {self.position + 1}, got {message['position']}")
+                        self._apply_frame(message)
+                    elif kind == "entities":
+                        self._load_entities(loading, message)
+                    elif kind == "snapshot":
+                        transaction = self.tkg.transaction().begin()
+                        loading = (transaction, message, {name: (set(), set()) for name in self._graphs})
+                    elif kind == "snapshot_end":
+                        self._finish_snapshot(loading)
+                        loading = None
+                    elif kind == "heartbeat":
+                        heartbeat = True
+                        with self._applied:
+                            self.head = max(self.head, message["position"])
+                # Acknowledge once per read, so a busy stream is not answered frame by frame
+                if heartbeat or self.position != acked:
+                    connection.sendall(_replication_message({"type": "ack", "position": self.position}))
+                    acked = self.position
+        finally:
+            if loading is not None:
+                loading[0].rollback()
+            connection.close()
+    
+    def _apply_event(self, graph_name: str, operation: str, data: Dict[str, Any]) -> None:
+        graph = self._graphs[graph_name]
+        kind, _, action = operation.partition("_")
+        if action == "removed":
+            if kind == "node":
+                graph.remove_node(data["id"])
+            else:
+                graph.remove_edge(data["id"])
+        elif kind == "node":
+            graph.add_node(_decode_entity(graph, kind, data))
+        else:
+            graph.add_edge(_decode_entity(graph, kind, data))
+    
+    def _apply_frame(self, message: Dict[str, Any]) -> None:
+        events = message["events"]
+        if len(events) == 1:
+            self._apply_event(*events[0])
+        else:
+            with self.tkg.transaction():
+                for event in events:
+                    self._apply_event(*event)
+        with self._applied:
+            self.position = message["position"]
+            self.head = max(self.head, self.position)
+            self.applied_time = message["time"]
+            self._applied.notify_all()
+        metrics = self.tkg._metrics
+        if metrics is not None:
+            labels = {"replica": self.name}
+            metrics.increment("tkg_replication_frames_total", labels)
+            metrics.observe("tkg_replication_delay_seconds", labels, max(time.time() - message["time"], 0.0))
+    
+    def _load_entities(self, loading: Optional[Tuple], message: Dict[str, Any]) -> None:
+        if loading is None:
+            raise ValueError("Snapshot entities outside a snapshot")
+        graph = self._graphs[message["graph"]]
+        seen = loading[2][message["graph"]][0 if message["kind"] == "node" else 1]
+        add = graph.add_node if message["kind"] == "node" else graph.add_edge
+        for data in message["items"]:
+            add(_decode_entity(graph, message["kind"], data))
+            seen.add(data["id"])
+    
+    def _finish_snapshot(self, loading: Optional[Tuple]) -> None:
+        """Drop whatever the snapshot did not hold and commit it as the new state"""
+        if loading is None:
+            raise ValueError("Snapshot end without a snapshot")
+        transaction, header, seen = loading
+        for name, graph in self._graphs.items():
+            nodes, edges = seen[name]
+            for edge_id in [edge_id for edge_id in graph.edges if edge_id not in edges]:
+                graph.remove_edge(edge_id)
+            for node_id in [node_id for node_id in graph.nodes if node_id not in nodes]:
+                graph.remove_node(node_id)
+        transaction.commit()
+        with self._applied:
+            self.log_id = header["log_id"]
+            self.position = self.head = header["position"]
+            self.applied_time = header["time"]
+            self.snapshots += 1
+            self._applied.notify_all()
+    
+    def wait_for(self, token: str, timeout: float = None) -> bool:
+        """
+        Block until this replica has applied everything the token covers;
+        False if that takes longer than `timeout` seconds (or the token is
+        from a log the replica does not follow)
+        """
+        log_id, _, position = token.rpartition(":")
+        if not log_id or not position.isdigit():
+            raise ValueError(f"Not a replication token: {token!r}")
+        position = int(position)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._applied:
+            while not (self.log_id == log_id and self.position >= position):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._applied.wait(remaining)
+            return True
+    
+    def lag(self) -> Dict[str, Any]:
+        """
+        How far behind the primary this replica is, in frames and in
+        seconds since the commit of the last frame it applied (0 when
+        caught up with the primary's last report)
+        """
+        with self._applied:
+            behind = max(self.head - self.position, 0)
+            seconds = 0.0
+            if behind and self.applied_time is not None:
+                seconds = max(time.time() - self.applied_time, 0.0)
+            return {
+                "connected": self.connected,
+                "position": self.position,
+                "head": self.head,
+                "frames_behind": behind,
+                "seconds_behind": seconds,
+                "snapshots": self.snapshots
+            }
+    
+    def close(self) -> None:
+        """Stop following the primary"""
+        self._stop.set()
+        connection = self._connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._thread.join()
+        for graph in self._graphs.values():
+            if graph._replica is self._thread:
+                graph._replica = None
+
+
+# =============================================================================
+# 24. INGESTION
+# =============================================================================
+
+# Input lines per chunk a worker parses, and so per batch the writer applies
+INGEST_CHUNK_SIZE = 10000
+
+# Fields each kind of ingest record needs besides "id", named like the TKGApi create_* arguments
+INGEST_FIELDS = {
+    "concept": (),
+    "context": ("context_type",),
+    "entity": ("concept_id",),
+    "relation": ("source_id", "relation_type_id", "target_id")
+}
+
+# context_type -> node type and the properties a context of it must have, as TKGApi.create_context maps them
+INGEST_CONTEXT_TYPES = {
+    "temporal": ("TemporalContext", ("startTime", "endTime")),
+    "spatial": ("SpatialContext", ("location",)),
+    "perspective": ("PerspectiveContext", ("perspective",))
+}
+
+# Graph positions in ingest records
+_INGEST_GRAPHS = ("ontological", "instance", "context")
+
+
+@dataclass
+class IngestError:
+    """A rejected input line"""
+    line: int
+    message: str
+
+
+@dataclass
+class IngestReport:
+    """Outcome of one ingest run"""
+    lines: int = 0
+    nodes: int = 0
+    edges: int = 0
+    errors: List[IngestError] = field(default_factory=list)
+    seconds: float = 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable copy of the report"""
+        return {
+            "lines": self.lines,
+            "nodes": self.nodes,
+            "edges": self.edges,
+            "errors": [{"line": error.line, "message": error.message} for error in self.errors],
+            "seconds": self.seconds
+        }
+
+
+def _ingest_records(data: Any) -> List[Tuple]:
+    """
+    Validate and normalize one decoded line into (graph, id, type,
+    properties, source id, target id) records, source and target None for
+    nodes; raises ValueError with what is wrong
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Expected a JSON object")
+    kind = data.get("kind")
+    if kind not in INGEST_FIELDS:
+        raise ValueError(f"Unknown kind {kind!r}; expected one of {', '.join(INGEST_FIELDS)}")
+    for name in ("id",) + INGEST_FIELDS[kind]:
+        value = data.get(name)
+        if not isinstance(value, str) or not value:
+            raise ValueError(f"{kind} needs a non-empty string {name!r}")
+    properties = data.get("properties", {})
+    if not isinstance(properties, dict):
+        raise ValueError("properties must be an object")
+    node_id = data["id"]
+    
+    if kind == "entity":
+        properties["conceptId"] = data["concept_id"]
+        return [(1, node_id, "Entity", properties, None, None)]
+    if kind == "relation":
+        properties["relationTypeId"] = data["relation_type_id"]
+        return [(1, node_id, "RELATION", properties, data["source_id"], data["target_id"])]
+    if kind == "context":
+        node_type, required = INGEST_CONTEXT_TYPES.get(data["context_type"], (data["context_type"], ()))
+        missing = [name for name in required if properties.get(name) is None]
+        if missing:
+            raise ValueError(f"{data['context_type']} context needs {', '.join(missing)}")
+        if node_type == "TemporalContext" and _is_number(properties["startTime"]) and \
+                _is_number(properties["endTime"]) and properties["startTime"] > properties["endTime"]:
+            raise ValueError("startTime is after endTime")
+        return [(2, node_id, node_type, properties, None, None)]
+    
+    parents = data.get("parent_concepts", [])
+    if not isinstance(parents, list) or not all(isinstance(parent, str) and parent for parent in parents):
+        raise ValueError("parent_concepts must be a list of concept ids")
+    records = [(0, node_id, "Concept", properties, None, None)]
+    records.extend((0, f"{node_id}_ISA_{parent}", "IS_A", {}, node_id, parent) for parent in parents)
+    return records
+
+
+def _parse_ingest_chunk(chunk: Tuple[int, List[str]]) -> bytes:
+    """
+    Worker side of ingest: parse and validate a chunk of lines (the first
+    numbered `chunk[0]`), returning its (line, record...) tuples and
+    (line, message) errors marshalled in one compact blob
+    """
+    first_line, lines = chunk
+    records = []
+    errors = []
+    for line_number, line in enumerate(lines, first_line):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            errors.append((line_number, f"Invalid JSON: {error}"))
+            continue
+        try:
+            for record in _ingest_records(data):
+                records.append((line_number,) + record)
+        except ValueError as error:
+            errors.append((line_number, str(error)))
+    return marshal.dumps((records, errors))
+
+
+class IngestPipeline:
+    """
+    Loads JSON Lines input into a TKG with parsing spread over processes.
+    
+    Each line is one record: {"kind": "concept" | "context" | "entity" |
+    "relation", "id": ..., "properties": {...}} plus the fields of the
+    matching TKGApi create_* call (concept_id, context_type, source_id,
+    relation_type_id, target_id, parent_concepts). A pool of `workers`
+    processes parses and validates chunks of lines into compact records;
+    this thread applies each chunk as one batch under the writer lock,
+    in input order, so an entity's lines take effect in the order given
+    and a relation can refer to anything on earlier lines. At most
+    `max_pending` chunks are read ahead of the writer. Rejected lines are
+    reported by line number and the rest is still loaded.
+    """
+    
+    def __init__(self, tkg: 'TrinitarianKnowledgeGraph', workers: int = None,
+                 chunk_size: int = INGEST_CHUNK_SIZE, max_pending: int = None):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 0:
+            raise ValueError("workers must not be negative")
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self.tkg = tkg
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_pending = max_pending if max_pending is not None else 2 * max(workers, 1)
+        if self.max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self._graphs = (tkg.ontological_graph, tkg.instance_graph, tkg.context_graph)
+    
+    def _chunks(self, lines: Any):
+        """(first line number, lines) chunks, read lazily"""
+        chunk = []
+        first_line = 1
+        for line_number, line in enumerate(lines, 1):
+            if not chunk:
+                first_line = line_number
+            chunk.append(line)
+            if len(chunk) == self.chunk_size:
+                yield first_line, chunk
+                chunk = []
+        if chunk:
+            yield first_line, chunk
+    
+    def run(self, source: Any) -> IngestReport:
+        """Ingest a file path or an iterable of lines"""
+        if self.tkg._in_transaction():
+            raise ValueError("Cannot ingest inside a transaction")
+        report = IngestReport()
+        start = time.perf_counter()
+        with (open(source, encoding="utf-8") if isinstance(source, str) else nullcontext(source)) as lines:
+            chunks = self._chunks(lines)
+            if self.workers == 0:
+                for chunk in chunks:
+                    report.lines += len(chunk[1])
+                    self._apply(_parse_ingest_chunk(chunk), report)
+            else:
+                # fork where available: workers inherit this module however it was loaded
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("fork" if "fork" in methods else None)
+                with concurrent.futures.ProcessPoolExecutor(self.workers, mp_context=context) as pool:
+                    pending: deque = deque()
+                    for chunk in chunks:
+                        report.lines += len(chunk[1])
+                        if len(pending) >= self.max_pending:
+                            self._apply(pending.popleft().result(), report)
+                        pending.append(pool.submit(_parse_ingest_chunk, chunk))
+                    while pending:
+                        self._apply(pending.popleft().result(), report)
+        report.errors.sort(key=lambda error: error.line)
+        report.seconds = time.perf_counter() - start
+        return report
+    
+    def _apply(self, blob: bytes, report: IngestReport) -> None:
+        """Write one chunk's records as a single new version of each graph it touches"""
+        records, errors = marshal.loads(blob)
+        report.errors.extend(IngestError(line, message) for line, message in errors)
+        graphs = self._graphs
+        with self.tkg._lock:
+            # Per graph: id -> [committed entity, final entity], in first-seen order
+            node_changes: List[Dict[str, List]] = [{}, {}, {}]
+            edge_changes: List[Dict[str, List]] = [{}, {}, {}]
+            for line, position, entity_id, entity_type, properties, source_id, target_id in records:
+                graph = graphs[position]
+                if source_id is None:
+                    changes = node_changes[position]
+                    entity = Node(entity_id, entity_type, properties, graph)
+                    if entity_id not in changes:
+                        changes[entity_id] = [graph.nodes.get(entity_id), entity]
+                    else:
+                        changes[entity_id][1] = entity
+                    continue
+                endpoints = []
+                for endpoint_id in (source_id, target_id):
+                    change = node_changes[position].get(endpoint_id)
+                    endpoint = change[1] if change is not None else graph.nodes.get(endpoint_id)
+                    if endpoint is None:
+                        report.errors.append(IngestError(
+                            line, f"Unknown {_INGEST_GRAPHS[position]} node {endpoint_id!r}"))
+                        break
+                    endpoints.append(endpoint)
+                else:
+                    changes = edge_changes[position]
+                    entity = Edge(entity_id, endpoints[0], endpoints[1], entity_type, properties, graph)
+                    if entity_id not in changes:
+                        changes[entity_id] = [graph.edges.get(entity_id), entity]
+                    else:
+                        changes[entity_id][1] = entity
+            batches: Dict[Subscription, List[GraphEvent]] = {}
+            with self.tkg._writing(len(records)):
+                for position, graph in enumerate(graphs):
+                    nodes = [(key, before, after) for key, (before, after) in node_changes[position].items()]
+                    edges = [(key, before, after) for key, (before, after) in edge_changes[position].items()]
+                    if nodes or edges:
+                        Transaction._apply(graph, nodes, edges, batches)
+                    report.nodes += len(nodes)
+                    report.edges += len(edges)
+            for subscription, events in batches.items():
+                subscription.deliver_batch(events)
+
+
+# =============================================================================
+# 25. BENCHMARKS
+# =============================================================================
+
+@dataclass
+class WorkloadConfig:
+    """Shape of a synthetic TKG workload"""
+    num_concepts: int = 100
+    isa_depth: int = 4
+    num_relation_types: int = 10
+    num_temporal_contexts: int = 20
+    num_spatial_contexts: int = 10
+    # 0.0 gives disjoint temporal contexts; 1.0 makes each overlap its neighbours by a full width
+    context_overlap: float = 0.5
+    num_entities: int = 1000
+    num_relations: int = 2000
+    time_span: Tuple[int, int] = (0, 2000)
+    # Zipf exponent for concept, location, relation-type and endpoint popularity
+    skew: float = 1.1
+    seed: int = 42
+    
+    @classmethod
+    def for_scale(cls, scale: int, seed: int = 42) -> 'WorkloadConfig':
+        """Config whose entity count is `scale`, with the other sizes derived from it"""
+        return cls(
+            num_concepts=max(20, scale // 100),
+            isa_depth=max(3, min(8, len(str(scale)))),
+            num_relation_types=max(5, min(100, scale // 1000)),
+            num_temporal_contexts=max(10, min(500, scale // 200)),
+            num_spatial_contexts=max(5, min(200, scale // 500)),
+            num_entities=scale,
+            num_relations=2 * scale,
+            seed=seed
+        )
+
+
+class SyntheticWorkload:
+    """Seeded generator of TKG records with skewed popularity distributions"""
+    
+    def __init__(self, config: WorkloadConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.concepts: List[Tuple[str, Dict[str, Any]]] = []
+        self.is_a: List[Tuple[str, str]] = []
+        self.relation_types: List[str] = []
+        self.contexts: List[Tuple[str, str, Dict[str, Any]]] = []
+        self.entities: List[Tuple[str, str, Dict[str, Any]]] = []
+        self.relations: List[Tuple[str, str, str, str, Dict[str, Any]]] = []
+        self.roots: List[str] = []
+        self._generate()
+    
+    def _zipf_weights(self, count: int) -> List[float]:
+        """Cumulative Zipf weights for random.choices over `count` ranked items"""
+        cumulative = []
+        total = 0.0
+        for rank in range(1, count + 1):
+            total += 1.0 / (rank ** self.config.skew)
+            cumulative.append(total)
+        return cumulative
+    
+    def _skewed(self, items: List[Any], count: int) -> List[Any]:
+        """Draw `count` items, the first ones far more often than the last"""
+        return self.random.choices(items, cum_weights=self._zipf_weights(len(items)), k=count)
+    
+    def _generate(self) -> None:
+        """Produce all records up front so loading can be timed on its own"""
+        config = self.config
+        rng = self.random
+        
+        # Concepts arranged in IS_A levels; parents at each level are drawn with skew
+        levels: List[List[str]] = [[] for _ in range(max(1, config.isa_depth))]
+        root_count = max(1, config.num_concepts // 20)
+        for i in range(config.num_concepts):
+            concept_id = f"C{i}"
+            level = 0 if i < root_count or len(levels) == 1 else rng.randint(1, len(levels) - 1)
+            levels[level].append(concept_id)
+            self.concepts.append((concept_id, {
+                "name": concept_id,
+                "description": f"Synthetic concept {i}",
+                "temporal": rng.random() < 0.8,
+                "spatial": rng.random() < 0.5
+            }))
+        self.roots = list(levels[0])
+        for depth in range(1, len(levels)):
+            parents = next((level for level in reversed(levels[:depth]) if level), self.roots)
+            if levels[depth]:
+                for child, parent in zip(levels[depth], self._skewed(parents, len(levels[depth]))):
+                    self.is_a.append((child, parent))
+        
+        self.relation_types = [f"R{i}" for i in range(config.num_relation_types)]
+        
+        # Temporal contexts tile the time span, widened by the configured overlap
+        start, end = config.time_span
+        width = (end - start) / max(1, config.num_temporal_contexts)
+        for i in range(config.num_temporal_contexts):
+            low = start + i * width - config.context_overlap * width / 2
+            high = start + (i + 1) * width + config.context_overlap * width / 2
+            self.contexts.append((f"T{i}", "TemporalContext", {
+                "startTime": round(max(start, low)),
+                "endTime": round(min(end, high)),
+                "description": f"Synthetic period {i}"
+            }))
+        locations = [f"Region{i}" for i in range(config.num_spatial_contexts)]
+        for i, location in enumerate(locations):
+            self.contexts.append((f"S{i}", "SpatialContext", {
+                "location": location,
+                "description": f"Synthetic region {i}"
+            }))
+        
+        concept_ids = [concept_id for concept_id, _ in self.concepts]
+        entity_concepts = self._skewed(concept_ids, config.num_entities)
+        entity_locations = self._skewed(locations, config.num_entities) if locations else []
+        for i in range(config.num_entities):
+            properties = {
+                "name": f"Entity {i}",
+                "timestamp": rng.randint(start, end)
+            }
+            if entity_locations:
+                properties["location"] = entity_locations[i]
+            self.entities.append((f"e{i}", entity_concepts[i], properties))
+        
+        # Relation endpoints are skewed too, giving a heavy-tailed degree distribution
+        entity_ids = [entity_id for entity_id, _, _ in self.entities]
+        if entity_ids and self.relation_types:
+            sources = self._skewed(entity_ids, config.num_relations)
+            targets = self._skewed(entity_ids, config.num_relations)
+            types = self._skewed(self.relation_types, config.num_relations)
+            for i in range(config.num_relations):
+                self.relations.append((f"r{i}", sources[i], types[i], targets[i], {"weight": rng.random()}))
+    
+    def load_ontology(self, api: 'TKGApi') -> None:
+        """Add concepts, IS_A edges and relation types"""
+        for concept_id, properties in self.concepts:
+            api.create_ontological_concept(concept_id, properties)
+        for child, parent in self.is_a:
+            api.tkg.ontological_graph.define_is_a(child, parent)
+        for relation_id in self.relation_types:
+            api.tkg.ontological_graph.add_relation(relation_id, {"name": relation_id, "temporal": True})
+    
+    def load_contexts(self, api: 'TKGApi') -> None:
+        """Add temporal and spatial contexts"""
+        for context_id, context_type, properties in self.contexts:
+            api.create_context(context_id, context_type, properties)
+    
+    def load_entities(self, api: 'TKGApi') -> None:
+        """Add entities"""
+        for entity_id, concept_id, properties in self.entities:
+            api.create_entity(entity_id, concept_id, properties)
+    
+    def load_relations(self, api: 'TKGApi') -> None:
+        """Add relations between entities"""
+        for relation_id, source_id, relation_type, target_id, properties in self.relations:
+            api.create_relation(relation_id, source_id, relation_type, target_id, properties)
+    
+    def build(self) -> Tuple[TrinitarianKnowledgeGraph, 'TKGApi']:
+        """Create a TKG holding the whole workload"""
+        tkg = TrinitarianKnowledgeGraph("Synthetic")
+        tkg.initialize_adjunctions()
+        api = TKGApi(tkg)
+        self.load_ontology(api)
+        self.load_contexts(api)
+        self.load_entities(api)
+        self.load_relations(api)
+        return tkg, api
+
+
+def _time_operation(name: str, scale: int, operation: Callable[[Any], Any], arguments: List[Any],
+                    time_budget: float) -> Dict[str, Any]:
+    """Time `operation` over `arguments` until they run out or the budget is spent"""
+    timings = []
+    spent = 0.0
+    for argument in arguments:
+        start = time.perf_counter()
+        operation(argument)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        spent += elapsed
+        if spent >= time_budget:
+            break
+    
+    timings.sort()
+    count = len(timings)
+    return {
+        "operation": name,
+        "scale": scale,
+        "iterations": count,
+        "total_s": spent,
+        "mean_ms": spent / count * 1e3 if count else None,
+        "p50_ms": timings[count // 2] * 1e3 if count else None,
+        "p95_ms": timings[min(count - 1, int(count * 0.95))] * 1e3 if count else None,
+        "ops_per_s": count / spent if spent else None
+    }
+
+
+def run_benchmark_suite(scales: List[int] = (1000, 10000), samples: int = 50,
+                        time_budget: float = 10.0, seed: int = 42) -> Dict[str, Any]:
+    """
+    Generate a workload per scale and time the main TKG operations on it.
+    
+    Each query operation runs over up to `samples` seeded arguments and stops
+    early once `time_budget` seconds have been spent on it, so large scales
+    report fewer iterations rather than running for hours.
+    """
+    results = []
+    for scale in scales:
+        workload = SyntheticWorkload(WorkloadConfig.for_scale(scale, seed))
+        rng = random.Random(seed)
+        
+        tkg = TrinitarianKnowledgeGraph("Benchmark")
+        tkg.initialize_adjunctions()
+        api = TKGApi(tkg)
+        workload.load_ontology(api)
+        workload.load_contexts(api)
+        
+        # Ingest: one timed batch each for nodes and edges
+        results.append(_time_operation("add_node", scale, lambda _: workload.load_entities(api),
+                                       [None], float("inf")))
+        results[-1]["items"] = len(workload.entities)
+        results[-1]["ns_per_item"] = results[-1]["total_s"] / max(1, len(workload.entities)) * 1e9
+        results.append(_time_operation("add_edge", scale, lambda _: workload.load_relations(api),
+                                       [None], float("inf")))
+        results[-1]["items"] = len(workload.relations)
+        results[-1]["ns_per_item"] = results[-1]["total_s"] / max(1, len(workload.relations)) * 1e9
+        
+        concept_ids = [concept_id for concept_id, _ in workload.concepts]
+        context_ids = [context_id for context_id, _, _ in workload.contexts]
+        temporal_ids = [context_id for context_id, context_type, _ in workload.contexts
+                        if context_type == "TemporalContext"]
+        entity_ids = [entity_id for entity_id, _, _ in workload.entities]
+        
+        def pick(items: List[Any]) -> List[Any]:
+            return [rng.choice(items) for _ in range(samples)]
+        
+        results.append(_time_operation(
+            "find_nodes", scale,
+            lambda concept_id: tkg.instance_graph.find_nodes({"properties.conceptId": concept_id}),
+            pick(concept_ids), time_budget))
+        results.append(_time_operation(
+            "get_all_subconcepts", scale,
+            tkg.ontological_graph.get_all_subconcepts,
+            pick(workload.roots), time_budget))
+        if np is not None:
+            compiled = tkg.ontological_graph.compiled()
+            results.append(_time_operation(
+                "compiled_is_a_descendants", scale, compiled.is_a_descendants,
+                pick(workload.roots), time_budget))
+        results.append(_time_operation(
+            "contextual_query", scale,
+            lambda pair: tkg.contextual_query(f"FIND INSTANCES OF CONCEPT {pair[0]} IN CONTEXT {pair[1]}", pair[1]),
+            list(zip(pick(concept_ids), pick(temporal_ids))), time_budget))
+        results.append(_time_operation(
+            "is_instance_relevant_in_context", scale,
+            lambda pair: tkg.is_instance_relevant_in_context(*pair),
+            list(zip(pick(entity_ids), pick(context_ids))), time_budget))
+        results.append(_time_operation(
+            "find_across_graphs", scale,
+            lambda entity_id: tkg.find_across_graphs("instance", entity_id, [
+                {"adjunction": "classification", "direction": "left"},
+                {"adjunction": "applicability", "direction": "left"}
+            ]),
+            pick(entity_ids), time_budget))
+        results.append(_time_operation(
+            "export_knowledge", scale, api.export_knowledge, ["json"], time_budget))
+    
+    return {
+        "suite": "tkg",
+        "python": platform.python_version(),
+        "seed": seed,
+        "samples": samples,
+        "time_budget_s": time_budget,
+        "results": results,
+        "event_overhead": benchmark_event_overhead(min(100000, max(scales)))
+    }
+
+
+def benchmark_event_overhead(count: int = 100000, batch_size: int = 256) -> Dict[str, Any]:
+    """Measure what change-event publication adds to add_node"""
+    def run(configure: Callable[[Graph], Optional[Subscription]]) -> float:
+        graph = Graph("Benchmark")
+        subscription = configure(graph)
+        nodes = [Node(id=f"n{i}", type="Entity", properties={"i": i}) for i in range(count)]
+        start = time.perf_counter()
+        for node in nodes:
+            graph.add_node(node)
+        if subscription:
+            subscription.close()
+        return time.perf_counter() - start
+    
+    baseline = run(lambda graph: None)
+    sync = run(lambda graph: graph.subscribe(lambda batch: None, batch_size=batch_size))
+    queued = run(lambda graph: graph.subscribe(lambda batch: None, batch_size=batch_size, queued=True))
+    
+    def per_op(seconds: float) -> float:
+        return seconds / count * 1e9
+    
+    return {
+        "benchmark": "event_overhead",
+        "count": count,
+        "batch_size": batch_size,
+        "add_node_ns": {
+            "no_subscribers": per_op(baseline),
+            "sync_subscriber": per_op(sync),
+            "queued_subscriber": per_op(queued)
+        },
+        "overhead_ratio": {
+            "sync_subscriber": sync / baseline,
+            "queued_subscriber": queued / baseline
+        }
+    }
+
+
+# =============================================================================
+# 26. EXAMPLE USAGE
 # =============================================================================
 
 def example_tkg_usage():
@@ -1779,4 +9974,24 @@ def example_tkg_usage():
 
 
 if __name__ == "__main__":
-    tkg, api = example_tkg_usage()
+    parser = argparse.ArgumentParser(description="Trinitarian Knowledge Graph demo")
+    parser.add_argument("--benchmark", action="store_true", help="run the benchmark suite and print JSON")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000],
+                        help="entity counts to benchmark, e.g. 1000 10000 100000 1000000")
+    parser.add_argument("--samples", type=int, default=50)
+    parser.add_argument("--time-budget", type=float, default=10.0,
+                        help="seconds allowed per query operation and scale")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ingest", metavar="PATH", help="load a JSON Lines file and print the ingest report")
+    parser.add_argument("--workers", type=int, default=None, help="ingest parser processes (default: one per CPU)")
+    args = parser.parse_args()
+    
+    if args.benchmark:
+        report = run_benchmark_suite(args.scales, args.samples, args.time_budget, args.seed)
+        print(json.dumps(report, indent=2))
+    elif args.ingest:
+        tkg = TrinitarianKnowledgeGraph("Ingested")
+        tkg.initialize_adjunctions()
+        print(json.dumps(tkg.ingest(args.ingest, args.workers).to_dict(), indent=2))
+    else:
+        tkg, api = example_tkg_usage()